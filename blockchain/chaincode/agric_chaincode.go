@@ -24,6 +24,24 @@ type Transaction struct {
 	BlockchainHash string  `json:"blockchainHash"`
 }
 
+// MerkleAnchor is the Merkle root of one day's transaction hashes, anchored by the DW
+type MerkleAnchor struct {
+	Date       string `json:"date"`
+	Root       string `json:"root"`
+	LeafCount  int    `json:"leafCount"`
+	AnchoredAt string `json:"anchoredAt"`
+}
+
+// TransactionPage is one page of a range scan; pass Bookmark back to get the next page
+type TransactionPage struct {
+	Records             []*Transaction `json:"records"`
+	Bookmark            string         `json:"bookmark"`
+	FetchedRecordsCount int32          `json:"fetchedRecordsCount"`
+}
+
+// Anchors live under a composite key, so range scans over transaction IDs never see them
+const merkleAnchorObjectType = "merkleAnchor"
+
 // InitLedger adds a base set of assets to the ledger
 func (s *SmartContract) InitLedger(ctx contractapi.TransactionContextInterface) error {
 	transactions := []Transaction{
@@ -96,6 +114,36 @@ func (s *SmartContract) ReadTransaction(ctx contractapi.TransactionContextInterf
 	return &asset, nil
 }
 
+// ReadTransactions returns the assets found for a JSON array of ids, in request order.
+// Missing ids are left out, so one call verifies a whole page of transactions.
+func (s *SmartContract) ReadTransactions(ctx contractapi.TransactionContextInterface, idsJSON string) ([]*Transaction, error) {
+	var ids []string
+	err := json.Unmarshal([]byte(idsJSON), &ids)
+	if err != nil {
+		return nil, fmt.Errorf("ids must be a JSON array of strings: %v", err)
+	}
+
+	assets := make([]*Transaction, 0, len(ids))
+	for _, id := range ids {
+		assetJSON, err := ctx.GetStub().GetState(id)
+		if err != nil {
+			return nil, fmt.Errorf("failed to read from world state: %v", err)
+		}
+		if assetJSON == nil {
+			continue
+		}
+
+		var asset Transaction
+		err = json.Unmarshal(assetJSON, &asset)
+		if err != nil {
+			return nil, err
+		}
+		assets = append(assets, &asset)
+	}
+
+	return assets, nil
+}
+
 // TransactionExists returns true when asset with given ID exists in world state
 func (s *SmartContract) TransactionExists(ctx contractapi.TransactionContextInterface, id string) (bool, error) {
 	assetJSON, err := ctx.GetStub().GetState(id)
@@ -106,7 +154,8 @@ func (s *SmartContract) TransactionExists(ctx contractapi.TransactionContextInte
 	return assetJSON != nil, nil
 }
 
-// GetAllTransactions returns all assets found in world state
+// GetAllTransactions returns all assets found in world state in one response.
+// Only for small ledgers; scan large ones a page at a time with GetTransactionsByRange.
 func (s *SmartContract) GetAllTransactions(ctx contractapi.TransactionContextInterface) ([]*Transaction, error) {
 	resultsIterator, err := ctx.GetStub().GetStateByRange("", "")
 	if err != nil {
@@ -132,6 +181,105 @@ func (s *SmartContract) GetAllTransactions(ctx contractapi.TransactionContextInt
 	return assets, nil
 }
 
+// GetTransactionsByRange returns up to pageSize transactions with IDs in [startKey, endKey),
+// starting at bookmark ("" for the first page). An empty startKey or endKey leaves that end
+// of the range open. The returned bookmark resumes the scan; it is empty after the last page.
+func (s *SmartContract) GetTransactionsByRange(ctx contractapi.TransactionContextInterface, startKey string, endKey string, pageSize int32, bookmark string) (*TransactionPage, error) {
+	resultsIterator, metadata, err := ctx.GetStub().GetStateByRangeWithPagination(startKey, endKey, pageSize, bookmark)
+	if err != nil {
+		return nil, err
+	}
+	defer resultsIterator.Close()
+
+	records := []*Transaction{}
+	for resultsIterator.HasNext() {
+		queryResponse, err := resultsIterator.Next()
+		if err != nil {
+			return nil, err
+		}
+
+		var asset Transaction
+		err = json.Unmarshal(queryResponse.Value, &asset)
+		if err != nil {
+			return nil, err
+		}
+		records = append(records, &asset)
+	}
+
+	return &TransactionPage{
+		Records:             records,
+		Bookmark:            metadata.Bookmark,
+		FetchedRecordsCount: metadata.FetchedRecordsCount,
+	}, nil
+}
+
+// AnchorMerkleRoot records the Merkle root of a day's transactions. An anchor is
+// immutable: anchoring the same root again is a no-op, a different root is an error.
+func (s *SmartContract) AnchorMerkleRoot(ctx contractapi.TransactionContextInterface, date string, root string, leafCount int) error {
+	key, err := ctx.GetStub().CreateCompositeKey(merkleAnchorObjectType, []string{date})
+	if err != nil {
+		return err
+	}
+
+	existingJSON, err := ctx.GetStub().GetState(key)
+	if err != nil {
+		return fmt.Errorf("failed to read from world state: %v", err)
+	}
+	if existingJSON != nil {
+		var existing MerkleAnchor
+		err = json.Unmarshal(existingJSON, &existing)
+		if err != nil {
+			return err
+		}
+		if existing.Root == root && existing.LeafCount == leafCount {
+			return nil
+		}
+		return fmt.Errorf("the anchor for %s already exists with a different root", date)
+	}
+
+	txTimestamp, err := ctx.GetStub().GetTxTimestamp()
+	if err != nil {
+		return err
+	}
+
+	anchor := MerkleAnchor{
+		Date:       date,
+		Root:       root,
+		LeafCount:  leafCount,
+		AnchoredAt: time.Unix(txTimestamp.Seconds, int64(txTimestamp.Nanos)).UTC().Format(time.RFC3339),
+	}
+	anchorJSON, err := json.Marshal(anchor)
+	if err != nil {
+		return err
+	}
+
+	return ctx.GetStub().PutState(key, anchorJSON)
+}
+
+// ReadMerkleRoot returns the anchor recorded for date.
+func (s *SmartContract) ReadMerkleRoot(ctx contractapi.TransactionContextInterface, date string) (*MerkleAnchor, error) {
+	key, err := ctx.GetStub().CreateCompositeKey(merkleAnchorObjectType, []string{date})
+	if err != nil {
+		return nil, err
+	}
+
+	anchorJSON, err := ctx.GetStub().GetState(key)
+	if err != nil {
+		return nil, fmt.Errorf("failed to read from world state: %v", err)
+	}
+	if anchorJSON == nil {
+		return nil, fmt.Errorf("the anchor for %s does not exist", date)
+	}
+
+	var anchor MerkleAnchor
+	err = json.Unmarshal(anchorJSON, &anchor)
+	if err != nil {
+		return nil, err
+	}
+
+	return &anchor, nil
+}
+
 func main() {
 	chaincode, err := contractapi.NewChaincode(new(SmartContract))
 	if err != nil {
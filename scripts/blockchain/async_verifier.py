@@ -0,0 +1,235 @@
+"""
+Async Blockchain Verification
+Verifies transaction hashes with many ledger lookups in flight at once,
+over one long-lived client session, instead of connecting and waiting for
+each lookup in turn as verify_transaction_hash() does.
+
+A semaphore caps the lookups in flight at the concurrency limit and each
+lookup has its own timeout, so a slow peer delays its requests without
+stalling the rest. Per-request latencies are reported as p50/p95/p99.
+With the simulated ledger, N lookups take about N / concurrency round
+trips.
+Requires: psycopg2, fabric-sdk-py (or --in-process for the ledger stand-in)
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import time
+from array import array
+
+import psycopg2
+
+from batch_verifier import dw_pages
+from blockchain_client import AsyncBlockchainClient, load_config, data_dir
+from inprocess_ledger import InProcessLedger, LedgerError
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class RequestStats:
+    """Latency of every request, in ms"""
+
+    def __init__(self):
+        self.latencies_ms = array('d')
+
+    def record(self, latency_ms):
+        self.latencies_ms.append(latency_ms)
+
+    def percentile(self, values, pct):
+        return values[min(int(pct / 100 * len(values)), len(values) - 1)]
+
+    def summary(self):
+        if not self.latencies_ms:
+            return {'count': 0}
+        values = sorted(self.latencies_ms)
+        return {
+            'count': len(values),
+            'mean_ms': sum(values) / len(values),
+            'p50_ms': self.percentile(values, 50),
+            'p95_ms': self.percentile(values, 95),
+            'p99_ms': self.percentile(values, 99),
+            'max_ms': values[-1],
+        }
+
+class AsyncVerifier:
+    """Looks up transactions concurrently and tallies Pass / Mismatch / Missing / Timeout / Error"""
+
+    def __init__(self, client, concurrency=100, timeout=5.0, writer=None):
+        self.client = client
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.writer = writer
+        self.slots = asyncio.Semaphore(concurrency)
+        self.stats = RequestStats()
+        self.outcomes = {'Pass': 0, 'Mismatch': 0, 'Missing': 0, 'Timeout': 0, 'Error': 0}
+        self.samples = []
+
+    async def verify(self, transaction_id, dw_hash):
+        """Outcome for one transaction; at most concurrency lookups run at once"""
+        async with self.slots:
+            return await self._verify(transaction_id, dw_hash)
+
+    async def _verify(self, transaction_id, dw_hash):
+        started = time.perf_counter()
+        ledger_hash = None
+        try:
+            ledger_tx = await asyncio.wait_for(self.client.query_transaction(transaction_id), self.timeout)
+            if ledger_tx is None:
+                outcome = 'Missing'
+            else:
+                ledger_hash = ledger_tx['blockchainHash']
+                outcome = 'Pass' if ledger_hash == dw_hash else 'Mismatch'
+        except asyncio.TimeoutError:
+            outcome = 'Timeout'
+        except LedgerError as e:
+            logger.warning(f"{transaction_id}: {e}")
+            outcome = 'Error'
+        self.stats.record((time.perf_counter() - started) * 1000)
+        self.outcomes[outcome] += 1
+        if outcome != 'Pass':
+            finding = (transaction_id, outcome, dw_hash, ledger_hash)
+            if self.writer:
+                self.writer.writerow(finding)
+            if len(self.samples) < 10:
+                self.samples.append(finding)
+        return outcome
+
+    async def _verify_slot(self, transaction_id, dw_hash):
+        try:
+            await self._verify(transaction_id, dw_hash)
+        finally:
+            self.slots.release()
+
+    async def verify_all(self, pages):
+        """
+        Verify pages (lists) of (transaction_id, dw_hash) pairs from any iterator.
+        Pages are fetched on a worker thread, the next one while the current one
+        is dispatched, so a blocking database read never stalls the event loop.
+        A slot is taken before each task is created, so only concurrency tasks
+        exist at a time however long the input is.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        pending = set()
+        next_page = loop.run_in_executor(None, next, pages, None)
+        while True:
+            page = await next_page
+            if page is None:
+                break
+            next_page = loop.run_in_executor(None, next, pages, None)
+            for transaction_id, dw_hash in page:
+                await self.slots.acquire()
+                task = asyncio.ensure_future(self._verify_slot(transaction_id, dw_hash))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        elapsed = time.perf_counter() - started
+        checked = sum(self.outcomes.values())
+        return {
+            'checked': checked,
+            'outcomes': dict(self.outcomes),
+            'seconds': elapsed,
+            'transactions_per_second': checked / elapsed if elapsed else 0,
+            'latency': self.stats.summary(),
+            'samples': self.samples,
+        }
+
+def limit_pages(pages, limit):
+    """Yield pages until limit items have been yielded, truncating the last one"""
+    for page in pages:
+        yield page[:limit]
+        limit -= len(page)
+        if limit <= 0:
+            return
+
+def run_async_verification(transaction_ids=None, start_date=None, end_date=None, limit=None,
+                           concurrency=None, timeout=None, findings_path=None, ledger=None):
+    config = load_config()
+    async_config = config.get('blockchain', {}).get('async_verify', {})
+    concurrency = concurrency or async_config.get('concurrency', 100)
+    timeout = timeout or async_config.get('timeout_seconds', 5.0)
+    page_size = config.get('blockchain', {}).get('verify', {}).get('page_size', 500)
+
+    db = config['database']
+    conn = psycopg2.connect(
+        host=db['host'],
+        port=db['port'],
+        database=db['database'],
+        user=db['user'],
+        password=db['password']
+    )
+    findings_file = open(findings_path, 'w', encoding='utf-8', newline='') if findings_path else None
+    try:
+        writer = csv.writer(findings_file) if findings_file else None
+        if writer:
+            writer.writerow(['transaction_id', 'result', 'dw_hash', 'ledger_hash'])
+        pages = dw_pages(conn, page_size, transaction_ids, start_date, end_date)
+        if limit:
+            pages = limit_pages(pages, limit)
+
+        async def verify():
+            # The semaphore and client belong to this event loop
+            verifier = AsyncVerifier(AsyncBlockchainClient(config, ledger=ledger), concurrency, timeout, writer)
+            return await verifier.verify_all(pages)
+
+        result = asyncio.run(verify())
+    finally:
+        if findings_file:
+            findings_file.close()
+        conn.close()
+
+    latency = result['latency']
+    # Print summary
+    print("\n" + "=" * 80)
+    print("ASYNC BLOCKCHAIN VERIFICATION")
+    print("=" * 80)
+    print(f"Checked: {result['checked']:,} transactions ({concurrency} in flight, {timeout:g}s timeout)")
+    for outcome, count in result['outcomes'].items():
+        print(f"{outcome}: {count:,}")
+    print(f"Throughput: {result['transactions_per_second']:,.0f} transactions/s ({result['seconds']:,.1f}s)")
+    if latency['count']:
+        print(f"Request latency: mean {latency['mean_ms']:,.1f} ms, p50 {latency['p50_ms']:,.1f}, "
+              f"p95 {latency['p95_ms']:,.1f}, p99 {latency['p99_ms']:,.1f}, max {latency['max_ms']:,.1f}")
+    if ledger is not None and ledger.latency_ms:
+        rounds = -(-result['checked'] // concurrency)
+        print(f"Simulated ledger: {rounds:,} rounds of {ledger.latency_ms:g} ms = "
+              f"{rounds * ledger.latency_ms / 1000:,.1f}s minimum")
+    for transaction_id, status, dw_hash, ledger_hash in result['samples']:
+        ledger_text = ledger_hash[:16] + '...' if ledger_hash else '-'
+        print(f"  {status:<9}{transaction_id}  dw={dw_hash[:16]}...  ledger={ledger_text}")
+    if findings_path:
+        print(f"Findings: {findings_path}")
+    print("=" * 80)
+
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Verify DW transaction hashes with concurrent ledger lookups")
+    parser.add_argument('--ids', nargs='+', help="Transaction IDs to verify")
+    parser.add_argument('--from-date', help="First transaction date (YYYY-MM-DD)")
+    parser.add_argument('--to-date', help="Last transaction date (YYYY-MM-DD)")
+    parser.add_argument('--limit', type=int, default=None, help="Verify at most this many transactions")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help="Lookups in flight (default: blockchain.async_verify.concurrency)")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="Seconds per lookup (default: blockchain.async_verify.timeout_seconds)")
+    parser.add_argument('--output', help="Write failed verifications to this CSV")
+    parser.add_argument('--in-process', action='store_true',
+                        help="Verify against the ledger stand-in, loaded from data/transactions.csv")
+    parser.add_argument('--tamper-pct', type=float, default=0.0, help="Stand-in: %% of hashes altered")
+    parser.add_argument('--missing-pct', type=float, default=0.0, help="Stand-in: %% of transactions left off")
+    args = parser.parse_args()
+
+    ledger = None
+    if args.in_process:
+        latency_ms = load_config().get('blockchain', {}).get('simulated_ledger', {}).get('latency_ms', 50)
+        ledger = InProcessLedger(latency_ms=latency_ms)
+        loaded, tampered, missing = ledger.load_csv(os.path.join(data_dir(), 'transactions.csv'),
+                                                    args.tamper_pct, args.missing_pct)
+        logger.info(f"Ledger stand-in: {loaded:,} transactions ({tampered:,} tampered, {missing:,} left off)")
+
+    run_async_verification(args.ids, args.from_date, args.to_date, args.limit, args.concurrency,
+                           args.timeout, args.output, ledger)
@@ -0,0 +1,195 @@
+"""
+Batch Blockchain Verification
+Checks dw.fact_transaction hashes against the ledger a page at a time
+instead of one lookup per transaction.
+
+Transactions are selected by ID list or date range and streamed from a
+server-side cursor; each page of IDs is read from the ledger with a single
+ReadTransactions call and the hashes are compared in bulk. Mismatches and
+transactions missing from the ledger are written to a findings CSV, and
+the run reports transactions/s and ledger round-trip times.
+Requires: psycopg2, fabric-sdk-py (or --in-process for the ledger stand-in)
+"""
+import argparse
+import csv
+import logging
+import os
+import time
+from datetime import date
+
+import psycopg2
+
+from blockchain_client import BlockchainClient, load_config, data_dir
+from inprocess_ledger import InProcessLedger
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SELECT_SQL = """
+    SELECT transaction_id, encode(blockchain_hash, 'hex')
+    FROM dw.fact_transaction
+    WHERE blockchain_hash IS NOT NULL
+      AND {filter}
+    ORDER BY transaction_id
+"""
+
+def date_key(value):
+    """YYYYMMDD date_key for an ISO date string"""
+    return int(date.fromisoformat(value).strftime('%Y%m%d'))
+
+def dw_pages(conn, page_size, transaction_ids=None, start_date=None, end_date=None):
+    """Yield lists of (transaction_id, blockchain_hash) from a server-side cursor"""
+    if transaction_ids:
+        where, params = "transaction_id = ANY(%(ids)s)", {'ids': list(transaction_ids)}
+    elif start_date or end_date:
+        where = "date_key BETWEEN %(start)s AND %(end)s"
+        params = {'start': date_key(start_date) if start_date else 0,
+                  'end': date_key(end_date) if end_date else 99991231}
+    else:
+        where, params = "TRUE", {}
+
+    cursor = conn.cursor(name='batch_verify')
+    cursor.itersize = page_size
+    try:
+        cursor.execute(SELECT_SQL.format(filter=where), params)
+        while True:
+            page = cursor.fetchmany(page_size)
+            if not page:
+                break
+            yield page
+    finally:
+        cursor.close()
+
+class BatchVerifier:
+    """Compares pages of DW hashes with the ledger and tallies the results"""
+
+    def __init__(self, client, findings_path=None):
+        self.client = client
+        self.findings_path = findings_path
+        self.checked = 0
+        self.matched = 0
+        self.mismatched = 0
+        self.missing = 0
+        self.pages = 0
+        self.ledger_seconds = 0.0
+        self.samples = []
+
+    def verify_page(self, page, writer=None):
+        start = time.perf_counter()
+        on_ledger = self.client.read_transactions(transaction_id for transaction_id, _ in page)
+        self.ledger_seconds += time.perf_counter() - start
+        self.pages += 1
+
+        for transaction_id, dw_hash in page:
+            self.checked += 1
+            ledger_tx = on_ledger.get(transaction_id)
+            if ledger_tx is None:
+                self.missing += 1
+                finding = (transaction_id, 'Missing', dw_hash, None)
+            elif ledger_tx['blockchainHash'] != dw_hash:
+                self.mismatched += 1
+                finding = (transaction_id, 'Mismatch', dw_hash, ledger_tx['blockchainHash'])
+            else:
+                self.matched += 1
+                continue
+            if writer:
+                writer.writerow(finding)
+            if len(self.samples) < 10:
+                self.samples.append(finding)
+
+    def run(self, pages):
+        started = time.perf_counter()
+        findings_file = open(self.findings_path, 'w', encoding='utf-8', newline='') \
+            if self.findings_path else None
+        try:
+            writer = csv.writer(findings_file) if findings_file else None
+            if writer:
+                writer.writerow(['transaction_id', 'result', 'dw_hash', 'ledger_hash'])
+            for page in pages:
+                self.verify_page(page, writer)
+                if self.pages % 100 == 0:
+                    logger.info(f"Verified {self.checked:,} transactions "
+                                f"({self.mismatched:,} mismatched, {self.missing:,} missing)")
+        finally:
+            if findings_file:
+                findings_file.close()
+
+        elapsed = time.perf_counter() - started
+        return {
+            'checked': self.checked,
+            'matched': self.matched,
+            'mismatched': self.mismatched,
+            'missing': self.missing,
+            'pages': self.pages,
+            'seconds': elapsed,
+            'transactions_per_second': self.checked / elapsed if elapsed else 0,
+            'ledger_ms_per_page': self.ledger_seconds / self.pages * 1000 if self.pages else 0,
+            'ledger_share': self.ledger_seconds / elapsed if elapsed else 0,
+            'samples': self.samples,
+        }
+
+def run_verification(transaction_ids=None, start_date=None, end_date=None, page_size=None,
+                     findings_path=None, ledger=None):
+    config = load_config()
+    verify_config = config.get('blockchain', {}).get('verify', {})
+    page_size = page_size or verify_config.get('page_size', 500)
+
+    db = config['database']
+    conn = psycopg2.connect(
+        host=db['host'],
+        port=db['port'],
+        database=db['database'],
+        user=db['user'],
+        password=db['password']
+    )
+    client = BlockchainClient(config, ledger=ledger)
+    try:
+        pages = dw_pages(conn, page_size, transaction_ids, start_date, end_date)
+        result = BatchVerifier(client, findings_path).run(pages)
+    finally:
+        client.close()
+        conn.close()
+
+    # Print summary
+    print("\n" + "=" * 80)
+    print("BATCH BLOCKCHAIN VERIFICATION")
+    print("=" * 80)
+    print(f"Checked: {result['checked']:,} transactions in {result['pages']:,} pages of {page_size:,}")
+    print(f"Matched: {result['matched']:,}")
+    print(f"Mismatched: {result['mismatched']:,}")
+    print(f"Missing from ledger: {result['missing']:,}")
+    print(f"Throughput: {result['transactions_per_second']:,.0f} transactions/s "
+          f"({result['seconds']:,.1f}s, ledger {result['ledger_ms_per_page']:,.0f} ms/page, "
+          f"{result['ledger_share']:.0%} of run time)")
+    for transaction_id, status, dw_hash, ledger_hash in result['samples']:
+        ledger_text = ledger_hash[:16] + '...' if ledger_hash else '-'
+        print(f"  {status:<9}{transaction_id}  dw={dw_hash[:16]}...  ledger={ledger_text}")
+    if findings_path:
+        print(f"Findings: {findings_path}")
+    print("=" * 80)
+
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Verify DW transaction hashes against the ledger in batches")
+    parser.add_argument('--ids', nargs='+', help="Transaction IDs to verify")
+    parser.add_argument('--from-date', help="First transaction date (YYYY-MM-DD)")
+    parser.add_argument('--to-date', help="Last transaction date (YYYY-MM-DD)")
+    parser.add_argument('--page-size', type=int, default=None,
+                        help="Transactions per ledger read (default: blockchain.verify.page_size)")
+    parser.add_argument('--output', help="Write mismatched and missing transactions to this CSV")
+    parser.add_argument('--in-process', action='store_true',
+                        help="Verify against the ledger stand-in, loaded from data/transactions.csv")
+    parser.add_argument('--tamper-pct', type=float, default=0.0, help="Stand-in: %% of hashes altered")
+    parser.add_argument('--missing-pct', type=float, default=0.0, help="Stand-in: %% of transactions left off")
+    args = parser.parse_args()
+
+    ledger = None
+    if args.in_process:
+        latency_ms = load_config().get('blockchain', {}).get('simulated_ledger', {}).get('latency_ms', 50)
+        ledger = InProcessLedger(latency_ms=latency_ms)
+        loaded, tampered, missing = ledger.load_csv(os.path.join(data_dir(), 'transactions.csv'),
+                                                    args.tamper_pct, args.missing_pct)
+        logger.info(f"Ledger stand-in: {loaded:,} transactions ({tampered:,} tampered, {missing:,} left off)")
+
+    run_verification(args.ids, args.from_date, args.to_date, args.page_size, args.output, ledger)
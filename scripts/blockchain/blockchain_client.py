@@ -0,0 +1,198 @@
+"""
+Blockchain Client
+Query client for the agric_cc chaincode on the Hyperledger Fabric network
+(blockchain/network_config.yaml), with the in-process ledger stand-in as
+a drop-in for tests and benchmarks.
+
+Ledger responses are parsed into the chaincode's Transaction and
+MerkleAnchor objects; entries that are not on the ledger come back as
+None / are left out. Each thread gets its own event loop, so one client
+can serve concurrent range scans; AsyncBlockchainClient serves asyncio
+callers from a single long-lived session.
+Requires: fabric-sdk-py (or an InProcessLedger)
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+
+import yaml
+
+from inprocess_ledger import LedgerError
+
+try:
+    from hfc.fabric import Client
+    HAS_FABRIC = True
+except ImportError:
+    HAS_FABRIC = False
+
+logger = logging.getLogger(__name__)
+
+def load_config(config_path=None):
+    """Load the shared ETL configuration (scripts/etl/etl_config.yaml)"""
+    if config_path is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        config_path = os.path.join(script_dir, '..', 'etl', 'etl_config.yaml')
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f)
+
+def data_dir():
+    """Generated CSV datasets (project_root/data)"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(os.path.dirname(script_dir)), 'data')
+
+def fabric_session(settings):
+    """(client, user, channel name) for the configured org user on the configured channel"""
+    if not HAS_FABRIC:
+        raise RuntimeError("fabric-sdk-py is not installed; use the in-process ledger stand-in")
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    profile = os.path.join(script_dir, settings.get('network_profile', '../../blockchain/network_config.yaml'))
+    client = Client(net_profile=profile)
+    user = client.get_user(org_name=settings.get('org', 'Org1'), name=settings.get('user', 'Admin'))
+    channel = settings.get('channel', 'agri-channel')
+    client.new_channel(channel)
+    return client, user, channel
+
+class BlockchainClient:
+    """
+    Evaluates chaincode query functions on one peer. Pass ledger to use the
+    in-process stand-in instead of the Fabric network.
+    """
+
+    def __init__(self, config=None, ledger=None):
+        config = config or load_config()
+        self.settings = config.get('blockchain', {})
+        self.ledger = ledger
+        if ledger is not None:
+            return
+        self.client, self.user, self.channel = fabric_session(self.settings)
+        self.local = threading.local()
+        self.loops = []
+
+    def run(self, coroutine):
+        """Run a Fabric SDK coroutine on this thread's event loop"""
+        loop = getattr(self.local, 'loop', None)
+        if loop is None:
+            loop = self.local.loop = asyncio.new_event_loop()
+            self.loops.append(loop)
+        return loop.run_until_complete(coroutine)
+
+    def evaluate(self, fcn, *args):
+        """Run a query function on the peer; returns the raw response or raises LedgerError"""
+        if self.ledger is not None:
+            return self.ledger.evaluate(fcn, *args)
+        try:
+            return self.run(self.client.chaincode_query(
+                requestor=self.user,
+                channel_name=self.channel,
+                peers=[self.settings.get('peer', 'peer0.org1.example.com')],
+                args=list(args),
+                cc_name=self.settings.get('chaincode', 'agric_cc'),
+                fcn=fcn
+            ))
+        except Exception as e:
+            raise LedgerError(str(e)) from e
+
+    def submit(self, fcn, *args):
+        """Endorse and commit a transaction; returns the response or raises LedgerError"""
+        if self.ledger is not None:
+            return self.ledger.evaluate(fcn, *args)
+        try:
+            return self.run(self.client.chaincode_invoke(
+                requestor=self.user,
+                channel_name=self.channel,
+                peers=[self.settings.get('peer', 'peer0.org1.example.com')],
+                args=list(args),
+                cc_name=self.settings.get('chaincode', 'agric_cc'),
+                fcn=fcn,
+                wait_for_event=True
+            ))
+        except Exception as e:
+            raise LedgerError(str(e)) from e
+
+    def query_transaction(self, transaction_id):
+        """The ledger's Transaction for transaction_id, or None if it was never recorded"""
+        try:
+            return json.loads(self.evaluate('ReadTransaction', transaction_id))
+        except LedgerError as e:
+            if 'does not exist' in str(e):
+                return None
+            raise
+
+    def read_transactions(self, transaction_ids):
+        """{transaction_id: Transaction} for the IDs found, in one round trip"""
+        response = self.evaluate('ReadTransactions', json.dumps(list(transaction_ids)))
+        return {tx['ID']: tx for tx in json.loads(response) or []}
+
+    def get_all_transactions(self):
+        """Whole world state in one response (small ledgers only)"""
+        return json.loads(self.evaluate('GetAllTransactions')) or []
+
+    def get_transactions_by_range(self, start_key='', end_key='', page_size=1000, bookmark=''):
+        """One page of transactions with IDs in [start_key, end_key): (transactions, next bookmark or '')"""
+        page = json.loads(self.evaluate('GetTransactionsByRange', start_key, end_key, str(page_size), bookmark))
+        return page['records'] or [], page['bookmark']
+
+    def anchor_merkle_root(self, date, root, leaf_count):
+        """Anchor a day's Merkle root (hex); re-anchoring the same root is a no-op"""
+        self.submit('AnchorMerkleRoot', date, root, str(leaf_count))
+
+    def read_merkle_root(self, date):
+        """The MerkleAnchor for date (YYYY-MM-DD), or None if the day was never anchored"""
+        try:
+            return json.loads(self.evaluate('ReadMerkleRoot', date))
+        except LedgerError as e:
+            if 'does not exist' in str(e):
+                return None
+            raise
+
+    def close(self):
+        if self.ledger is None:
+            for loop in self.loops:
+                loop.close()
+
+class AsyncBlockchainClient:
+    """
+    asyncio counterpart of BlockchainClient's queries. One Fabric client and
+    channel are set up once and shared by every query, so many lookups can
+    be in flight on one event loop.
+    """
+
+    def __init__(self, config=None, ledger=None):
+        config = config or load_config()
+        self.settings = config.get('blockchain', {})
+        self.ledger = ledger
+        if ledger is None:
+            self.client, self.user, self.channel = fabric_session(self.settings)
+
+    async def evaluate(self, fcn, *args):
+        """Run a query function on the peer; returns the raw response or raises LedgerError"""
+        if self.ledger is not None:
+            return await self.ledger.evaluate_async(fcn, *args)
+        try:
+            return await self.client.chaincode_query(
+                requestor=self.user,
+                channel_name=self.channel,
+                peers=[self.settings.get('peer', 'peer0.org1.example.com')],
+                args=list(args),
+                cc_name=self.settings.get('chaincode', 'agric_cc'),
+                fcn=fcn
+            )
+        except Exception as e:
+            raise LedgerError(str(e)) from e
+
+    async def query_transaction(self, transaction_id):
+        """The ledger's Transaction for transaction_id, or None if it was never recorded"""
+        try:
+            return json.loads(await self.evaluate('ReadTransaction', transaction_id))
+        except LedgerError as e:
+            if 'does not exist' in str(e):
+                return None
+            raise
+
+    async def read_transactions(self, transaction_ids):
+        """{transaction_id: Transaction} for the IDs found, in one round trip"""
+        response = await self.evaluate('ReadTransactions', json.dumps(list(transaction_ids)))
+        return {tx['ID']: tx for tx in json.loads(response) or []}
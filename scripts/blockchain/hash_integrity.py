@@ -0,0 +1,175 @@
+"""
+Transaction Hash Integrity Sweep
+Recomputes every paid transaction's blockchain_hash locally - SHA-256 of
+"{transaction_id}_{timestamp}", as generate_blockchain_hash() defines it -
+and flags rows whose stored hash no longer matches. No ledger round trips.
+
+fact_transaction is split into transaction_key ranges that a process pool
+scans in parallel, each worker with its own connection and server-side
+cursor, so the sweep uses every core. The result is logged to
+audit.data_quality_log under an audit.etl_execution_log entry.
+Requires: psycopg2
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import psycopg2
+
+from blockchain_client import load_config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+RANGE_SQL = """
+    SELECT transaction_id, transaction_timestamp, blockchain_hash
+    FROM dw.fact_transaction
+    WHERE transaction_key BETWEEN %s AND %s
+      AND blockchain_hash IS NOT NULL
+"""
+
+def expected_hash(transaction_id, timestamp):
+    """Hash as generate_blockchain_hash() computes it, as the 32 bytes the DW stores"""
+    return hashlib.sha256(f"{transaction_id}_{timestamp.isoformat()}".encode()).digest()
+
+def connect(db_config):
+    return psycopg2.connect(
+        host=db_config['host'],
+        port=db_config['port'],
+        database=db_config['database'],
+        user=db_config['user'],
+        password=db_config['password']
+    )
+
+def key_ranges(conn, shards):
+    """Split the transaction_key span into contiguous [lo, hi] ranges"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(transaction_key), MAX(transaction_key) FROM dw.fact_transaction")
+    low, high = cursor.fetchone()
+    cursor.close()
+    if low is None:
+        return []
+    step = max((high - low + 1) // shards, 1)
+    ranges = []
+    start = low
+    while start <= high:
+        end = min(start + step - 1, high)
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+def verify_range(db_config, key_range, fetch_size, max_findings):
+    """Worker: recompute hashes for one key range on its own connection"""
+    started = time.perf_counter()
+    conn = connect(db_config)
+    checked = tampered = 0
+    findings = []
+    try:
+        cursor = conn.cursor(name='hash_integrity')
+        cursor.itersize = fetch_size
+        cursor.execute(RANGE_SQL, key_range)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            checked += len(rows)
+            for transaction_id, timestamp, stored_hash in rows:
+                recomputed = expected_hash(transaction_id, timestamp)
+                if recomputed != stored_hash:
+                    tampered += 1
+                    if len(findings) < max_findings:
+                        findings.append({'transaction_id': transaction_id,
+                                         'stored': bytes(stored_hash).hex(), 'recomputed': recomputed.hex()})
+        cursor.close()
+    finally:
+        conn.close()
+    return {'range': key_range, 'checked': checked, 'tampered': tampered, 'findings': findings,
+            'seconds': time.perf_counter() - started}
+
+def log_result(conn, job_name, checked, tampered, findings, error=None):
+    """One etl_execution_log entry and one data_quality_log row for the sweep"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO audit.etl_execution_log (job_name, status, end_time, rows_read, rows_rejected, error_message)
+        VALUES (%s, %s, CURRENT_TIMESTAMP, %s, %s, %s)
+        RETURNING execution_id
+    """, (job_name, 'Failed' if error else 'Success', checked, tampered, error))
+    execution_id = cursor.fetchone()[0]
+    if not error:
+        cursor.execute("""
+            INSERT INTO audit.data_quality_log
+                (execution_id, table_name, check_name, check_type, check_result,
+                 records_checked, records_failed, failure_percentage, check_details)
+            VALUES (%s, 'dw.fact_transaction', 'blockchain_hash_recompute', 'Integrity', %s, %s, %s, %s, %s)
+        """, (
+            execution_id,
+            'Fail' if tampered else 'Pass',
+            checked,
+            tampered,
+            round(tampered / checked * 100, 2) if checked else 0,
+            json.dumps({'tampered': findings}),
+        ))
+    conn.commit()
+    cursor.close()
+    return execution_id
+
+def run_sweep(workers=None):
+    config = load_config()
+    integrity_config = config.get('blockchain', {}).get('integrity', {})
+    workers = workers or integrity_config.get('workers', os.cpu_count() or 1)
+    fetch_size = integrity_config.get('fetch_size', 10000)
+    max_findings = integrity_config.get('max_findings', 1000)
+
+    conn = connect(config['database'])
+    started = time.perf_counter()
+    checked = tampered = 0
+    findings = []
+    error = None
+    try:
+        # Several ranges per worker, so a dense range does not leave the others idle
+        ranges = key_ranges(conn, workers * 4)
+        logger.info(f"Sweeping {len(ranges)} transaction_key ranges with {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(verify_range, config['database'], key_range, fetch_size, max_findings)
+                       for key_range in ranges]
+            for future in as_completed(futures):
+                shard = future.result()
+                checked += shard['checked']
+                tampered += shard['tampered']
+                findings.extend(shard['findings'][:max_findings - len(findings)])
+                logger.info(f"Keys {shard['range'][0]:,}-{shard['range'][1]:,}: {shard['checked']:,} checked, "
+                            f"{shard['tampered']:,} tampered ({shard['seconds']:,.1f}s)")
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        execution_id = log_result(conn, 'hash_integrity_sweep', checked, tampered, findings, error)
+        conn.close()
+
+    # Print summary
+    print("\n" + "=" * 80)
+    print("TRANSACTION HASH INTEGRITY SWEEP")
+    print("=" * 80)
+    print(f"Checked: {checked:,} paid transactions ({workers} workers)")
+    print(f"Tampered: {tampered:,} ({tampered / checked * 100 if checked else 0:.2f}%)")
+    print(f"Throughput: {checked / elapsed if elapsed else 0:,.0f} rows/s ({elapsed:,.1f}s)")
+    for finding in findings[:10]:
+        print(f"  {finding['transaction_id']}  stored={finding['stored'][:16]}...  "
+              f"recomputed={finding['recomputed'][:16]}...")
+    print(f"Logged: audit.data_quality_log (execution {execution_id})")
+    print("=" * 80)
+
+    return {'checked': checked, 'tampered': tampered, 'findings': findings, 'seconds': elapsed}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recompute transaction hashes across the DW")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes (default: blockchain.integrity.workers)")
+    args = parser.parse_args()
+
+    run_sweep(workers=args.workers)
@@ -0,0 +1,270 @@
+"""
+Incremental Transaction Verification
+Verifies only the transactions that need it, and records each result in
+audit.transaction_verification, so continuous auditing costs work
+proportional to new data instead of re-checking the whole table.
+
+Each run verifies paid transactions that are:
+    new      transaction_key above the highest key verified so far
+    changed  updated_at (set by trigger when the hash or its inputs change)
+             at or after the start of the last successful run
+    retry    last result was not Pass
+    sample   a TABLESAMPLE SYSTEM re-check of sample_pct of verified rows
+
+Hashes are recomputed locally (method: recompute) or compared with the
+ledger a page at a time (method: ledger). Runs are logged in
+audit.etl_execution_log, with a summary row in audit.data_quality_log.
+Requires: psycopg2 (and fabric-sdk-py or --in-process for method ledger)
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+from psycopg2.extras import execute_values
+
+from blockchain_client import BlockchainClient, load_config, data_dir
+from hash_integrity import expected_hash, connect
+from inprocess_ledger import InProcessLedger
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'incremental_verification'
+
+CANDIDATES_SQL = """
+    SELECT transaction_key, transaction_id, transaction_timestamp, blockchain_hash, 'new' AS reason
+    FROM dw.fact_transaction
+    WHERE transaction_key > %(watermark)s AND blockchain_hash IS NOT NULL
+    UNION ALL
+    SELECT transaction_key, transaction_id, transaction_timestamp, blockchain_hash, 'changed'
+    FROM dw.fact_transaction
+    WHERE updated_at >= %(since)s AND transaction_key <= %(watermark)s AND blockchain_hash IS NOT NULL
+    UNION ALL
+    SELECT ft.transaction_key, ft.transaction_id, ft.transaction_timestamp, ft.blockchain_hash, 'retry'
+    FROM audit.transaction_verification tv
+    JOIN dw.fact_transaction ft ON ft.transaction_key = tv.transaction_key
+    WHERE tv.result <> 'Pass' AND ft.blockchain_hash IS NOT NULL
+"""
+
+SAMPLE_SQL = """
+    UNION ALL
+    SELECT transaction_key, transaction_id, transaction_timestamp, blockchain_hash, 'sample'
+    FROM dw.fact_transaction TABLESAMPLE SYSTEM (%(sample_pct)s)
+    WHERE transaction_key <= %(watermark)s AND blockchain_hash IS NOT NULL
+"""
+
+UPSERT_SQL = """
+    INSERT INTO audit.transaction_verification
+        (transaction_key, transaction_id, verified_hash, result, method, execution_id, verified_at)
+    VALUES %s
+    ON CONFLICT (transaction_key) DO UPDATE SET
+        transaction_id = EXCLUDED.transaction_id,
+        verified_hash = EXCLUDED.verified_hash,
+        result = EXCLUDED.result,
+        method = EXCLUDED.method,
+        execution_id = EXCLUDED.execution_id,
+        verified_at = EXCLUDED.verified_at
+"""
+
+class IncrementalVerifier:
+    """Selects the transactions due for verification, verifies them page by page and records the results"""
+
+    def __init__(self, conn, method='recompute', client=None, page_size=500, sample_pct=0.1):
+        if method == 'ledger' and client is None:
+            raise ValueError("method 'ledger' needs a BlockchainClient")
+        self.conn = conn
+        self.method = method
+        self.client = client
+        self.page_size = page_size
+        self.sample_pct = sample_pct
+        self.execution_id = None
+
+    def start(self):
+        """Log the run; returns (watermark, since) from earlier runs"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(transaction_key), 0) FROM audit.transaction_verification")
+        watermark = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT MAX(start_time) FROM audit.etl_execution_log
+            WHERE job_name = %s AND status = 'Success'
+        """, (JOB_NAME,))
+        since = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO audit.etl_execution_log (job_name, status)
+            VALUES (%s, 'Running')
+            RETURNING execution_id
+        """, (JOB_NAME,))
+        self.execution_id = cursor.fetchone()[0]
+        self.conn.commit()
+        cursor.close()
+        return watermark, since
+
+    def candidates(self, watermark, since):
+        """Yield pages of due transactions, each transaction once"""
+        # Key order: if a run fails, what it recorded is a prefix of the new rows,
+        # so the next run's watermark skips nothing
+        query = CANDIDATES_SQL + (SAMPLE_SQL if self.sample_pct else '') + "ORDER BY transaction_key"
+        params = {
+            'watermark': watermark,
+            # First run: everything is new, nothing has changed
+            'since': since or '9999-12-31',
+            'sample_pct': self.sample_pct,
+        }
+        cursor = self.conn.cursor(name='incremental_verify')
+        cursor.itersize = self.page_size
+        # Rows come in key order, so a key matched by both UNION ALL branches is adjacent
+        last_key = None
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(self.page_size)
+                if not rows:
+                    break
+                page = []
+                for row in rows:
+                    if row[0] != last_key:
+                        last_key = row[0]
+                        page.append(row)
+                if page:
+                    yield page
+        finally:
+            cursor.close()
+
+    def verify_page(self, page):
+        """[(transaction_key, transaction_id, hash, result)] for one page"""
+        if self.method == 'recompute':
+            return [
+                (key, transaction_id, bytes(stored_hash),
+                 'Pass' if expected_hash(transaction_id, timestamp) == stored_hash else 'Mismatch')
+                for key, transaction_id, timestamp, stored_hash, _ in page
+            ]
+        on_ledger = self.client.read_transactions(row[1] for row in page)
+        results = []
+        for key, transaction_id, _, stored_hash, _ in page:
+            stored_hash = bytes(stored_hash)
+            ledger_tx = on_ledger.get(transaction_id)
+            if ledger_tx is None:
+                result = 'Missing'
+            else:
+                # The ledger keeps the hex form
+                result = 'Pass' if ledger_tx['blockchainHash'] == stored_hash.hex() else 'Mismatch'
+            results.append((key, transaction_id, stored_hash, result))
+        return results
+
+    def record(self, results):
+        cursor = self.conn.cursor()
+        execute_values(cursor, UPSERT_SQL, [
+            (key, transaction_id, stored_hash, result, self.method, self.execution_id)
+            for key, transaction_id, stored_hash, result in results
+        ], template='(%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)', page_size=1000)
+        self.conn.commit()
+        cursor.close()
+
+    def finish(self, status, checked, failed, reasons, error=None):
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            UPDATE audit.etl_execution_log
+            SET end_time = CURRENT_TIMESTAMP, status = %s, rows_read = %s, rows_rejected = %s,
+                error_message = %s
+            WHERE execution_id = %s
+        """, (status, checked, failed, error, self.execution_id))
+        if status == 'Success':
+            cursor.execute("""
+                INSERT INTO audit.data_quality_log
+                    (execution_id, table_name, check_name, check_type, check_result,
+                     records_checked, records_failed, failure_percentage, check_details)
+                VALUES (%s, 'dw.fact_transaction', 'blockchain_hash_incremental', 'Integrity', %s, %s, %s, %s, %s)
+            """, (
+                self.execution_id,
+                'Fail' if failed else 'Pass',
+                checked,
+                failed,
+                round(failed / checked * 100, 2) if checked else 0,
+                json.dumps({'method': self.method, 'selected': dict(reasons)}),
+            ))
+        self.conn.commit()
+        cursor.close()
+
+    def run(self):
+        watermark, since = self.start()
+        logger.info(f"Verifying transactions above key {watermark:,}"
+                    + (f", changed since {since}" if since else "")
+                    + f", failed ones and a {self.sample_pct}% sample ({self.method})")
+        started = time.perf_counter()
+        checked = 0
+        outcomes = Counter()
+        reasons = Counter()
+        try:
+            for page in self.candidates(watermark, since):
+                results = self.verify_page(page)
+                self.record(results)
+                checked += len(results)
+                outcomes.update(result for _, _, _, result in results)
+                reasons.update(row[4] for row in page)
+                if checked % (self.page_size * 100) < len(page):
+                    logger.info(f"Verified {checked:,} transactions")
+        except Exception as e:
+            self.conn.rollback()
+            self.finish('Failed', checked, checked - outcomes['Pass'], reasons, str(e))
+            raise
+        failed = checked - outcomes['Pass']
+        self.finish('Success', checked, failed, reasons)
+        return {
+            'execution_id': self.execution_id,
+            'watermark': watermark,
+            'checked': checked,
+            'outcomes': dict(outcomes),
+            'reasons': dict(reasons),
+            'seconds': time.perf_counter() - started,
+        }
+
+def run_incremental(method=None, sample_pct=None, ledger=None):
+    config = load_config()
+    incremental_config = config.get('blockchain', {}).get('incremental', {})
+    method = method or incremental_config.get('method', 'recompute')
+    sample_pct = incremental_config.get('sample_pct', 0.1) if sample_pct is None else sample_pct
+    page_size = config.get('blockchain', {}).get('verify', {}).get('page_size', 500)
+
+    conn = connect(config['database'])
+    client = BlockchainClient(config, ledger=ledger) if method == 'ledger' else None
+    try:
+        result = IncrementalVerifier(conn, method, client, page_size, sample_pct).run()
+    finally:
+        if client:
+            client.close()
+        conn.close()
+
+    # Print summary
+    print("\n" + "=" * 80)
+    print("INCREMENTAL TRANSACTION VERIFICATION")
+    print("=" * 80)
+    print(f"Method: {method}, previous watermark: transaction_key {result['watermark']:,}")
+    print(f"Verified: {result['checked']:,} transactions "
+          f"({', '.join(f'{n:,} {reason}' for reason, n in sorted(result['reasons'].items())) or 'nothing due'})")
+    for outcome in ('Pass', 'Mismatch', 'Missing'):
+        print(f"{outcome}: {result['outcomes'].get(outcome, 0):,}")
+    print(f"Time: {result['seconds']:,.2f}s (execution {result['execution_id']})")
+    print("=" * 80)
+
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Verify new, changed and sampled transactions")
+    parser.add_argument('--method', choices=['recompute', 'ledger'], default=None,
+                        help="default: blockchain.incremental.method")
+    parser.add_argument('--sample-pct', type=float, default=None,
+                        help="Re-check sample of already verified rows (default: blockchain.incremental.sample_pct)")
+    parser.add_argument('--in-process', action='store_true',
+                        help="Method ledger: use the ledger stand-in, loaded from data/transactions.csv")
+    args = parser.parse_args()
+
+    ledger = None
+    if args.in_process:
+        latency_ms = load_config().get('blockchain', {}).get('simulated_ledger', {}).get('latency_ms', 50)
+        ledger = InProcessLedger(latency_ms=latency_ms)
+        ledger.load_csv(os.path.join(data_dir(), 'transactions.csv'))
+
+    run_incremental(args.method, args.sample_pct, ledger)
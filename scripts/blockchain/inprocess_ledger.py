@@ -0,0 +1,233 @@
+"""
+In-Process Ledger
+Minimal stand-in for the agric_cc chaincode's world state, so the ledger
+client and verifiers can run without a Fabric network.
+
+Responses mirror the chaincode: JSON Transaction objects (ID, date,
+farmerID, productID, quantity, amount, blockchainHash), keys in
+GetStateByRange order, and "the asset ... does not exist" errors. Daily
+Merkle anchors are kept apart from transactions, as the chaincode's
+composite keys are, and can be kept in anchors_file so they outlive the
+process like a real ledger's. Every evaluate() call sleeps latency_ms to
+simulate the peer round trip (evaluate_async() awaits it instead).
+
+SyntheticLedger answers the same queries for any number of generated
+transactions without holding them, for reconciliation benchmarks.
+"""
+import asyncio
+import bisect
+import csv
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+class LedgerError(Exception):
+    """Chaincode error returned by the peer"""
+
+class InProcessLedger:
+    """World state held in memory, queried through evaluate(fcn, *args) like a peer"""
+
+    def __init__(self, latency_ms=0, anchors_file=None):
+        self.latency_ms = latency_ms
+        self.state = {}
+        self.sorted_keys = None
+        self.anchors = {}
+        self.anchors_file = anchors_file
+        self.lock = threading.Lock()
+        self.calls = 0
+        if anchors_file and os.path.exists(anchors_file):
+            with open(anchors_file, 'r', encoding='utf-8') as f:
+                self.anchors = {date: value.encode('utf-8') for date, value in json.load(f).items()}
+
+    def put(self, transaction):
+        self.state[transaction['ID']] = json.dumps(transaction, separators=(',', ':')).encode('utf-8')
+        self.sorted_keys = None
+
+    def load_csv(self, path, tamper_pct=0.0, missing_pct=0.0, seed=42):
+        """
+        Record every paid transaction of a transactions.csv. tamper_pct of
+        them get a different hash and missing_pct are left off the ledger,
+        so verifiers have something to find. Returns (loaded, tampered, missing).
+        """
+        rng = random.Random(seed)
+        loaded = tampered = missing = 0
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                if not row['blockchain_hash']:
+                    continue
+                draw = rng.random() * 100
+                if draw < missing_pct:
+                    missing += 1
+                    continue
+                blockchain_hash = row['blockchain_hash']
+                if draw < missing_pct + tamper_pct:
+                    blockchain_hash = blockchain_hash[::-1]
+                    tampered += 1
+                self.put({
+                    'ID': row['transaction_id'],
+                    'date': row['transaction_date'][:10],
+                    'farmerID': row['farmer_id'],
+                    'productID': row['product_id'],
+                    'quantity': float(row['quantity_kg']),
+                    'amount': float(row['total_amount']),
+                    'blockchainHash': blockchain_hash,
+                })
+                loaded += 1
+        return loaded, tampered, missing
+
+    def _handler(self, fcn):
+        with self.lock:
+            self.calls += 1
+        handler = getattr(self, fcn, None)
+        if handler is None or fcn.startswith('_') or not fcn[0].isupper():
+            raise LedgerError(f"function {fcn} not found in contract")
+        return handler
+
+    def evaluate(self, fcn, *args):
+        """Run a query function; returns the JSON response bytes or raises LedgerError"""
+        handler = self._handler(fcn)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return handler(*args)
+
+    async def evaluate_async(self, fcn, *args):
+        """evaluate() for asyncio callers: the round trip is awaited, so calls overlap"""
+        handler = self._handler(fcn)
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return handler(*args)
+
+    def ReadTransaction(self, id):
+        value = self.state.get(id)
+        if value is None:
+            raise LedgerError(f"the asset {id} does not exist")
+        return value
+
+    def ReadTransactions(self, ids_json):
+        """Batch read: the entries found for a JSON list of IDs, in request order"""
+        found = [self.state[id] for id in json.loads(ids_json) if id in self.state]
+        return b'[' + b','.join(found) + b']'
+
+    def GetAllTransactions(self):
+        return b'[' + b','.join(self.state[key] for key in sorted(self.state)) + b']'
+
+    def GetTransactionsByRange(self, start_key, end_key, page_size, bookmark):
+        """One page of IDs in [start_key, end_key) from bookmark, as GetStateByRangeWithPagination pages"""
+        with self.lock:
+            if self.sorted_keys is None:
+                self.sorted_keys = sorted(self.state)
+            keys = self.sorted_keys
+        page_size = int(page_size)
+        start = bisect.bisect_left(keys, bookmark or start_key)
+        end = bisect.bisect_left(keys, end_key) if end_key else len(keys)
+        page = keys[start:min(start + page_size, end)]
+        next_index = start + len(page)
+        return page_response([self.state[key] for key in page],
+                             keys[next_index] if next_index < end else '')
+
+    def AnchorMerkleRoot(self, date, root, leaf_count):
+        anchor = {'date': date, 'root': root, 'leafCount': int(leaf_count),
+                  'anchoredAt': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}
+        with self.lock:
+            existing = self.anchors.get(date)
+            if existing is not None:
+                existing = json.loads(existing)
+                if existing['root'] == root and existing['leafCount'] == int(leaf_count):
+                    return b''
+                raise LedgerError(f"the anchor for {date} already exists with a different root")
+            self.anchors[date] = json.dumps(anchor, separators=(',', ':')).encode('utf-8')
+            if self.anchors_file:
+                tmp_path = self.anchors_file + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({d: v.decode('utf-8') for d, v in self.anchors.items()}, f, indent=2)
+                os.replace(tmp_path, self.anchors_file)
+        return b''
+
+    def ReadMerkleRoot(self, date):
+        value = self.anchors.get(date)
+        if value is None:
+            raise LedgerError(f"the anchor for {date} does not exist")
+        return value
+
+def page_response(records, bookmark):
+    """TransactionPage JSON, as the chaincode returns it"""
+    return (b'{"records":[' + b','.join(records) + b'],"bookmark":' + json.dumps(bookmark).encode('utf-8') +
+            b',"fetchedRecordsCount":' + str(len(records)).encode('utf-8') + b'}')
+
+def synthetic_transaction(index):
+    """Transaction number index of the synthetic series (IDs TXN00000001, ...)"""
+    transaction_id = f"TXN{index:08d}"
+    return transaction_id, hashlib.sha256(transaction_id.encode()).hexdigest()
+
+class SyntheticLedger(InProcessLedger):
+    """
+    Ledger of count generated transactions, computed on demand. tamper_pct of
+    them have a different hash and missing_pct are absent, picked by a
+    deterministic scramble of the index.
+    """
+
+    def __init__(self, count, tamper_pct=0.0, missing_pct=0.0, latency_ms=0):
+        super().__init__(latency_ms=latency_ms)
+        self.count = count
+        self.tamper_pct = tamper_pct
+        self.missing_pct = missing_pct
+
+    def _draw(self, index):
+        return (index * 2654435761 % 2 ** 32) / 2 ** 32 * 100
+
+    def _record(self, index):
+        draw = self._draw(index)
+        if draw < self.missing_pct:
+            return None
+        transaction_id, blockchain_hash = synthetic_transaction(index)
+        if draw < self.missing_pct + self.tamper_pct:
+            blockchain_hash = blockchain_hash[::-1]
+        return json.dumps({'ID': transaction_id, 'blockchainHash': blockchain_hash},
+                          separators=(',', ':')).encode('utf-8')
+
+    def _index(self, key, default):
+        """First index whose ID sorts at or after key"""
+        if not key:
+            return default
+        if not key.startswith('TXN'):
+            return 1 if key < 'TXN' else self.count + 1
+        digits = key[3:11]
+        if len(digits) == 8 and digits.isdigit():
+            index = int(digits)
+            return index if key == f"TXN{index:08d}" else index + 1
+        raise LedgerError(f"unsupported range key {key}")
+
+    def ReadTransaction(self, id):
+        digits = id[3:]
+        index = int(digits) if id.startswith('TXN') and len(digits) == 8 and digits.isdigit() else 0
+        value = self._record(index) if 1 <= index <= self.count else None
+        if value is None:
+            raise LedgerError(f"the asset {id} does not exist")
+        return value
+
+    def ReadTransactions(self, ids_json):
+        found = []
+        for id in json.loads(ids_json):
+            try:
+                found.append(self.ReadTransaction(id))
+            except LedgerError:
+                pass
+        return b'[' + b','.join(found) + b']'
+
+    def GetAllTransactions(self):
+        raise LedgerError("GetAllTransactions is not available on a synthetic ledger; scan by range")
+
+    def GetTransactionsByRange(self, start_key, end_key, page_size, bookmark):
+        index = max(self._index(bookmark or start_key, 1), 1)
+        end = min(self._index(end_key, self.count + 1), self.count + 1)
+        records = []
+        while index < end and len(records) < int(page_size):
+            record = self._record(index)
+            if record is not None:
+                records.append(record)
+            index += 1
+        return page_response(records, f"TXN{index:08d}" if index < end else '')
@@ -0,0 +1,277 @@
+"""
+Ledger Range Scanner
+Walks the ledger a page at a time with GetTransactionsByRange bookmarks
+instead of pulling the whole world state with GetAllTransactions, and
+reconciles it against dw.fact_transaction in bounded memory.
+
+The transaction ID space is split into key ranges at DW quantiles. A
+bounded pool of workers scans the ranges concurrently, each merge-joining
+one ledger page at a time with DW rows streamed in the same byte order
+(COLLATE "C", the order of the ledger's keys). Transactions are reported
+as Mismatch (different hash), Missing (in the DW, not on the ledger) or
+Extra (on the ledger, not in the DW). Pages are kept in a bounded LRU
+cache keyed by range and bookmark, so rescans of a range skip the peer.
+Requires: psycopg2, fabric-sdk-py (or --in-process for the ledger stand-in)
+"""
+import argparse
+import csv
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from blockchain_client import BlockchainClient, load_config, data_dir
+from hash_integrity import connect
+from inprocess_ledger import InProcessLedger
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BOUNDARIES_SQL = """
+    SELECT percentile_disc(%(fractions)s::float8[]) WITHIN GROUP (ORDER BY transaction_id COLLATE "C")
+    FROM dw.fact_transaction
+    WHERE blockchain_hash IS NOT NULL
+"""
+
+RANGE_SQL = """
+    SELECT transaction_id, encode(blockchain_hash, 'hex')
+    FROM dw.fact_transaction
+    WHERE blockchain_hash IS NOT NULL
+      AND transaction_id COLLATE "C" >= %(start)s
+      AND (%(end)s = '' OR transaction_id COLLATE "C" < %(end)s)
+    ORDER BY transaction_id COLLATE "C"
+"""
+
+class PageCache:
+    """LRU of ledger pages, keyed by (start_key, end_key, page_size, bookmark)"""
+
+    def __init__(self, max_pages):
+        self.max_pages = max_pages
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            page = self.pages.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self.pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key, page):
+        if not self.max_pages:
+            return
+        with self.lock:
+            self.pages[key] = page
+            self.pages.move_to_end(key)
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+
+class LedgerScanner:
+    """Bookmark-paginated range scans over the ledger, several ranges at a time"""
+
+    def __init__(self, client, page_size=1000, workers=4, cache_pages=64):
+        self.client = client
+        self.page_size = page_size
+        self.workers = workers
+        self.cache = PageCache(cache_pages)
+        self.round_trips = 0
+        self.ledger_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def pages(self, start_key='', end_key=''):
+        """Yield the transactions of [start_key, end_key) one page at a time"""
+        bookmark = ''
+        while True:
+            key = (start_key, end_key, self.page_size, bookmark)
+            page = self.cache.get(key)
+            if page is None:
+                started = time.perf_counter()
+                page = self.client.get_transactions_by_range(start_key, end_key, self.page_size, bookmark)
+                with self.lock:
+                    self.round_trips += 1
+                    self.ledger_seconds += time.perf_counter() - started
+                self.cache.put(key, page)
+            records, bookmark = page
+            if records:
+                yield records
+            # Fabric returns the next start key as bookmark; a short page is the last one
+            if not bookmark or len(records) < self.page_size:
+                break
+
+    def scan(self, start_key='', end_key=''):
+        """Transactions of [start_key, end_key) in key order"""
+        for records in self.pages(start_key, end_key):
+            yield from records
+
+    def map_ranges(self, ranges, fn):
+        """Yield fn(start_key, end_key) for every range, at most workers at a time"""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(fn, start_key, end_key) for start_key, end_key in ranges]
+            for future in as_completed(futures):
+                yield future.result()
+
+def split_ranges(boundaries):
+    """[('', b1), (b1, b2), ..., (bn, '')] - the outer ranges are open-ended"""
+    keys = [''] + sorted(set(key for key in boundaries if key)) + ['']
+    return list(zip(keys[:-1], keys[1:]))
+
+def dw_boundaries(conn, shards):
+    """Transaction IDs splitting the paid DW rows into shards ranges of about equal size"""
+    cursor = conn.cursor()
+    cursor.execute(BOUNDARIES_SQL, {'fractions': [i / shards for i in range(1, shards)]})
+    boundaries = cursor.fetchone()[0] or []
+    cursor.close()
+    return boundaries
+
+def dw_rows(conn, start_key, end_key, fetch_size):
+    """(transaction_id, hex blockchain_hash) of [start_key, end_key) in ledger key order"""
+    cursor = conn.cursor(name='ledger_scan')
+    cursor.itersize = fetch_size
+    try:
+        cursor.execute(RANGE_SQL, {'start': start_key, 'end': end_key})
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+def reconcile(ledger_transactions, dw_transactions, max_findings=1000):
+    """Merge-join two ID-ordered streams; returns counts and the first max_findings differences"""
+    result = {'ledger': 0, 'dw': 0, 'matched': 0, 'mismatched': 0, 'missing': 0, 'extra': 0,
+              'findings': []}
+
+    def report(transaction_id, field, status, dw_hash, ledger_hash):
+        result[field] += 1
+        if len(result['findings']) < max_findings:
+            result['findings'].append((transaction_id, status, dw_hash, ledger_hash))
+
+    ledger_iter = iter(ledger_transactions)
+    dw_iter = iter(dw_transactions)
+    ledger_tx = next(ledger_iter, None)
+    dw_row = next(dw_iter, None)
+    while ledger_tx is not None or dw_row is not None:
+        if dw_row is None or (ledger_tx is not None and ledger_tx['ID'] < dw_row[0]):
+            result['ledger'] += 1
+            report(ledger_tx['ID'], 'extra', 'Extra', None, ledger_tx['blockchainHash'])
+            ledger_tx = next(ledger_iter, None)
+        elif ledger_tx is None or dw_row[0] < ledger_tx['ID']:
+            result['dw'] += 1
+            report(dw_row[0], 'missing', 'Missing', dw_row[1], None)
+            dw_row = next(dw_iter, None)
+        else:
+            result['ledger'] += 1
+            result['dw'] += 1
+            if ledger_tx['blockchainHash'] == dw_row[1]:
+                result['matched'] += 1
+            else:
+                report(dw_row[0], 'mismatched', 'Mismatch', dw_row[1], ledger_tx['blockchainHash'])
+            ledger_tx = next(ledger_iter, None)
+            dw_row = next(dw_iter, None)
+    return result
+
+def reconcile_ranges(scanner, ranges, dw_source, max_findings=1000):
+    """Reconcile every range with dw_source(start_key, end_key) rows; returns the combined result"""
+    def reconcile_range(start_key, end_key):
+        started = time.perf_counter()
+        shard = reconcile(scanner.scan(start_key, end_key), dw_source(start_key, end_key), max_findings)
+        shard['range'] = (start_key, end_key)
+        shard['seconds'] = time.perf_counter() - started
+        return shard
+
+    total = {'ledger': 0, 'dw': 0, 'matched': 0, 'mismatched': 0, 'missing': 0, 'extra': 0,
+             'findings': [], 'ranges': len(ranges)}
+    for shard in scanner.map_ranges(ranges, reconcile_range):
+        for field in ('ledger', 'dw', 'matched', 'mismatched', 'missing', 'extra'):
+            total[field] += shard[field]
+        total['findings'].extend(shard['findings'][:max_findings - len(total['findings'])])
+        logger.debug(f"Range [{shard['range'][0] or '-'}, {shard['range'][1] or '-'}): "
+                     f"{shard['ledger']:,} on ledger, {shard['dw']:,} in DW ({shard['seconds']:,.1f}s)")
+    return total
+
+def run_reconciliation(workers=None, findings_path=None, ledger=None):
+    config = load_config()
+    scan_config = config.get('blockchain', {}).get('scan', {})
+    workers = workers or scan_config.get('workers', 4)
+    fetch_size = scan_config.get('fetch_size', 10000)
+    max_findings = scan_config.get('max_findings', 1000)
+
+    def dw_source(start_key, end_key):
+        conn = connect(config['database'])
+        try:
+            yield from dw_rows(conn, start_key, end_key, fetch_size)
+        finally:
+            conn.close()
+
+    client = BlockchainClient(config, ledger=ledger)
+    scanner = LedgerScanner(client, scan_config.get('page_size', 1000), workers,
+                            scan_config.get('cache_pages', 64))
+    started = time.perf_counter()
+    try:
+        conn = connect(config['database'])
+        try:
+            ranges = split_ranges(dw_boundaries(conn, workers * scan_config.get('ranges_per_worker', 4)))
+        finally:
+            conn.close()
+        logger.info(f"Reconciling {len(ranges)} key ranges with {workers} workers")
+        result = reconcile_ranges(scanner, ranges, dw_source, max_findings)
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - started
+
+    if findings_path:
+        with open(findings_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['transaction_id', 'result', 'dw_hash', 'ledger_hash'])
+            writer.writerows(result['findings'])
+
+    # Print summary
+    print("\n" + "=" * 80)
+    print("LEDGER RANGE RECONCILIATION")
+    print("=" * 80)
+    print(f"Ledger: {result['ledger']:,} transactions in {scanner.round_trips:,} pages of {scanner.page_size:,} "
+          f"({result['ranges']} ranges, {workers} workers)")
+    print(f"DW: {result['dw']:,} paid transactions")
+    print(f"Matched: {result['matched']:,}")
+    print(f"Mismatched: {result['mismatched']:,}")
+    print(f"Missing from ledger: {result['missing']:,}")
+    print(f"On ledger only: {result['extra']:,}")
+    print(f"Throughput: {result['ledger'] / elapsed if elapsed else 0:,.0f} ledger entries/s ({elapsed:,.1f}s)")
+    for transaction_id, status, dw_hash, ledger_hash in result['findings'][:10]:
+        dw_text = dw_hash[:16] + '...' if dw_hash else '-'
+        ledger_text = ledger_hash[:16] + '...' if ledger_hash else '-'
+        print(f"  {status:<9}{transaction_id}  dw={dw_text}  ledger={ledger_text}")
+    if findings_path:
+        print(f"Findings: {findings_path}")
+    print("=" * 80)
+
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Reconcile the DW with the ledger by paginated key-range scans")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Ranges scanned at once (default: blockchain.scan.workers)")
+    parser.add_argument('--output', help="Write the first max_findings differences to this CSV")
+    parser.add_argument('--in-process', action='store_true',
+                        help="Scan the ledger stand-in, loaded from data/transactions.csv")
+    parser.add_argument('--tamper-pct', type=float, default=0.0, help="Stand-in: %% of hashes altered")
+    parser.add_argument('--missing-pct', type=float, default=0.0, help="Stand-in: %% of transactions left off")
+    args = parser.parse_args()
+
+    ledger = None
+    if args.in_process:
+        latency_ms = load_config().get('blockchain', {}).get('simulated_ledger', {}).get('latency_ms', 50)
+        ledger = InProcessLedger(latency_ms=latency_ms)
+        loaded, tampered, missing = ledger.load_csv(os.path.join(data_dir(), 'transactions.csv'),
+                                                    args.tamper_pct, args.missing_pct)
+        logger.info(f"Ledger stand-in: {loaded:,} transactions ({tampered:,} tampered, {missing:,} left off)")
+
+    run_reconciliation(args.workers, args.output, ledger)
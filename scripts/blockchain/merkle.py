@@ -0,0 +1,64 @@
+"""
+Merkle Trees
+Binary SHA-256 Merkle trees over transaction hashes, with inclusion proofs.
+
+Leaves and interior nodes are domain-separated (0x00 / 0x01 prefixes) so
+a leaf can never be passed off as a node. An odd node at the end of a
+level is promoted unchanged rather than paired with itself, so every tree
+has exactly one root for a given list of leaves.
+"""
+import hashlib
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+def leaf_hash(transaction_id, blockchain_hash):
+    """Leaf for one transaction: binds the ID to its 32-byte hash (BYTEA as stored in the DW)"""
+    return hashlib.sha256(LEAF_PREFIX + transaction_id.encode('utf-8') + b'\x00' +
+                          bytes(blockchain_hash)).digest()
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+def build_levels(leaves):
+    """All tree levels, leaves first and the root level ([root]) last"""
+    if not leaves:
+        raise ValueError("cannot build a Merkle tree without leaves")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+def merkle_root(leaves):
+    return build_levels(leaves)[-1][0]
+
+def inclusion_proof(levels, index):
+    """Sibling path for leaf index: [(sibling, sibling_is_left), ...] from the leaves up"""
+    if not 0 <= index < len(levels[0]):
+        raise IndexError(f"leaf {index} out of range (tree has {len(levels[0])} leaves)")
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((level[sibling], sibling < index))
+        index //= 2
+    return proof
+
+def verify_proof(leaf, proof, root):
+    """True if leaf hashes up to root along proof"""
+    node = leaf
+    for sibling, sibling_is_left in proof:
+        node = node_hash(sibling, node) if sibling_is_left else node_hash(node, sibling)
+    return node == root
+
+def pack_level(nodes):
+    """One level as concatenated 32-byte nodes (for BYTEA storage)"""
+    return b''.join(nodes)
+
+def unpack_level(data):
+    data = bytes(data)
+    return [data[i:i + 32] for i in range(0, len(data), 32)]
@@ -0,0 +1,314 @@
+"""
+Merkle Anchoring of Daily Transaction Batches
+Builds a Merkle tree over each day's paid fact_transaction hashes, stores
+the root (and the tree levels) in dw.transaction_anchor /
+dw.transaction_anchor_level, and anchors one root per day on the ledger.
+
+    build   Anchor every closed day that is not anchored yet
+    audit   Recompute each anchored day's root from the DW in one scan and
+            compare it with the stored and the anchored root
+    prove   Inclusion proof for one transaction, checked against the
+            anchored root (O(log n) hashes instead of a ledger lookup)
+
+Leaves are ordered by transaction_id. A day is closed settle_days after
+it ends; rows changed or added after anchoring make the day fail audit.
+Requires: psycopg2, fabric-sdk-py (or --in-process for the ledger stand-in)
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import date, timedelta
+
+import psycopg2
+
+from blockchain_client import BlockchainClient, load_config, data_dir
+from inprocess_ledger import InProcessLedger, LedgerError
+from merkle import (
+    leaf_hash, build_levels, inclusion_proof, verify_proof, pack_level, unpack_level
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PENDING_DAYS_SQL = """
+    SELECT ft.date_key, COUNT(*)
+    FROM dw.fact_transaction ft
+    LEFT JOIN dw.transaction_anchor ta
+        ON ta.date_key = ft.date_key AND ta.anchor_status = 'Anchored'
+    WHERE ft.blockchain_hash IS NOT NULL
+      AND ft.date_key BETWEEN %(start)s AND %(end)s
+      AND ta.date_key IS NULL
+    GROUP BY ft.date_key
+    ORDER BY ft.date_key
+"""
+
+LEAVES_SQL = """
+    SELECT date_key, transaction_id, blockchain_hash
+    FROM dw.fact_transaction
+    WHERE blockchain_hash IS NOT NULL
+      AND date_key BETWEEN %(start)s AND %(end)s
+    ORDER BY date_key, transaction_id
+"""
+
+def to_date_key(value):
+    return int(value.strftime('%Y%m%d'))
+
+def date_key_iso(date_key):
+    text = str(date_key)
+    return f"{text[:4]}-{text[4:6]}-{text[6:]}"
+
+def daily_leaves(conn, start_key, end_key, fetch_size=10000):
+    """Yield (date_key, leaves) per day from one ordered server-side scan"""
+    cursor = conn.cursor(name='merkle_leaves')
+    cursor.itersize = fetch_size
+    try:
+        cursor.execute(LEAVES_SQL, {'start': start_key, 'end': end_key})
+        current, leaves = None, []
+        for date_key, transaction_id, blockchain_hash in cursor:
+            if date_key != current:
+                if leaves:
+                    yield current, leaves
+                current, leaves = date_key, []
+            leaves.append(leaf_hash(transaction_id, blockchain_hash))
+        if leaves:
+            yield current, leaves
+    finally:
+        cursor.close()
+
+class MerkleAnchorer:
+    """Builds, stores, anchors, audits and proves daily Merkle trees"""
+
+    def __init__(self, conn, client, store_levels=True, fetch_size=10000):
+        self.conn = conn
+        self.client = client
+        self.store_levels = store_levels
+        self.fetch_size = fetch_size
+
+    def store(self, date_key, levels):
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO dw.transaction_anchor (date_key, leaf_count, merkle_root, anchor_status)
+                VALUES (%s, %s, %s, 'Pending')
+                ON CONFLICT (date_key) DO UPDATE SET
+                    leaf_count = EXCLUDED.leaf_count,
+                    merkle_root = EXCLUDED.merkle_root,
+                    anchor_status = 'Pending',
+                    anchored_at = NULL,
+                    built_at = CURRENT_TIMESTAMP
+            """, (date_key, len(levels[0]), levels[-1][0].hex()))
+            cursor.execute("DELETE FROM dw.transaction_anchor_level WHERE date_key = %s", (date_key,))
+            if self.store_levels:
+                for level, nodes in enumerate(levels):
+                    cursor.execute("""
+                        INSERT INTO dw.transaction_anchor_level (date_key, level, nodes)
+                        VALUES (%s, %s, %s)
+                    """, (date_key, level, psycopg2.Binary(pack_level(nodes))))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def mark_anchored(self, date_key):
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            UPDATE dw.transaction_anchor
+            SET anchor_status = 'Anchored', anchored_at = CURRENT_TIMESTAMP
+            WHERE date_key = %s
+        """, (date_key,))
+        self.conn.commit()
+        cursor.close()
+
+    def build(self, start_key, end_key):
+        """Build and anchor every unanchored day in [start_key, end_key]"""
+        cursor = self.conn.cursor()
+        cursor.execute(PENDING_DAYS_SQL, {'start': start_key, 'end': end_key})
+        pending = dict(cursor.fetchall())
+        cursor.close()
+        if not pending:
+            return {'days': 0, 'anchored': 0, 'failed': 0, 'leaves': 0}
+
+        anchored = failed = leaves_total = 0
+        for date_key, leaves in daily_leaves(self.conn, min(pending), max(pending), self.fetch_size):
+            if date_key not in pending:
+                continue
+            levels = build_levels(leaves)
+            root = levels[-1][0].hex()
+            self.store(date_key, levels)
+            try:
+                self.client.anchor_merkle_root(date_key_iso(date_key), root, len(leaves))
+            except LedgerError as e:
+                failed += 1
+                logger.error(f"{date_key_iso(date_key)}: not anchored: {e}")
+                continue
+            self.mark_anchored(date_key)
+            anchored += 1
+            leaves_total += len(leaves)
+            logger.info(f"{date_key_iso(date_key)}: anchored {len(leaves):,} transactions, root {root[:16]}...")
+        return {'days': len(pending), 'anchored': anchored, 'failed': failed, 'leaves': leaves_total}
+
+    def audit(self, start_key, end_key):
+        """Per anchored day: Pass, or Fail with what disagrees"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT date_key, leaf_count, merkle_root FROM dw.transaction_anchor
+            WHERE anchor_status = 'Anchored' AND date_key BETWEEN %s AND %s
+        """, (start_key, end_key))
+        stored = {date_key: (leaf_count, root) for date_key, leaf_count, root in cursor.fetchall()}
+        cursor.close()
+
+        results = {}
+        if stored:
+            for date_key, leaves in daily_leaves(self.conn, min(stored), max(stored), self.fetch_size):
+                if date_key in stored:
+                    results[date_key] = (len(leaves), build_levels(leaves)[-1][0].hex())
+
+        report = []
+        for date_key, (leaf_count, stored_root) in sorted(stored.items()):
+            dw_count, dw_root = results.get(date_key, (0, None))
+            anchor = self.client.read_merkle_root(date_key_iso(date_key))
+            problems = []
+            if anchor is None:
+                problems.append("not on ledger")
+            elif anchor['root'] != stored_root:
+                problems.append("stored root differs from ledger")
+            if dw_root != stored_root:
+                problems.append(f"DW rows changed ({leaf_count:,} anchored, {dw_count:,} now)"
+                                if dw_count != leaf_count else "DW hashes changed")
+            report.append({
+                'date': date_key_iso(date_key),
+                'leaf_count': leaf_count,
+                'status': 'Fail' if problems else 'Pass',
+                'problems': problems,
+            })
+        return report
+
+    def prove(self, transaction_id):
+        """Inclusion proof for transaction_id and whether it verifies against the anchored root"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT date_key, blockchain_hash FROM dw.fact_transaction
+            WHERE transaction_id = %s AND blockchain_hash IS NOT NULL
+        """, (transaction_id,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.close()
+            raise LookupError(f"{transaction_id} has no blockchain hash in the DW")
+        date_key, blockchain_hash = row
+
+        cursor.execute("""
+            SELECT level, nodes FROM dw.transaction_anchor_level
+            WHERE date_key = %s ORDER BY level
+        """, (date_key,))
+        levels = [unpack_level(nodes) for _, nodes in cursor.fetchall()]
+        cursor.close()
+        if not levels:
+            # Levels not stored: rebuild the day's tree
+            for _, leaves in daily_leaves(self.conn, date_key, date_key, self.fetch_size):
+                levels = build_levels(leaves)
+
+        leaf = leaf_hash(transaction_id, blockchain_hash)
+        try:
+            index = levels[0].index(leaf)
+        except ValueError:
+            raise LookupError(f"{transaction_id} is not in the {date_key_iso(date_key)} tree "
+                              f"(added or changed after it was built)") from None
+        proof = inclusion_proof(levels, index)
+        anchor = self.client.read_merkle_root(date_key_iso(date_key))
+        return {
+            'transaction_id': transaction_id,
+            'date': date_key_iso(date_key),
+            'leaf': leaf.hex(),
+            'index': index,
+            'proof': [{'hash': sibling.hex(), 'side': 'left' if is_left else 'right'}
+                      for sibling, is_left in proof],
+            'anchored_root': anchor['root'] if anchor else None,
+            'verified': bool(anchor) and verify_proof(leaf, proof, bytes.fromhex(anchor['root'])),
+        }
+
+def run_anchoring(action, start_date=None, end_date=None, transaction_id=None, ledger=None):
+    config = load_config()
+    merkle_config = config.get('blockchain', {}).get('merkle', {})
+    settle_days = merkle_config.get('settle_days', 1)
+
+    # build only anchors closed days
+    latest = date.today() - timedelta(days=settle_days + 1)
+    if action == 'build' and (end_date is None or end_date > latest):
+        end_date = latest
+    start_key = to_date_key(start_date) if start_date else 0
+    end_key = to_date_key(end_date) if end_date else 99991231
+
+    db = config['database']
+    conn = psycopg2.connect(
+        host=db['host'],
+        port=db['port'],
+        database=db['database'],
+        user=db['user'],
+        password=db['password']
+    )
+    client = BlockchainClient(config, ledger=ledger)
+    anchorer = MerkleAnchorer(conn, client, merkle_config.get('store_levels', True),
+                              merkle_config.get('fetch_size', 10000))
+    started = time.perf_counter()
+    try:
+        if action == 'build':
+            result = anchorer.build(start_key, end_key)
+        elif action == 'audit':
+            result = anchorer.audit(start_key, end_key)
+        else:
+            result = anchorer.prove(transaction_id)
+    finally:
+        client.close()
+        conn.close()
+    elapsed = time.perf_counter() - started
+
+    # Print summary
+    print("\n" + "=" * 80)
+    print(f"MERKLE ANCHORING: {action.upper()}")
+    print("=" * 80)
+    if action == 'build':
+        print(f"Days to anchor: {result['days']:,} (through {end_date.isoformat()})")
+        print(f"Anchored: {result['anchored']:,} days, {result['leaves']:,} transactions")
+        print(f"Failed: {result['failed']:,}")
+    elif action == 'audit':
+        failed = [r for r in result if r['status'] == 'Fail']
+        print(f"Days audited: {len(result):,} ({sum(r['leaf_count'] for r in result):,} transactions)")
+        print(f"Passed: {len(result) - len(failed):,}")
+        print(f"Failed: {len(failed):,}")
+        for r in failed[:20]:
+            print(f"  {r['date']}: {'; '.join(r['problems'])}")
+    else:
+        print(json.dumps(result, indent=2))
+    print(f"Time: {elapsed:,.2f}s")
+    print("=" * 80)
+
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Anchor daily Merkle roots of transaction hashes")
+    parser.add_argument('action', choices=['build', 'audit', 'prove'])
+    parser.add_argument('--from-date', type=date.fromisoformat, help="First day (YYYY-MM-DD)")
+    parser.add_argument('--to-date', type=date.fromisoformat, help="Last day (YYYY-MM-DD)")
+    parser.add_argument('--transaction-id', help="Transaction to prove (prove)")
+    parser.add_argument('--in-process', action='store_true',
+                        help="Use the ledger stand-in (loaded from data/transactions.csv, "
+                             "anchors kept in blockchain.simulated_ledger.anchors_file)")
+    args = parser.parse_args()
+    if args.action == 'prove' and not args.transaction_id:
+        parser.error("prove needs --transaction-id")
+
+    ledger = None
+    if args.in_process:
+        simulated = load_config().get('blockchain', {}).get('simulated_ledger', {})
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        ledger = InProcessLedger(
+            latency_ms=simulated.get('latency_ms', 50),
+            anchors_file=os.path.join(script_dir, simulated.get('anchors_file', 'inprocess_ledger_anchors.json'))
+        )
+        ledger.load_csv(os.path.join(data_dir(), 'transactions.csv'))
+
+    run_anchoring(args.action, args.from_date, args.to_date, args.transaction_id, ledger)
@@ -95,7 +95,8 @@ def generate_transactions(num_transactions=10000, farmers_df=None, products_df=N
     }
     
     # Generate transactions over the past year
-    end_date = datetime.now()
+    # Whole seconds: the hash input must match the timestamp written to the CSV/DW
+    end_date = datetime.now().replace(microsecond=0)
     start_date = end_date - timedelta(days=365)
     
     for i in range(num_transactions):
@@ -0,0 +1,236 @@
+"""
+Benchmark Index Profile
+Measures fact load time and dashboard query latency before and after
+applying sql/ddl/05_index_profile.sql.
+
+The whole benchmark runs in one transaction and is rolled back unless
+--apply is given, so it can be run against a live warehouse.
+"""
+import argparse
+import logging
+import os
+import statistics
+import time
+
+import psycopg2
+import yaml
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Representative queries behind the Power BI dashboards
+# (see powerbi/dashboard_specifications.md)
+DASHBOARD_QUERIES = {
+    'monthly_revenue': """
+        SELECT dd.year, dd.month, SUM(ft.total_amount), SUM(ft.transaction_count)
+        FROM dw.fact_transaction ft
+        JOIN dw.dim_date dd ON ft.date_key = dd.date_key
+        WHERE ft.date_key >= %(start_key)s
+        GROUP BY dd.year, dd.month
+    """,
+    'revenue_by_category': """
+        SELECT dp.category, SUM(ft.total_amount), SUM(ft.quantity_kg)
+        FROM dw.fact_transaction ft
+        JOIN dw.dim_product dp ON ft.product_key = dp.product_key
+        WHERE ft.date_key >= %(start_key)s
+        GROUP BY dp.category
+    """,
+    'top_10_products': """
+        SELECT ft.product_key, SUM(ft.total_amount) as revenue
+        FROM dw.fact_transaction ft
+        WHERE ft.date_key >= %(start_key)s
+        GROUP BY ft.product_key
+        ORDER BY revenue DESC
+        LIMIT 10
+    """,
+    'top_20_farmers': """
+        SELECT ft.farmer_key, SUM(ft.total_amount) as revenue, SUM(ft.quantity_kg)
+        FROM dw.fact_transaction ft
+        WHERE ft.date_key >= %(start_key)s
+        GROUP BY ft.farmer_key
+        ORDER BY revenue DESC
+        LIMIT 20
+    """,
+    'market_type_quantity': """
+        SELECT dm.market_type, SUM(ft.quantity_kg)
+        FROM dw.fact_transaction ft
+        JOIN dw.dim_market dm ON ft.market_key = dm.market_key
+        WHERE ft.date_key >= %(start_key)s
+        GROUP BY dm.market_type
+    """,
+    'single_product_trend': """
+        SELECT ft.date_key, SUM(ft.total_amount)
+        FROM dw.fact_transaction ft
+        WHERE ft.product_key = (SELECT MIN(product_key) FROM dw.dim_product)
+          AND ft.date_key >= %(start_key)s
+        GROUP BY ft.date_key
+    """,
+    'price_trends': """
+        SELECT fp.product_key, fp.date_key, AVG(fp.wholesale_price)
+        FROM dw.fact_pricing fp
+        WHERE fp.date_key >= %(start_key)s
+        GROUP BY fp.product_key, fp.date_key
+    """,
+}
+
+FACT_TRANSACTION_COLUMNS = """
+    farmer_key, buyer_key, product_key, market_key, date_key,
+    payment_key, quality_key, transaction_id, blockchain_hash, payment_status,
+    quantity_kg, unit_price, total_amount, transaction_count, payment_fee, net_amount,
+    transaction_timestamp
+"""
+
+def load_config(config_path='etl_config.yaml'):
+    if not os.path.exists(config_path):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        config_path = os.path.join(current_dir, 'etl_config.yaml')
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f)
+
+def load_profile_sql():
+    """Read the index profile DDL"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    profile_path = os.path.join(project_root, 'sql', 'ddl', '05_index_profile.sql')
+    with open(profile_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def time_queries(cursor, params, repeats):
+    """Return median latency in ms for each dashboard query"""
+    latencies = {}
+    for name, query in DASHBOARD_QUERIES.items():
+        cursor.execute(query, params)  # Warm-up
+        cursor.fetchall()
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            cursor.execute(query, params)
+            cursor.fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+        latencies[name] = statistics.median(samples)
+    return latencies
+
+def time_fact_load(cursor, sample_rows):
+    """
+    Time an INSERT ... SELECT of sample_rows into fact_transaction, ordered by
+    date like the ETL load. The rows are rolled back to a savepoint afterwards.
+    """
+    cursor.execute("SAVEPOINT bench_load")
+    start = time.perf_counter()
+    cursor.execute(f"""
+        INSERT INTO dw.fact_transaction ({FACT_TRANSACTION_COLUMNS})
+        SELECT {FACT_TRANSACTION_COLUMNS}
+        FROM (
+            SELECT * FROM dw.fact_transaction ORDER BY date_key LIMIT %s
+        ) sample
+    """, (sample_rows,))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    rows = cursor.rowcount
+    cursor.execute("ROLLBACK TO SAVEPOINT bench_load")
+    return rows, elapsed_ms
+
+def index_size_mb(cursor):
+    """Total size of indexes on dw fact tables"""
+    cursor.execute("""
+        SELECT COALESCE(SUM(pg_relation_size(indexrelid)), 0) / 1024.0 / 1024.0
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'dw' AND c.relname LIKE 'fact_%'
+    """)
+    return float(cursor.fetchone()[0])
+
+def measure(cursor, params, repeats, sample_rows):
+    rows, load_ms = time_fact_load(cursor, sample_rows)
+    return {
+        'load_rows': rows,
+        'load_ms': load_ms,
+        'index_mb': index_size_mb(cursor),
+        'queries': time_queries(cursor, params, repeats),
+    }
+
+def run_benchmark(apply=False, repeats=5, sample_rows=10000, window_days=90):
+    config = load_config()
+    db_config = config['database']
+
+    conn = None
+    try:
+        conn = psycopg2.connect(
+            host=db_config['host'],
+            port=db_config['port'],
+            database=db_config['database'],
+            user=db_config['user'],
+            password=db_config['password']
+        )
+        conn.autocommit = False
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT TO_CHAR(MAX(transaction_timestamp) - %s * INTERVAL '1 day', 'YYYYMMDD')::INTEGER
+            FROM dw.fact_transaction
+        """, (window_days,))
+        params = {'start_key': cursor.fetchone()[0] or 0}
+
+        logger.info("Measuring current index set...")
+        before = measure(cursor, params, repeats, sample_rows)
+
+        logger.info("Applying index profile...")
+        cursor.execute(load_profile_sql())
+
+        logger.info("Measuring index profile...")
+        after = measure(cursor, params, repeats, sample_rows)
+
+        if apply:
+            conn.commit()
+            logger.info("Index profile committed")
+        else:
+            conn.rollback()
+            logger.info("Index profile rolled back (use --apply to keep it)")
+
+        print("\n" + "=" * 80)
+        print("INDEX PROFILE BENCHMARK")
+        print("=" * 80)
+        print(f"{'Metric':<32}{'Before':>14}{'After':>14}{'Change':>12}")
+        print("-" * 80)
+        rows = [
+            (f"Load {before['load_rows']:,} rows (ms)", before['load_ms'], after['load_ms']),
+            ("Fact index size (MB)", before['index_mb'], after['index_mb']),
+        ]
+        rows += [
+            (f"{name} (ms)", before['queries'][name], after['queries'][name])
+            for name in DASHBOARD_QUERIES
+        ]
+        for label, b, a in rows:
+            change = (a - b) / b * 100 if b else 0
+            print(f"{label:<32}{b:>14.2f}{a:>14.2f}{change:>+11.1f}%")
+        print("=" * 80)
+
+        return before, after
+
+    except Exception as e:
+        logger.error(f"Benchmark failed: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the fact index profile")
+    parser.add_argument('--apply', action='store_true', help="Commit the index profile after benchmarking")
+    parser.add_argument('--repeats', type=int, default=5, help="Timed runs per query")
+    parser.add_argument('--sample-rows', type=int, default=10000, help="Rows inserted for the load benchmark")
+    parser.add_argument('--window-days', type=int, default=90, help="Date range used by the dashboard queries")
+    args = parser.parse_args()
+
+    run_benchmark(
+        apply=args.apply,
+        repeats=args.repeats,
+        sample_rows=args.sample_rows,
+        window_days=args.window_days
+    )
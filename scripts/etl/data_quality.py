@@ -0,0 +1,380 @@
+"""
+Data Quality Checks
+Declares null, duplicate, range, validation, referential and freshness checks
+per staging and DW table, compiles each table's checks into one set-based
+scan (COUNT(*) FILTER aggregates, with referenced keys hash-joined once), and
+runs the tables in parallel, one connection each. Results are graded
+Pass/Warning/Fail against the data_quality thresholds in etl_config.yaml and
+written to audit.data_quality_log.
+
+Runs inside the ETL (etl_staging_to_dw.py, when data_quality.enabled) or on
+its own: python data_quality.py [--schema staging|dw]
+Requires: psycopg2
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import psycopg2
+import yaml
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Per table: not_null [columns], unique [column tuples], range {column: (min, max)}
+# (None leaves a side open), rules {name: predicate over the table's own columns},
+# references {column: (table, key)}, freshness column, and an optional filter
+# limiting the rows checked (current SCD Type 2 versions).
+CHECKS = {
+    'staging.stg_farmers': {
+        'not_null': ['district', 'gender', 'phone_number', 'farm_size_acres', 'primary_crop'],
+        'unique': [('phone_number',)],
+        'range': {'farm_size_acres': (0.01, 1000), 'gps_latitude': (-1.5, 4.3), 'gps_longitude': (29.5, 35.1)},
+        'freshness': 'loaded_at',
+    },
+    'staging.stg_buyers': {
+        'not_null': ['buyer_type', 'district', 'phone_number'],
+        'unique': [('registration_number',)],
+        'freshness': 'loaded_at',
+    },
+    'staging.stg_products': {
+        'not_null': ['category', 'unit_of_measure'],
+        'unique': [('product_name', 'variety')],
+        'range': {'avg_growing_days': (1, 730)},
+        'freshness': 'loaded_at',
+    },
+    'staging.stg_markets': {
+        'not_null': ['district', 'market_type'],
+        'unique': [('market_name', 'district')],
+        'range': {'capacity_kg': (0, None)},
+        'freshness': 'loaded_at',
+    },
+    'staging.stg_transactions': {
+        'not_null': ['farmer_id', 'buyer_id', 'product_id', 'market_id', 'quantity_kg',
+                     'quality_grade', 'unit_price', 'total_amount', 'payment_method', 'payment_status'],
+        'range': {'quantity_kg': (0.01, 100000), 'unit_price': (0.01, 1000000)},
+        'rules': {'total_amount_matches': 'ABS(total_amount - quantity_kg * unit_price) <= 0.01 * total_amount'},
+        'references': {
+            'farmer_id': ('staging.stg_farmers', 'farmer_id'),
+            'buyer_id': ('staging.stg_buyers', 'buyer_id'),
+            'product_id': ('staging.stg_products', 'product_id'),
+            'market_id': ('staging.stg_markets', 'market_id'),
+            'payment_method': ('dw.dim_payment_method', 'payment_method'),
+        },
+        'freshness': 'loaded_at',
+    },
+    'staging.stg_harvests': {
+        'not_null': ['farmer_id', 'product_id', 'planting_date', 'harvest_date', 'quantity_kg'],
+        'range': {'post_harvest_loss_pct': (0, 100)},
+        'rules': {'harvest_after_planting': 'harvest_date >= planting_date'},
+        'references': {
+            'farmer_id': ('staging.stg_farmers', 'farmer_id'),
+            'product_id': ('staging.stg_products', 'product_id'),
+        },
+        'freshness': 'loaded_at',
+    },
+    'staging.stg_pricing': {
+        'not_null': ['product_id', 'market_id', 'wholesale_price', 'retail_price'],
+        'unique': [('product_id', 'market_id', 'price_date')],
+        'rules': {'wholesale_below_retail': 'wholesale_price < retail_price'},
+        'references': {
+            'product_id': ('staging.stg_products', 'product_id'),
+            'market_id': ('staging.stg_markets', 'market_id'),
+        },
+        'freshness': 'loaded_at',
+    },
+    'staging.stg_weather': {
+        'not_null': ['district', 'rainfall_mm', 'temperature_avg'],
+        'unique': [('district', 'weather_date')],
+        'range': {'humidity_pct': (0, 100), 'rainfall_mm': (0, 500), 'temperature_avg': (-5, 45)},
+        'rules': {'temperature_ordered': 'temperature_min <= temperature_max'},
+        'freshness': 'loaded_at',
+    },
+    'staging.stg_subsidies': {
+        'not_null': ['farmer_id', 'subsidy_id', 'amount_value', 'distribution_date'],
+        'unique': [('farmer_id', 'subsidy_id')],
+        'range': {'amount_value': (0.01, None)},
+        'references': {'farmer_id': ('staging.stg_farmers', 'farmer_id')},
+        'freshness': 'loaded_at',
+    },
+    'dw.dim_farmer': {
+        'filter': 'is_current',
+        'not_null': ['region', 'age_group', 'farm_size_category'],
+        'unique': [('farmer_id',)],
+    },
+    'dw.dim_buyer': {
+        'filter': 'is_current',
+        'not_null': ['region', 'buyer_category'],
+        'unique': [('buyer_id',)],
+    },
+    'dw.dim_product': {
+        'filter': 'is_current',
+        'not_null': ['category_group'],
+        'unique': [('product_id',)],
+    },
+    'dw.dim_market': {
+        'filter': 'is_current',
+        'not_null': ['region', 'capacity_category'],
+        'unique': [('market_id',)],
+    },
+    'dw.fact_transaction': {
+        'not_null': ['payment_status', 'net_amount'],
+        'unique': [('transaction_id',)],
+        'rules': {'total_amount_matches': 'ABS(total_amount - quantity_kg * unit_price) <= 0.01 * total_amount'},
+        'freshness': 'created_at',
+    },
+    'dw.fact_harvest': {
+        'not_null': ['location_key', 'net_quantity_kg', 'growing_days'],
+        'unique': [('harvest_id',)],
+        'range': {'post_harvest_loss_pct': (0, 100), 'growing_days': (0, 730)},
+        'freshness': 'created_at',
+    },
+    'dw.fact_pricing': {
+        'not_null': ['price_spread', 'source'],
+        'unique': [('price_id',)],
+        'rules': {'wholesale_below_retail': 'wholesale_price < retail_price'},
+        'freshness': 'created_at',
+    },
+    'dw.fact_subsidy': {
+        'not_null': ['subsidy_id', 'distribution_date'],
+        'unique': [('farmer_subsidy_id',)],
+        'freshness': 'created_at',
+    },
+}
+
+THRESHOLD_KEYS = {
+    'Null': 'null_threshold_pct',
+    'Duplicate': 'duplicate_threshold_pct',
+    'Range': 'range_threshold_pct',
+    'Validation': 'range_threshold_pct',
+    'Referential': 'referential_threshold_pct',
+}
+
+def compile_checks(table, checks):
+    """
+    Build the single scan for a table. Returns (sql, params, specs), where
+    specs lists (check_name, check_type, column alias, details) in the order
+    of the selected aggregates after the leading row count.
+    """
+    selects = ['COUNT(*)']
+    joins = []
+    params = {}
+    specs = []
+
+    def add(expression, check_name, check_type, details):
+        alias = f"c{len(specs)}"
+        selects.append(f"{expression} as {alias}")
+        specs.append((check_name, check_type, alias, details))
+
+    for column in checks.get('not_null', []):
+        add(f"COUNT(*) FILTER (WHERE t.{column} IS NULL)",
+            f"{column}_not_null", 'Null', {'column': column})
+
+    for columns in checks.get('unique', []):
+        present = ' AND '.join(f"t.{column} IS NOT NULL" for column in columns)
+        key = f"t.{columns[0]}" if len(columns) == 1 else f"({', '.join('t.' + c for c in columns)})"
+        # Extra copies of a key: rows carrying one minus distinct keys
+        add(f"COUNT(*) FILTER (WHERE {present}) - COUNT(DISTINCT {key}) FILTER (WHERE {present})",
+            f"{'_'.join(columns)}_unique", 'Duplicate', {'columns': list(columns)})
+
+    for column, (low, high) in checks.get('range', {}).items():
+        bounds = []
+        if low is not None:
+            params[f"{column}_min"] = low
+            bounds.append(f"t.{column} < %({column}_min)s")
+        if high is not None:
+            params[f"{column}_max"] = high
+            bounds.append(f"t.{column} > %({column}_max)s")
+        add(f"COUNT(*) FILTER (WHERE {' OR '.join(bounds)})",
+            f"{column}_range", 'Range', {'column': column, 'min': low, 'max': high})
+
+    for rule, predicate in checks.get('rules', {}).items():
+        # A rule that evaluates to NULL is left to the null checks
+        add(f"COUNT(*) FILTER (WHERE NOT ({predicate}))", rule, 'Validation', {'rule': predicate})
+
+    for number, (column, (ref_table, ref_key)) in enumerate(checks.get('references', {}).items()):
+        # Each referenced key set is read once and hash-joined; DISTINCT keeps the row count intact
+        joins.append(f"LEFT JOIN (SELECT DISTINCT {ref_key} FROM {ref_table}) r{number} "
+                     f"ON r{number}.{ref_key} = t.{column}")
+        add(f"COUNT(*) FILTER (WHERE t.{column} IS NOT NULL AND r{number}.{ref_key} IS NULL)",
+            f"{column}_references_{ref_table.split('.')[-1]}", 'Referential',
+            {'column': column, 'references': f"{ref_table}.{ref_key}"})
+
+    if checks.get('freshness'):
+        column = checks['freshness']
+        # Age of the newest row in hours, on the server clock the column was stamped with
+        add(f"EXTRACT(EPOCH FROM (LOCALTIMESTAMP - MAX(t.{column}))) / 3600",
+            f"{column}_freshness", 'Freshness', {'column': column})
+
+    where = f"WHERE {checks['filter']}" if checks.get('filter') else ''
+    query = f"SELECT {', '.join(selects)} FROM {table} t {' '.join(joins)} {where}"
+    return query, params, specs
+
+def grade(failed, checked, threshold_pct):
+    """Pass when nothing failed, Warning up to the threshold, Fail above it"""
+    if failed == 0:
+        return 'Pass', 0
+    pct = failed / checked * 100
+    return ('Warning' if pct <= threshold_pct else 'Fail'), round(pct, 2)
+
+class DataQualityChecker:
+    """Runs the declared checks, one scan and one connection per table"""
+
+    def __init__(self, config, connect):
+        self.settings = config.get('data_quality', {})
+        self.connect = connect
+        self.workers = self.settings.get('workers', 4)
+
+    def threshold(self, check_type):
+        defaults = {'null_threshold_pct': 5, 'duplicate_threshold_pct': 1,
+                    'range_threshold_pct': 1, 'referential_threshold_pct': 0}
+        key = THRESHOLD_KEYS[check_type]
+        return self.settings.get(key, defaults[key])
+
+    def check_table(self, table):
+        """Scan one table and grade each of its checks"""
+        query, params, specs = compile_checks(table, CHECKS[table])
+        started = time.perf_counter()
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+            cursor.close()
+            conn.commit()
+        finally:
+            conn.close()
+        seconds = time.perf_counter() - started
+
+        checked = row[0]
+        results = []
+        for (check_name, check_type, _, details), value in zip(specs, row[1:]):
+            if check_type == 'Freshness':
+                # An empty table has no newest row and counts as stale
+                max_hours = self.settings.get('freshness_hours', 24)
+                stale = value is None or value > max_hours
+                details = dict(details, age_hours=None if value is None else round(float(value), 1),
+                               threshold_hours=max_hours)
+                results.append({
+                    'table_name': table, 'check_name': check_name, 'check_type': check_type,
+                    'check_result': 'Fail' if stale else 'Pass',
+                    'records_checked': checked, 'records_failed': None, 'failure_percentage': None,
+                    'check_details': details,
+                })
+                continue
+            threshold_pct = self.threshold(check_type)
+            result, pct = grade(value, checked, threshold_pct)
+            results.append({
+                'table_name': table, 'check_name': check_name, 'check_type': check_type,
+                'check_result': result, 'records_checked': checked, 'records_failed': value,
+                'failure_percentage': pct, 'check_details': dict(details, threshold_pct=threshold_pct),
+            })
+        logger.info(f"  {table}: {len(results)} checks over {checked:,} rows in {seconds:.2f}s "
+                    f"({sum(r['check_result'] != 'Pass' for r in results)} not passing)")
+        return results
+
+    def run(self, schemas=('staging', 'dw')):
+        """Check every declared table in the given schemas, in parallel"""
+        tables = [table for table in CHECKS if table.split('.')[0] in schemas]
+        logger.info(f"Running data quality checks on {len(tables)} tables with {self.workers} workers...")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.check_table, table) for table in tables]
+            return [result for future in futures for result in future.result()]
+
+def log_results(conn, execution_id, results):
+    """Write graded checks to audit.data_quality_log"""
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT INTO audit.data_quality_log
+            (execution_id, table_name, check_name, check_type, check_result,
+             records_checked, records_failed, failure_percentage, check_details)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, [(execution_id, r['table_name'], r['check_name'], r['check_type'], r['check_result'],
+           r['records_checked'], r['records_failed'], r['failure_percentage'],
+           json.dumps(r['check_details'])) for r in results])
+    conn.commit()
+    cursor.close()
+
+def load_config(config_path='etl_config.yaml'):
+    with open(Path(__file__).parent / config_path, 'r') as f:
+        return yaml.safe_load(f)
+
+def run_checks(schemas=('staging', 'dw')):
+    config = load_config()
+    db_config = config['database']
+
+    def connect():
+        return psycopg2.connect(
+            host=db_config['host'],
+            port=db_config['port'],
+            database=db_config['database'],
+            user=db_config['user'],
+            password=db_config['password']
+        )
+
+    conn = connect()
+    started = time.perf_counter()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO audit.etl_execution_log (job_name, status)
+            VALUES ('data_quality_checks', 'Running')
+            RETURNING execution_id
+        """)
+        execution_id = cursor.fetchone()[0]
+        conn.commit()
+        try:
+            results = DataQualityChecker(config, connect).run(schemas)
+        except Exception as e:
+            cursor.execute("""
+                UPDATE audit.etl_execution_log
+                SET end_time = CURRENT_TIMESTAMP, status = 'Failed', error_message = %s
+                WHERE execution_id = %s
+            """, (str(e), execution_id))
+            conn.commit()
+            raise
+        log_results(conn, execution_id, results)
+        cursor.execute("""
+            UPDATE audit.etl_execution_log
+            SET end_time = CURRENT_TIMESTAMP, status = 'Success', rows_read = %s
+            WHERE execution_id = %s
+        """, (sum({r['table_name']: r['records_checked'] for r in results}.values()), execution_id))
+        conn.commit()
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+
+    # Print summary
+    counts = {status: sum(r['check_result'] == status for r in results) for status in ('Pass', 'Warning', 'Fail')}
+    print("\n" + "=" * 80)
+    print("DATA QUALITY CHECKS")
+    print("=" * 80)
+    print(f"Tables: {len({r['table_name'] for r in results})} ({', '.join(schemas)})  "
+          f"Checks: {len(results)}  Elapsed: {elapsed:,.1f}s")
+    print(f"Pass: {counts['Pass']}  Warning: {counts['Warning']}  Fail: {counts['Fail']}")
+    for r in results:
+        if r['check_result'] != 'Pass':
+            if r['check_type'] == 'Freshness':
+                failed = f"newest row {r['check_details']['age_hours']}h old " \
+                         f"(limit {r['check_details']['threshold_hours']}h)"
+            else:
+                failed = f"{r['records_failed']:,} of {r['records_checked']:,} ({r['failure_percentage']}%)"
+            print(f"  {r['check_result']:<8} {r['table_name']:<28} {r['check_name']:<36} {failed}")
+    print(f"Logged: audit.data_quality_log (execution {execution_id})")
+    print("=" * 80)
+
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run declared data quality checks on staging and DW tables")
+    parser.add_argument('--schema', choices=['staging', 'dw'], action='append',
+                        help="Schema to check; repeat for both (default: staging and dw)")
+    args = parser.parse_args()
+
+    run_checks(schemas=tuple(args.schema or ('staging', 'dw')))
@@ -6,10 +6,14 @@ Loads data from staging tables to dimension and fact tables with SCD Type 2
 import psycopg2
 from psycopg2 import sql
 from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 import logging
+import time
 from pathlib import Path
 
+from data_quality import DataQualityChecker, log_results
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,15 +21,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Degenerate-key lookup indexes kept through drop/rebuild loads: the chunked fact
+# loads anti-join on them (rule 4 of sql/ddl/05_index_profile.sql)
+LOOKUP_KEY_COLUMNS = {'transaction_id', 'blockchain_hash', 'price_id', 'harvest_id'}
+
 class ETLPipeline:
+    """ETL Pipeline for loading data from staging to data warehouse"""
+    
+    def __init__(self, config_path='etl_config.yaml'):
+        """Initialize ETL pipeline with configuration"""
+        self.config = self.load_config(config_path)
+        self.conn = None
+        self.execution_id = None
+    
+    def load_config(self, config_path):
+        """Load configuration from YAML file"""
+        config_file = Path(__file__).parent / config_path
+        with open(config_file, 'r') as f:
+            return yaml.safe_load(f)
+    
+    def new_connection(self):
+        """Open a new database connection from the configuration"""
+        return psycopg2.connect(
+            host=self.config['database']['host'],
+            port=self.config['database']['port'],
+            database=self.config['database']['database'],
+            user=self.config['database']['user'],
+            password=self.config['database']['password']
+        )
+    
+    def connect_db(self):
+        """Establish database connection"""
         try:
-            self.conn = psycopg2.connect(
-                host=self.config['database']['host'],
-                port=self.config['database']['port'],
-                database=self.config['database']['database'],
-                user=self.config['database']['user'],
-                password=self.config['database']['password']
-            )
+            self.conn = self.new_connection()
             self.conn.autocommit = False
             logger.info("Database connection established")
         except Exception as e:
@@ -67,6 +95,310 @@ class ETLPipeline:
         self.conn.commit()
         logger.info(f"ETL job completed with status: {status}")
     
+    def estimate_batch_ratio(self, fact_table, staging_table, key_column):
+        """
+        Estimate the size of the pending batch relative to the fact table.
+        Uses the planner's row estimate for the fact table so no full count is needed;
+        the batch counts only staging rows whose natural key is not loaded yet.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT GREATEST(reltuples, 0)::BIGINT FROM pg_class WHERE oid = %s::regclass", (fact_table,))
+        table_rows = cursor.fetchone()[0]
+        cursor.execute(sql.SQL("""
+            SELECT COUNT(*) FROM {staging} s
+            WHERE NOT EXISTS (SELECT 1 FROM {fact} f WHERE f.{key} = s.{key})
+        """).format(
+            staging=sql.Identifier(*staging_table.split('.')),
+            fact=sql.Identifier(*fact_table.split('.')),
+            key=sql.Identifier(key_column),
+        ))
+        batch_rows = cursor.fetchone()[0]
+        ratio = batch_rows / table_rows if table_rows else float('inf')
+        return batch_rows, table_rows, ratio
+    
+    def get_secondary_indexes(self, fact_table):
+        """
+        Return (droppable, kept) lists of (name, definition) for indexes not backing a
+        primary key or unique constraint; indexes leading with a lookup key are kept.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT i.indexrelid::regclass::TEXT, pg_get_indexdef(i.indexrelid), a.attname
+            FROM pg_index i
+            LEFT JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = %s::regclass
+              AND NOT i.indisprimary
+              AND NOT i.indisunique
+            ORDER BY pg_relation_size(i.indexrelid) DESC
+        """, (fact_table,))
+        droppable, kept = [], []
+        for name, definition, leading_column in cursor.fetchall():
+            (kept if leading_column in LOOKUP_KEY_COLUMNS else droppable).append((name, definition))
+        return droppable, kept
+    
+    def rebuild_index(self, index_definition, maintenance_work_mem):
+        """Build one index on its own connection so several can run at once"""
+        conn = self.new_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+            cursor.execute(index_definition)
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def rebuild_indexes(self, fact_table, indexes):
+        """
+        Rebuild dropped indexes in parallel, then refresh planner statistics.
+        Every index is attempted; returns the names of those that failed.
+        """
+        rebuild_config = self.config['etl'].get('index_rebuild', {})
+        workers = rebuild_config.get('workers', 4)
+        maintenance_work_mem = rebuild_config.get('maintenance_work_mem', '256MB')
+        
+        logger.info(f"Rebuilding {len(indexes)} indexes on {fact_table} with {workers} workers...")
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                (name, executor.submit(self.rebuild_index, definition, maintenance_work_mem))
+                for name, definition in indexes
+            ]
+            for name, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Rebuilding {name} failed: {e}")
+                    failed.append(name)
+        
+        conn = self.new_connection()
+        try:
+            conn.cursor().execute(sql.SQL("ANALYZE {}").format(sql.Identifier(*fact_table.split('.'))))
+            conn.commit()
+        finally:
+            conn.close()
+        return failed
+    
+    def log_index_decision(self, fact_table, batch_rows, table_rows, ratio, threshold,
+                           decision, indexes_rebuilt=0, rebuild_seconds=None, index_definitions=None,
+                           indexes_kept=None):
+        """Record an index maintenance decision in the audit schema"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            INSERT INTO audit.index_maintenance_log (
+                execution_id, table_name, batch_rows, table_rows, batch_ratio,
+                ratio_threshold, decision, index_definitions, indexes_kept, indexes_rebuilt,
+                rebuild_seconds
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (self.execution_id, fact_table, batch_rows, table_rows,
+              None if ratio is None or ratio == float('inf') else ratio, threshold,
+              decision, index_definitions, indexes_kept, indexes_rebuilt, rebuild_seconds))
+        self.conn.commit()
+    
+    def restore_dropped_indexes(self):
+        """
+        Recreate indexes a previous run dropped but never rebuilt (e.g. the process
+        was killed mid-load). Definitions come from the latest 'Dropped' row per table
+        that no later complete 'Rebuild' row covers.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT l.table_name, d.definition
+            FROM (
+                SELECT DISTINCT ON (table_name) maintenance_id, table_name, index_definitions
+                FROM audit.index_maintenance_log
+                WHERE decision = 'Dropped'
+                ORDER BY table_name, maintenance_id DESC
+            ) l
+            CROSS JOIN LATERAL unnest(l.index_definitions) AS d(definition)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM audit.index_maintenance_log r
+                WHERE r.table_name = l.table_name
+                  AND r.maintenance_id > l.maintenance_id
+                  AND r.decision = 'Rebuild'
+                  AND r.indexes_rebuilt = cardinality(l.index_definitions)
+            )
+              AND NOT EXISTS (SELECT 1 FROM pg_indexes i WHERE i.indexdef = d.definition)
+        """)
+        missing = {}
+        for table_name, definition in cursor.fetchall():
+            name = definition.split(' ON ', 1)[0].split()[-1]
+            missing.setdefault(table_name, []).append((name, definition))
+        
+        for fact_table, indexes in missing.items():
+            logger.warning(f"{fact_table}: restoring {len(indexes)} indexes dropped by an earlier run")
+            start = time.perf_counter()
+            failed = self.rebuild_indexes(fact_table, indexes)
+            self.log_index_decision(fact_table, None, None, None, None, 'Rebuild',
+                                    len(indexes) - len(failed), time.perf_counter() - start)
+            if failed:
+                raise RuntimeError(f"Could not restore {len(failed)} indexes on {fact_table}")
+    
+    def load_fact_with_index_strategy(self, fact_table, staging_table, key_column, load_fn):
+        """
+        Run a fact load, dropping and rebuilding secondary indexes when the batch
+        is large relative to the table (maintaining them row by row costs more).
+        The dropped definitions are logged first so a killed run can restore them.
+        """
+        threshold = self.config['etl'].get('index_rebuild', {}).get('batch_ratio_threshold', 0.25)
+        batch_rows, table_rows, ratio = self.estimate_batch_ratio(fact_table, staging_table, key_column)
+        indexes, kept = self.get_secondary_indexes(fact_table) if ratio >= threshold else ([], [])
+        
+        if not indexes:
+            reason = f"below {threshold}" if ratio < threshold else "but only lookup indexes to drop"
+            logger.info(f"{fact_table}: batch ratio {ratio:.2f} {reason}, maintaining indexes")
+            rows_inserted = load_fn()
+            self.log_index_decision(fact_table, batch_rows, table_rows, ratio, threshold, 'Maintain')
+            return rows_inserted
+        
+        logger.info(f"{fact_table}: batch ratio {ratio:.2f} >= {threshold}, dropping {len(indexes)} indexes, "
+                    f"keeping lookup indexes {', '.join(name for name, _ in kept) or 'none'}")
+        self.log_index_decision(fact_table, batch_rows, table_rows, ratio, threshold, 'Dropped',
+                                index_definitions=[definition for _, definition in indexes],
+                                indexes_kept=[name for name, _ in kept])
+        cursor = self.conn.cursor()
+        for name, _ in indexes:
+            cursor.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(*name.split('.'))))
+        self.conn.commit()
+        
+        try:
+            rows_inserted = load_fn()
+        except Exception:
+            self.conn.rollback()
+            # Restore indexes and log the decision, but surface the load error
+            try:
+                self.finish_index_rebuild(fact_table, indexes, batch_rows, table_rows, ratio, threshold)
+            except Exception as e:
+                logger.error(f"Rebuilding indexes on {fact_table} after a failed load also failed: {e}")
+            raise
+        
+        failed = self.finish_index_rebuild(fact_table, indexes, batch_rows, table_rows, ratio, threshold)
+        if failed:
+            raise RuntimeError(f"Could not rebuild {len(failed)} indexes on {fact_table}: {', '.join(failed)}")
+        return rows_inserted
+    
+    def finish_index_rebuild(self, fact_table, indexes, batch_rows, table_rows, ratio, threshold):
+        """Rebuild the dropped indexes and log the 'Rebuild' decision; returns failed index names"""
+        start = time.perf_counter()
+        failed = self.rebuild_indexes(fact_table, indexes)
+        rebuild_seconds = time.perf_counter() - start
+        logger.info(f"Rebuilt {len(indexes) - len(failed)} of {len(indexes)} indexes on {fact_table} "
+                    f"in {rebuild_seconds:.1f}s")
+        self.log_index_decision(fact_table, batch_rows, table_rows, ratio, threshold,
+                                'Rebuild', len(indexes) - len(failed), rebuild_seconds)
+        return failed
+    
+    def get_staging_batch_id(self, staging_table):
+        """Identify the current contents of a staging table (row count and latest load time)"""
+        cursor = self.conn.cursor()
+        cursor.execute(sql.SQL("""
+            SELECT COUNT(*) || '@' || COALESCE(MAX(loaded_at)::TEXT, '')
+            FROM {}
+        """).format(sql.Identifier(*staging_table.split('.'))))
+        return cursor.fetchone()[0]
+    
+    def get_chunk_bounds(self, staging_table, chunk_column):
+        """Split a staging table into [lower, upper) ranges of about etl.batch_size rows"""
+        batch_size = self.config['etl'].get('batch_size', 1000)
+        cursor = self.conn.cursor()
+        cursor.execute(sql.SQL("""
+            SELECT bound::TEXT FROM (
+                SELECT {col} as bound, ROW_NUMBER() OVER (ORDER BY {col}) as rn
+                FROM {table}
+                WHERE {col} IS NOT NULL
+            ) s
+            WHERE (rn - 1) %% %s = 0
+            ORDER BY rn
+        """).format(
+            col=sql.Identifier(chunk_column),
+            table=sql.Identifier(*staging_table.split('.'))
+        ), (batch_size,))
+        
+        lowers = []
+        for (bound,) in cursor.fetchall():
+            if not lowers or lowers[-1] != bound:
+                lowers.append(bound)
+        uppers = lowers[1:] + [None]
+        return list(zip(lowers, uppers))
+    
+    def get_completed_chunks(self, table_name, staging_batch):
+        """Chunks already committed for this staging batch by an earlier run"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT chunk_lower, chunk_upper
+            FROM audit.etl_load_checkpoint
+            WHERE table_name = %s AND staging_batch = %s AND status = 'Completed'
+        """, (table_name, staging_batch))
+        return set(cursor.fetchall())
+    
+    def checkpoint_chunk(self, table_name, staging_batch, chunk_number, bounds,
+                         status, rows_inserted=0, attempts=1, error_message=None):
+        """Record chunk progress (committed by the caller together with the chunk)"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            INSERT INTO audit.etl_load_checkpoint (
+                execution_id, table_name, staging_batch, chunk_number,
+                chunk_lower, chunk_upper, status, rows_inserted, attempts, error_message
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (self.execution_id, table_name, staging_batch, chunk_number,
+              bounds[0], bounds[1], status, rows_inserted, attempts, error_message))
+    
+    def load_fact_in_chunks(self, table_name, staging_table, chunk_column, insert_sql):
+        """
+        Run a fact INSERT ... SELECT one staging key range at a time.
+        
+        insert_sql must filter the chunk column with %(chunk_lower)s / %(chunk_upper)s.
+        Each chunk commits together with its checkpoint row, so a rerun over the
+        same staging batch skips completed chunks and resumes at the failed one.
+        Failed chunks are retried per etl.max_retries / etl.retry_delay_seconds.
+        """
+        max_retries = self.config['etl'].get('max_retries', 3)
+        retry_delay = self.config['etl'].get('retry_delay_seconds', 5)
+        
+        staging_batch = self.get_staging_batch_id(staging_table)
+        chunks = self.get_chunk_bounds(staging_table, chunk_column)
+        completed = self.get_completed_chunks(table_name, staging_batch)
+        if completed:
+            logger.info(f"Resuming {table_name}: {len(completed)} of {len(chunks)} chunks already loaded")
+        
+        rows_inserted = 0
+        for chunk_number, bounds in enumerate(chunks, start=1):
+            if bounds in completed:
+                continue
+            
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    cursor = self.conn.cursor()
+                    cursor.execute(insert_sql, {'chunk_lower': bounds[0], 'chunk_upper': bounds[1]})
+                    chunk_rows = cursor.rowcount
+                    self.checkpoint_chunk(table_name, staging_batch, chunk_number, bounds,
+                                          'Completed', chunk_rows, attempt)
+                    self.conn.commit()
+                    rows_inserted += chunk_rows
+                    break
+                except psycopg2.Error as e:
+                    if self.conn.closed:
+                        self.connect_db()
+                    else:
+                        self.conn.rollback()
+                    
+                    if attempt > max_retries:
+                        logger.error(f"{table_name} chunk {chunk_number}/{len(chunks)} failed after {attempt} attempts: {e}")
+                        self.checkpoint_chunk(table_name, staging_batch, chunk_number, bounds,
+                                              'Failed', 0, attempt, str(e))
+                        self.conn.commit()
+                        raise
+                    
+                    logger.warning(f"{table_name} chunk {chunk_number}/{len(chunks)} failed (attempt {attempt}), retrying in {retry_delay}s: {e}")
+                    time.sleep(retry_delay)
+            
+            logger.debug(f"{table_name} chunk {chunk_number}/{len(chunks)}: {chunk_rows} rows")
+        
+        return rows_inserted
+    
     def load_dim_date(self):
         """Load date dimension (one-time)"""
         logger.info("Loading dim_date...")
@@ -136,7 +468,7 @@ class ETLPipeline:
                 farmer_id, national_id, first_name, last_name, full_name, gender,
                 date_of_birth, age_group, phone_number, district, subcounty, village,
                 region, gps_latitude, gps_longitude, farm_size_acres, farm_size_category,
-                primary_crop, cooperative_id, blockchain_wallet, registration_date,
+                primary_crop, cooperative_id, cooperative_name, blockchain_wallet, registration_date,
                 effective_date, is_current, version
             )
             SELECT 
@@ -156,12 +488,7 @@ class ETLPipeline:
                 s.district,
                 s.subcounty,
                 s.village,
-                CASE 
-                    WHEN s.district IN ('Kampala', 'Wakiso', 'Mukono', 'Masaka', 'Luwero') THEN 'Central'
-                    WHEN s.district IN ('Jinja', 'Mbale', 'Tororo', 'Iganga', 'Soroti', 'Pallisa', 'Kamuli') THEN 'Eastern'
-                    WHEN s.district IN ('Gulu', 'Lira', 'Kitgum', 'Arua', 'Nebbi', 'Apac', 'Moroto') THEN 'Northern'
-                    ELSE 'Western'
-                END as region,
+                s.region,
                 s.gps_latitude,
                 s.gps_longitude,
                 s.farm_size_acres,
@@ -176,7 +503,7 @@ class ETLPipeline:
                     WHEN s.cooperative_id IS NOT NULL THEN 'Cooperative ' || s.cooperative_id 
                     ELSE 'Independent' 
                 END as cooperative_name,
-                s.blockchain_wallet,
+                dw.hex_to_bytea(s.blockchain_wallet),
                 s.registration_date::DATE,
                 CURRENT_DATE as effective_date,
                 TRUE as is_current,
@@ -263,12 +590,7 @@ class ETLPipeline:
                 s.market_type,
                 s.district,
                 s.subcounty,
-                CASE 
-                    WHEN s.district IN ('Kampala', 'Wakiso', 'Mukono', 'Masaka', 'Luwero') THEN 'Central'
-                    WHEN s.district IN ('Jinja', 'Mbale', 'Tororo', 'Iganga', 'Soroti', 'Pallisa', 'Kamuli') THEN 'Eastern'
-                    WHEN s.district IN ('Gulu', 'Lira', 'Kitgum', 'Arua', 'Nebbi', 'Apac', 'Moroto') THEN 'Northern'
-                    ELSE 'Western'
-                END as region,
+                s.region,
                 s.gps_latitude,
                 s.gps_longitude,
                 s.operating_days,
@@ -295,12 +617,151 @@ class ETLPipeline:
         
         return rows_inserted
     
-    def load_fact_transaction(self):
-        """Load transaction fact table"""
-        logger.info("Loading fact_transaction...")
+    def stamp_staging_regions(self):
+        """Stamp region onto staging farmers, markets and buyers from dw.ref_district_region"""
+        logger.info("Stamping regions onto staging rows...")
+        cursor = self.conn.cursor()
+        
+        rows_updated = 0
+        for table in ('stg_farmers', 'stg_markets', 'stg_buyers'):
+            cursor.execute(sql.SQL("""
+                UPDATE staging.{} s
+                SET region = COALESCE(
+                    (SELECT r.region FROM dw.ref_district_region r WHERE r.district = s.district),
+                    'Western'
+                )
+                WHERE s.region IS NULL
+            """).format(sql.Identifier(table)))
+            rows_updated += cursor.rowcount
+        
+        self.conn.commit()
+        logger.info(f"Stamped region on {rows_updated} staging rows")
+        return rows_updated
+    
+    def resolve_staging_keys(self):
+        """
+        Resolve date keys and current dimension surrogate keys onto staging fact rows
+        in bulk, so the fact loads are plain projections. Rows are resolved once;
+        only rows with a still-unresolved key are revisited on later runs.
+        """
+        logger.info("Resolving conformed keys on staging rows...")
         cursor = self.conn.cursor()
+        rows_updated = 0
+        
+        cursor.execute("""
+            UPDATE staging.stg_transactions t
+            SET date_key = k.date_key,
+                farmer_key = k.farmer_key,
+                buyer_key = k.buyer_key,
+                product_key = k.product_key,
+                market_key = k.market_key,
+                payment_key = k.payment_key,
+                quality_key = k.quality_key
+            FROM (
+                SELECT
+                    s.transaction_id,
+                    TO_CHAR(s.transaction_date, 'YYYYMMDD')::INTEGER as date_key,
+                    f.farmer_key,
+                    COALESCE(b.buyer_key, 1) as buyer_key,  -- Default buyer if not found
+                    p.product_key,
+                    m.market_key,
+                    pm.payment_key,
+                    q.quality_key
+                FROM staging.stg_transactions s
+                LEFT JOIN dw.dim_farmer f ON s.farmer_id = f.farmer_id AND f.is_current = TRUE
+                LEFT JOIN dw.dim_buyer b ON s.buyer_id = b.buyer_id AND b.is_current = TRUE
+                LEFT JOIN dw.dim_product p ON s.product_id = p.product_id AND p.is_current = TRUE
+                LEFT JOIN dw.dim_market m ON s.market_id = m.market_id AND m.is_current = TRUE
+                LEFT JOIN dw.dim_payment_method pm ON s.payment_method = pm.payment_method
+                LEFT JOIN dw.dim_quality q ON s.quality_grade = q.quality_grade
+                WHERE s.farmer_key IS NULL OR s.product_key IS NULL OR s.market_key IS NULL
+                   OR s.payment_key IS NULL OR s.quality_key IS NULL
+            ) k
+            WHERE t.transaction_id = k.transaction_id
+        """)
+        rows_updated += cursor.rowcount
+        
+        cursor.execute("""
+            UPDATE staging.stg_harvests h
+            SET planting_date_key = k.planting_date_key,
+                harvest_date_key = k.harvest_date_key,
+                farmer_key = k.farmer_key,
+                product_key = k.product_key,
+                location_key = k.location_key
+            FROM (
+                SELECT
+                    s.harvest_id,
+                    TO_CHAR(s.planting_date, 'YYYYMMDD')::INTEGER as planting_date_key,
+                    TO_CHAR(s.harvest_date, 'YYYYMMDD')::INTEGER as harvest_date_key,
+                    f.farmer_key,
+                    p.product_key,
+                    l.location_key
+                FROM staging.stg_harvests s
+                LEFT JOIN dw.dim_farmer f ON s.farmer_id = f.farmer_id AND f.is_current = TRUE
+                LEFT JOIN dw.dim_product p ON s.product_id = p.product_id AND p.is_current = TRUE
+                LEFT JOIN dw.dim_location l ON f.district = l.district AND f.subcounty = l.subcounty
+                WHERE s.farmer_key IS NULL OR s.product_key IS NULL OR s.location_key IS NULL
+            ) k
+            WHERE h.harvest_id = k.harvest_id
+        """)
+        rows_updated += cursor.rowcount
+        
+        cursor.execute("""
+            UPDATE staging.stg_pricing pr
+            SET date_key = k.date_key,
+                product_key = k.product_key,
+                market_key = k.market_key
+            FROM (
+                SELECT
+                    s.price_id,
+                    TO_CHAR(s.price_date, 'YYYYMMDD')::INTEGER as date_key,
+                    p.product_key,
+                    m.market_key
+                FROM staging.stg_pricing s
+                LEFT JOIN dw.dim_product p ON s.product_id = p.product_id AND p.is_current = TRUE
+                LEFT JOIN dw.dim_market m ON s.market_id = m.market_id AND m.is_current = TRUE
+                WHERE s.product_key IS NULL OR s.market_key IS NULL
+            ) k
+            WHERE pr.price_id = k.price_id
+        """)
+        rows_updated += cursor.rowcount
+        
+        cursor.execute("""
+            UPDATE staging.stg_weather w
+            SET date_key = TO_CHAR(w.weather_date, 'YYYYMMDD')::INTEGER,
+                location_key = r.default_location_key
+            FROM dw.ref_district_region r
+            WHERE w.district = r.district
+              AND w.location_key IS NULL
+        """)
+        rows_updated += cursor.rowcount
         
         cursor.execute("""
+            UPDATE staging.stg_subsidies sb
+            SET date_key = k.date_key,
+                farmer_key = k.farmer_key
+            FROM (
+                SELECT
+                    s.farmer_subsidy_id,
+                    TO_CHAR(s.distribution_date, 'YYYYMMDD')::INTEGER as date_key,
+                    f.farmer_key
+                FROM staging.stg_subsidies s
+                LEFT JOIN dw.dim_farmer f ON s.farmer_id = f.farmer_id AND f.is_current = TRUE
+                WHERE s.farmer_key IS NULL
+            ) k
+            WHERE sb.farmer_subsidy_id = k.farmer_subsidy_id
+        """)
+        rows_updated += cursor.rowcount
+        
+        self.conn.commit()
+        logger.info(f"Resolved conformed keys on {rows_updated} staging rows")
+        return rows_updated
+    
+    def load_fact_transaction(self):
+        """Load transaction fact table"""
+        logger.info("Loading fact_transaction...")
+        rows_inserted = self.load_fact_in_chunks(
+            'dw.fact_transaction', 'staging.stg_transactions', 'transaction_date', """
             INSERT INTO dw.fact_transaction (
                 farmer_key, buyer_key, product_key, market_key, date_key,
                 payment_key, quality_key, transaction_id, blockchain_hash, payment_status,
@@ -308,15 +769,15 @@ class ETLPipeline:
                 transaction_timestamp
             )
             SELECT 
-                f.farmer_key,
-                COALESCE(b.buyer_key, 1) as buyer_key,  -- Default buyer if not found
-                p.product_key,
-                m.market_key,
-                TO_CHAR(t.transaction_date, 'YYYYMMDD')::INTEGER as date_key,
-                pm.payment_key,
-                q.quality_key,
+                t.farmer_key,
+                t.buyer_key,
+                t.product_key,
+                t.market_key,
+                t.date_key,
+                t.payment_key,
+                t.quality_key,
                 t.transaction_id,
-                t.blockchain_hash,
+                dw.hex_to_bytea(t.blockchain_hash),
                 t.payment_status,
                 t.quantity_kg,
                 t.unit_price,
@@ -326,20 +787,19 @@ class ETLPipeline:
                 t.total_amount - (t.total_amount * COALESCE(pm.transaction_fee_pct, 0) / 100) as net_amount,
                 t.transaction_date
             FROM staging.stg_transactions t
-            JOIN dw.dim_farmer f ON t.farmer_id = f.farmer_id AND f.is_current = TRUE
-            JOIN dw.dim_product p ON t.product_id = p.product_id AND p.is_current = TRUE
-            JOIN dw.dim_market m ON t.market_id = m.market_id AND m.is_current = TRUE
-            JOIN dw.dim_payment_method pm ON t.payment_method = pm.payment_method
-            JOIN dw.dim_quality q ON t.quality_grade = q.quality_grade
-            LEFT JOIN dw.dim_buyer b ON t.buyer_id = b.buyer_id AND b.is_current = TRUE
-            WHERE NOT EXISTS (
+            JOIN dw.dim_payment_method pm ON t.payment_key = pm.payment_key
+            WHERE t.farmer_key IS NOT NULL
+              AND t.product_key IS NOT NULL
+              AND t.market_key IS NOT NULL
+              AND t.quality_key IS NOT NULL
+              AND t.transaction_date >= %(chunk_lower)s
+              AND (%(chunk_upper)s IS NULL OR t.transaction_date < %(chunk_upper)s)
+              AND NOT EXISTS (
                 SELECT 1 FROM dw.fact_transaction ft 
                 WHERE ft.transaction_id = t.transaction_id
             )
+            ORDER BY t.transaction_date  -- Keep physical order correlated for BRIN indexes
         """)
-        
-        rows_inserted = cursor.rowcount
-        self.conn.commit()
         logger.info(f"Inserted {rows_inserted} transactions into fact_transaction")
         
         return rows_inserted
@@ -363,14 +823,9 @@ class ETLPipeline:
                 s.phone_number,
                 s.email,
                 s.district,
-                CASE 
-                    WHEN s.district IN ('Kampala', 'Wakiso', 'Mukono', 'Masaka', 'Luwero') THEN 'Central'
-                    WHEN s.district IN ('Jinja', 'Mbale', 'Tororo', 'Iganga', 'Soroti', 'Pallisa', 'Kamuli') THEN 'Eastern'
-                    WHEN s.district IN ('Gulu', 'Lira', 'Kitgum', 'Arua', 'Nebbi', 'Apac', 'Moroto') THEN 'Northern'
-                    ELSE 'Western'
-                END as region,
+                s.region,
                 s.registration_number,
-                s.blockchain_wallet,
+                dw.hex_to_bytea(s.blockchain_wallet),
                 s.is_active,
                 CURRENT_DATE as effective_date,
                 TRUE as is_current,
@@ -399,18 +854,31 @@ class ETLPipeline:
             SELECT DISTINCT
                 district,
                 subcounty,
-                CASE 
-                    WHEN district IN ('Kampala', 'Wakiso', 'Mukono', 'Masaka', 'Luwero') THEN 'Central'
-                    WHEN district IN ('Jinja', 'Mbale', 'Tororo', 'Iganga', 'Soroti', 'Pallisa', 'Kamuli') THEN 'Eastern'
-                    WHEN district IN ('Gulu', 'Lira', 'Kitgum', 'Arua', 'Nebbi', 'Apac', 'Moroto') THEN 'Northern'
-                    ELSE 'Western'
-                END as region,
+                region,
                 CURRENT_TIMESTAMP
             FROM staging.stg_farmers
             ON CONFLICT (district, subcounty) DO NOTHING
         """)
         
         rows_inserted = cursor.rowcount
+        
+        # Representative location per district (used for district-level weather)
+        cursor.execute("""
+            INSERT INTO dw.ref_district_region (district, region)
+            SELECT DISTINCT district, region FROM dw.dim_location
+            ON CONFLICT (district) DO NOTHING
+        """)
+        cursor.execute("""
+            UPDATE dw.ref_district_region r
+            SET default_location_key = l.location_key
+            FROM (
+                SELECT district, MIN(location_key) as location_key
+                FROM dw.dim_location
+                GROUP BY district
+            ) l
+            WHERE r.district = l.district
+              AND r.default_location_key IS NULL
+        """)
         self.conn.commit()
         logger.info(f"Inserted {rows_inserted} locations into dim_location")
         return rows_inserted
@@ -418,9 +886,8 @@ class ETLPipeline:
     def load_fact_harvest(self):
         """Load harvest fact table"""
         logger.info("Loading fact_harvest...")
-        cursor = self.conn.cursor()
-        
-        cursor.execute("""
+        rows_inserted = self.load_fact_in_chunks(
+            'dw.fact_harvest', 'staging.stg_harvests', 'harvest_id', """
             INSERT INTO dw.fact_harvest (
                 harvest_id, farmer_key, product_key, planting_date_key, harvest_date_key, location_key,
                 quantity_kg, quality_assessment,
@@ -429,11 +896,11 @@ class ETLPipeline:
             )
             SELECT 
                 h.harvest_id,
-                f.farmer_key,
-                p.product_key,
-                TO_CHAR(h.planting_date, 'YYYYMMDD')::INTEGER as planting_date_key,
-                TO_CHAR(h.harvest_date, 'YYYYMMDD')::INTEGER as harvest_date_key,
-                l.location_key,
+                h.farmer_key,
+                h.product_key,
+                h.planting_date_key,
+                h.harvest_date_key,
+                h.location_key,
                 h.quantity_kg,
                 h.quality_assessment,
                 h.post_harvest_loss_pct,
@@ -442,25 +909,23 @@ class ETLPipeline:
                 (h.harvest_date - h.planting_date) as growing_days, 
                 h.season
             FROM staging.stg_harvests h
-            JOIN dw.dim_farmer f ON h.farmer_id = f.farmer_id AND f.is_current = TRUE
-            JOIN dw.dim_product p ON h.product_id = p.product_id AND p.is_current = TRUE
-            JOIN dw.dim_location l ON f.district = l.district AND f.subcounty = l.subcounty
-            WHERE NOT EXISTS (
+            WHERE h.farmer_key IS NOT NULL
+              AND h.product_key IS NOT NULL
+              AND h.location_key IS NOT NULL
+              AND h.harvest_id >= %(chunk_lower)s
+              AND (%(chunk_upper)s IS NULL OR h.harvest_id < %(chunk_upper)s)
+              AND NOT EXISTS (
                 SELECT 1 FROM dw.fact_harvest fh WHERE fh.harvest_id = h.harvest_id
             )
         """)
-        
-        rows_inserted = cursor.rowcount
-        self.conn.commit()
         logger.info(f"Inserted {rows_inserted} harvests into fact_harvest")
         return rows_inserted
 
     def load_fact_pricing(self):
         """Load pricing fact table"""
         logger.info("Loading fact_pricing...")
-        cursor = self.conn.cursor()
-        
-        cursor.execute("""
+        rows_inserted = self.load_fact_in_chunks(
+            'dw.fact_pricing', 'staging.stg_pricing', 'price_date', """
             INSERT INTO dw.fact_pricing (
                 price_id, product_key, market_key, date_key,
                 wholesale_price, retail_price,
@@ -468,9 +933,9 @@ class ETLPipeline:
             )
             SELECT 
                 pr.price_id,
-                p.product_key,
-                m.market_key,
-                TO_CHAR(pr.price_date, 'YYYYMMDD')::INTEGER as date_key,
+                pr.product_key,
+                pr.market_key,
+                pr.date_key,
                 pr.wholesale_price,
                 pr.retail_price,
                 (pr.retail_price - pr.wholesale_price) as price_spread,
@@ -478,24 +943,202 @@ class ETLPipeline:
                 pr.price_trend,
                 pr.source
             FROM staging.stg_pricing pr
-            JOIN dw.dim_product p ON pr.product_id = p.product_id AND p.is_current = TRUE
-            JOIN dw.dim_market m ON pr.market_id = m.market_id AND m.is_current = TRUE
-            WHERE NOT EXISTS (
+            WHERE pr.product_key IS NOT NULL
+              AND pr.market_key IS NOT NULL
+              AND pr.price_date >= %(chunk_lower)s
+              AND (%(chunk_upper)s IS NULL OR pr.price_date < %(chunk_upper)s)
+              AND NOT EXISTS (
                 SELECT 1 FROM dw.fact_pricing fp WHERE fp.price_id = pr.price_id
             )
+            ORDER BY pr.price_date  -- Keep physical order correlated for BRIN indexes
         """)
-        
-        rows_inserted = cursor.rowcount
-        self.conn.commit()
         logger.info(f"Inserted {rows_inserted} pricing records into fact_pricing")
         return rows_inserted
 
+    def update_pricing_indicators(self):
+        """
+        Compute price_change_pct and price_volatility_index for new pricing rows.
+
+        Only product/market series with uncomputed rows are touched. For each
+        series the rows from the earliest new date onwards are recomputed, using
+        the trailing window of already-stored rows as context, so the full
+        history is never rescanned.
+        """
+        logger.info("Updating fact_pricing trend indicators...")
+        cursor = self.conn.cursor()
+
+        window_days = self.config.get('pricing', {}).get('volatility_window_days', 7)
+
+        cursor.execute("""
+            WITH new_series AS (
+                SELECT product_key, market_key, MIN(date_key) as first_new_date
+                FROM dw.fact_pricing
+                WHERE price_change_pct IS NULL
+                GROUP BY product_key, market_key
+            ),
+            window_rows AS (
+                -- Rows to (re)compute: everything from the first new date onwards
+                SELECT
+                    fp.pricing_key, fp.product_key, fp.market_key, fp.date_key,
+                    fp.wholesale_price, fp.price_change_pct,
+                    FALSE as is_context
+                FROM dw.fact_pricing fp
+                JOIN new_series n ON fp.product_key = n.product_key AND fp.market_key = n.market_key
+                WHERE fp.date_key >= n.first_new_date
+
+                UNION ALL
+
+                -- Prior window already stored in the table
+                SELECT
+                    prior.pricing_key, n.product_key, n.market_key, prior.date_key,
+                    prior.wholesale_price, prior.price_change_pct,
+                    TRUE as is_context
+                FROM new_series n
+                CROSS JOIN LATERAL (
+                    SELECT fp.pricing_key, fp.date_key, fp.wholesale_price, fp.price_change_pct
+                    FROM dw.fact_pricing fp
+                    WHERE fp.product_key = n.product_key
+                      AND fp.market_key = n.market_key
+                      AND fp.date_key < n.first_new_date
+                    ORDER BY fp.date_key DESC
+                    LIMIT %(lookback)s
+                ) prior
+            ),
+            changes AS (
+                SELECT
+                    pricing_key, product_key, market_key, date_key, is_context,
+                    CASE
+                        WHEN is_context THEN price_change_pct
+                        ELSE COALESCE(
+                            (wholesale_price - LAG(wholesale_price) OVER w)
+                                / LAG(wholesale_price) OVER w * 100,
+                            0
+                        )
+                    END as change_pct
+                FROM window_rows
+                WINDOW w AS (PARTITION BY product_key, market_key ORDER BY date_key)
+            ),
+            indicators AS (
+                SELECT
+                    pricing_key, is_context,
+                    ROUND(change_pct, 2) as price_change_pct,
+                    ROUND(COALESCE(STDDEV_SAMP(change_pct) OVER (
+                        PARTITION BY product_key, market_key
+                        ORDER BY date_key
+                        ROWS BETWEEN %(lookback)s PRECEDING AND CURRENT ROW
+                    ), 0), 2) as price_volatility_index
+                FROM changes
+            )
+            UPDATE dw.fact_pricing fp
+            SET price_change_pct = i.price_change_pct,
+                price_volatility_index = i.price_volatility_index
+            FROM indicators i
+            WHERE fp.pricing_key = i.pricing_key
+              AND NOT i.is_context
+        """, {'lookback': window_days - 1})
+
+        rows_updated = cursor.rowcount
+        self.conn.commit()
+        logger.info(f"Updated trend indicators on {rows_updated} pricing records")
+        return rows_updated
+
+    def record_streaming_latency(self):
+        """
+        Record publish -> staging and publish -> DW latency percentiles for
+        streamed rows loaded in this run, per topic, in audit.streaming_latency.
+        Rows loaded from CSV have no event_published_at and are ignored.
+        """
+        logger.info("Recording streaming latency...")
+        streamed_facts = [
+            ('commodity_prices', 'dw.fact_transaction', 'staging.stg_transactions', 'transaction_id'),
+            ('commodity_prices', 'dw.fact_pricing', 'staging.stg_pricing', 'price_id'),
+            ('harvest_logs', 'dw.fact_harvest', 'staging.stg_harvests', 'harvest_id'),
+            ('weather_alerts', 'dw.fact_weather', 'staging.stg_weather', 'weather_id'),
+        ]
+        # event_published_at is a UTC-aware TIMESTAMPTZ; loaded_at/created_at are
+        # server-local CURRENT_TIMESTAMPs, resolved in this session's time zone
+        stages = {
+            'staging': sql.SQL('s.loaded_at::TIMESTAMPTZ - s.event_published_at'),
+            'dw': sql.SQL('f.created_at::TIMESTAMPTZ - s.event_published_at'),
+        }
+        cursor = self.conn.cursor()
+        for topic, fact_table, staging_table, id_column in streamed_facts:
+            for stage, latency in stages.items():
+                cursor.execute(sql.SQL("""
+                    WITH latency AS (
+                        SELECT EXTRACT(EPOCH FROM ({latency})) * 1000 as ms
+                        FROM {fact} f
+                        JOIN {staging} s ON s.{id} = f.{id}
+                        WHERE s.event_published_at IS NOT NULL
+                          AND f.created_at >= (
+                            SELECT start_time FROM audit.etl_execution_log
+                            WHERE execution_id = %(execution_id)s
+                          )
+                    ),
+                    percentiles AS (
+                        SELECT
+                            COUNT(*) as sample_count,
+                            percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY ms) as p,
+                            MAX(ms) as max_ms
+                        FROM latency
+                    )
+                    INSERT INTO audit.streaming_latency (
+                        execution_id, stage, topic, table_name, sample_count,
+                        p50_ms, p95_ms, p99_ms, max_ms
+                    )
+                    SELECT %(execution_id)s, %(stage)s, %(topic)s, %(table_name)s, sample_count,
+                           p[1], p[2], p[3], max_ms
+                    FROM percentiles
+                    WHERE sample_count > 0
+                    RETURNING sample_count, p50_ms, p95_ms, p99_ms
+                """).format(
+                    latency=latency,
+                    fact=sql.Identifier(*fact_table.split('.')),
+                    staging=sql.Identifier(*staging_table.split('.')),
+                    id=sql.Identifier(id_column),
+                ), {
+                    'execution_id': self.execution_id,
+                    'stage': stage,
+                    'topic': topic,
+                    'table_name': staging_table if stage == 'staging' else fact_table,
+                })
+                result = cursor.fetchone()
+                if result:
+                    count, p50, p95, p99 = result
+                    logger.info(f"  {topic} -> {staging_table if stage == 'staging' else fact_table}: {count} events, "
+                                f"p50 {p50} ms, p95 {p95} ms, p99 {p99} ms")
+        self.conn.commit()
+
+    def run_quality_checks(self, schema):
+        """
+        Run the declared data quality checks on one schema's tables and log them
+        under this execution. Failing checks are reported, not raised, so the
+        load goes on; a check that cannot run is logged and skipped.
+        """
+        if not self.config.get('data_quality', {}).get('enabled', False):
+            return
+        logger.info(f"Running data quality checks on {schema}...")
+        try:
+            results = DataQualityChecker(self.config, self.new_connection).run((schema,))
+            log_results(self.conn, self.execution_id, results)
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"Data quality checks on {schema} did not complete: {e}")
+            return
+        for r in results:
+            if r['check_result'] == 'Fail':
+                failed = (f"{r['records_failed']} of {r['records_checked']} rows" if r['records_failed'] is not None
+                          else f"newest row {r['check_details']['age_hours']}h old")
+                logger.warning(f"  Failed: {r['table_name']}.{r['check_name']} ({failed})")
+        logger.info(f"Data quality on {schema}: {len(results)} checks, "
+                    f"{sum(r['check_result'] == 'Warning' for r in results)} warnings, "
+                    f"{sum(r['check_result'] == 'Fail' for r in results)} failures")
+
     def load_fact_weather(self):
         """Load weather fact table"""
         logger.info("Loading fact_weather...")
-        cursor = self.conn.cursor()
-        
-        cursor.execute("""
+        rows_inserted = self.load_fact_in_chunks(
+            'dw.fact_weather', 'staging.stg_weather', 'weather_date', """
             INSERT INTO dw.fact_weather (
                 weather_id, location_key, date_key, weather_date,
                 temperature_min, temperature_max, temperature_avg,
@@ -504,8 +1147,8 @@ class ETLPipeline:
             )
             SELECT 
                 w.weather_id,
-                l.location_key,
-                TO_CHAR(w.weather_date, 'YYYYMMDD')::INTEGER as date_key,
+                w.location_key,
+                w.date_key,
                 w.weather_date,
                 w.temperature_min,
                 w.temperature_max,
@@ -516,24 +1159,21 @@ class ETLPipeline:
                 w.weather_condition,
                 w.source
             FROM staging.stg_weather w
-            JOIN dw.dim_location l ON w.district = l.district 
-            WHERE l.location_key IN (SELECT MIN(location_key) FROM dw.dim_location GROUP BY district)
-            AND NOT EXISTS (
+            WHERE w.location_key IS NOT NULL
+              AND w.weather_date >= %(chunk_lower)s
+              AND (%(chunk_upper)s IS NULL OR w.weather_date < %(chunk_upper)s)
+              AND NOT EXISTS (
                 SELECT 1 FROM dw.fact_weather fw WHERE fw.weather_id = w.weather_id
             )
         """)
-        
-        rows_inserted = cursor.rowcount
-        self.conn.commit()
         logger.info(f"Inserted {rows_inserted} weather records into fact_weather")
         return rows_inserted
 
     def load_fact_subsidy(self):
         """Load subsidy fact table"""
         logger.info("Loading fact_subsidy...")
-        cursor = self.conn.cursor()
-        
-        cursor.execute("""
+        rows_inserted = self.load_fact_in_chunks(
+            'dw.fact_subsidy', 'staging.stg_subsidies', 'farmer_subsidy_id', """
             INSERT INTO dw.fact_subsidy (
                 farmer_subsidy_id, farmer_key, date_key,
                 program_name, subsidy_type, amount_value,
@@ -541,22 +1181,21 @@ class ETLPipeline:
             )
             SELECT 
                 s.farmer_subsidy_id,
-                f.farmer_key,
-                TO_CHAR(s.distribution_date, 'YYYYMMDD')::INTEGER as date_key,
+                s.farmer_key,
+                s.date_key,
                 s.program_name,
                 s.subsidy_type,
                 s.amount_value,
                 s.distribution_date,
                 s.verification_status
             FROM staging.stg_subsidies s
-            JOIN dw.dim_farmer f ON s.farmer_id = f.farmer_id AND f.is_current = TRUE
-            WHERE NOT EXISTS (
+            WHERE s.farmer_key IS NOT NULL
+              AND s.farmer_subsidy_id >= %(chunk_lower)s
+              AND (%(chunk_upper)s IS NULL OR s.farmer_subsidy_id < %(chunk_upper)s)
+              AND NOT EXISTS (
                 SELECT 1 FROM dw.fact_subsidy fs WHERE fs.farmer_subsidy_id = s.farmer_subsidy_id
             )
         """)
-        
-        rows_inserted = cursor.rowcount
-        self.conn.commit()
         logger.info(f"Inserted {rows_inserted} subsidy records into fact_subsidy")
         return rows_inserted
 
@@ -568,6 +1207,12 @@ class ETLPipeline:
             
             total_rows_inserted = 0
             
+            # Put back indexes an interrupted run left dropped
+            self.restore_dropped_indexes()
+            
+            # Conform staging attributes used by the dimensions
+            self.stamp_staging_regions()
+            
             # Load dimensions
             self.load_dim_date()
             total_rows_inserted += self.load_dim_farmer()
@@ -576,14 +1221,34 @@ class ETLPipeline:
             total_rows_inserted += self.load_dim_buyer()
             total_rows_inserted += self.load_dim_location()
             
+            # Resolve surrogate keys once, in bulk
+            self.resolve_staging_keys()
+            
+            # Check staging before it reaches the facts
+            self.run_quality_checks('staging')
+            
             # Load facts
-            total_rows_inserted += self.load_fact_transaction()
+            total_rows_inserted += self.load_fact_with_index_strategy(
+                'dw.fact_transaction', 'staging.stg_transactions', 'transaction_id',
+                self.load_fact_transaction
+            )
             total_rows_inserted += self.load_fact_harvest()
-            total_rows_inserted += self.load_fact_pricing()
+            total_rows_inserted += self.load_fact_with_index_strategy(
+                'dw.fact_pricing', 'staging.stg_pricing', 'price_id', self.load_fact_pricing
+            )
             total_rows_inserted += self.load_fact_weather()
             total_rows_inserted += self.load_fact_subsidy()
-            
-            self.log_execution_end('Success', rows_inserted=total_rows_inserted)
+
+            # Derived measures
+            total_rows_updated = self.update_pricing_indicators()
+
+            # Check the loaded warehouse
+            self.run_quality_checks('dw')
+
+            # Freshness of streamed events
+            self.record_streaming_latency()
+
+            self.log_execution_end('Success', rows_inserted=total_rows_inserted, rows_updated=total_rows_updated)
             logger.info(f"ETL pipeline completed successfully. Total rows inserted: {total_rows_inserted}")
             
         except Exception as e:
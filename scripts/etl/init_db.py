@@ -34,7 +34,8 @@ def run_init():
     ddl_files = [
         "02_staging_tables.sql",
         "03_dimension_tables.sql",
-        "04_fact_tables.sql"
+        "04_fact_tables.sql",
+        "05_index_profile.sql"
     ]
     
     conn = None
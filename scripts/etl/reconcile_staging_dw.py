@@ -0,0 +1,376 @@
+"""
+Staging to DW Reconciliation
+Compares each staging fact table with its DW fact table per day using
+order-independent fingerprints: row count, sums of the measures and the sum
+of a 64-bit hash of each row's loaded columns. One aggregate scan per side
+and table, tables in parallel on their own connections; only days whose
+fingerprints differ are drilled into row by row (Missing / Extra / Changed).
+
+Staging rows the load_fact_* methods skip - unresolved surrogate keys, or no
+dim_payment_method row for the inner join - are counted per reason and left
+out of the staging fingerprint, so they are reported as drops rather than
+as mismatches. Results are logged to audit.data_quality_log.
+Requires: psycopg2
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import psycopg2
+import yaml
+
+from data_quality import grade
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Per fact table: the staging source (alias t) and DW table (alias f), the
+# natural key, each side's day and loaded columns, the measures summed on both
+# sides, and the staging rows the fact load drops (mirroring its WHERE and JOINs).
+# dw_span limits the DW side to the staging day range (on an indexed column
+# where there is one); DW rows from earlier batches outside it are not compared.
+TABLES = {
+    'dw.fact_transaction': {
+        'staging': 'staging.stg_transactions',
+        'staging_joins': 'LEFT JOIN dw.dim_payment_method pm ON pm.payment_key = t.payment_key',
+        'key': 'transaction_id',
+        'staging_day': 't.transaction_date::date',
+        'dw_day': 'f.transaction_timestamp::date',
+        'dw_span': "f.transaction_timestamp >= %(first)s AND f.transaction_timestamp < %(last)s::date + 1",
+        'measures': ['quantity_kg', 'total_amount'],
+        'staging_row': ['t.transaction_id', 't.quantity_kg', 't.unit_price', 't.total_amount',
+                        't.transaction_date', 't.payment_status', 'lower(t.blockchain_hash)'],
+        'dw_row': ['f.transaction_id', 'f.quantity_kg', 'f.unit_price', 'f.total_amount',
+                   'f.transaction_timestamp', 'f.payment_status', "encode(f.blockchain_hash, 'hex')"],
+        'drops': [
+            ('farmer_key unresolved', 't.farmer_key IS NULL'),
+            ('product_key unresolved', 't.product_key IS NULL'),
+            ('market_key unresolved', 't.market_key IS NULL'),
+            ('quality_key unresolved', 't.quality_key IS NULL'),
+            ('no dim_payment_method row', 'pm.payment_key IS NULL'),
+        ],
+    },
+    'dw.fact_harvest': {
+        'staging': 'staging.stg_harvests',
+        'key': 'harvest_id',
+        'staging_day': 't.harvest_date',
+        'dw_day': "to_date(f.harvest_date_key::text, 'YYYYMMDD')",
+        'dw_span': "f.harvest_date_key BETWEEN to_char(%(first)s::date, 'YYYYMMDD')::int "
+                   "AND to_char(%(last)s::date, 'YYYYMMDD')::int",
+        'measures': ['quantity_kg'],
+        # storage_method is not loaded by load_fact_harvest, so it is not compared
+        'staging_row': ['t.harvest_id', 't.quantity_kg', 't.post_harvest_loss_pct',
+                        't.quality_assessment', 't.season'],
+        'dw_row': ['f.harvest_id', 'f.quantity_kg', 'f.post_harvest_loss_pct',
+                   'f.quality_assessment', 'f.season'],
+        'drops': [
+            ('farmer_key unresolved', 't.farmer_key IS NULL'),
+            ('product_key unresolved', 't.product_key IS NULL'),
+            ('location_key unresolved', 't.location_key IS NULL'),
+        ],
+    },
+    'dw.fact_pricing': {
+        'staging': 'staging.stg_pricing',
+        'key': 'price_id',
+        'staging_day': 't.price_date',
+        'dw_day': "to_date(f.date_key::text, 'YYYYMMDD')",
+        'dw_span': "f.date_key BETWEEN to_char(%(first)s::date, 'YYYYMMDD')::int "
+                   "AND to_char(%(last)s::date, 'YYYYMMDD')::int",
+        'measures': ['wholesale_price', 'retail_price'],
+        'staging_row': ['t.price_id', 't.wholesale_price', 't.retail_price', 't.price_trend', 't.source'],
+        'dw_row': ['f.price_id', 'f.wholesale_price', 'f.retail_price', 'f.price_trend', 'f.source'],
+        'drops': [
+            ('product_key unresolved', 't.product_key IS NULL'),
+            ('market_key unresolved', 't.market_key IS NULL'),
+        ],
+    },
+    'dw.fact_subsidy': {
+        'staging': 'staging.stg_subsidies',
+        'key': 'farmer_subsidy_id',
+        'staging_day': 't.distribution_date',
+        'dw_day': 'f.distribution_date',
+        'dw_span': 'f.distribution_date BETWEEN %(first)s AND %(last)s OR f.distribution_date IS NULL',
+        'measures': ['amount_value'],
+        'staging_row': ['t.farmer_subsidy_id', 't.amount_value', 't.program_name',
+                        't.subsidy_type', 't.verification_status', 't.distribution_date'],
+        'dw_row': ['f.farmer_subsidy_id', 'f.amount_value', 'f.program_name',
+                   'f.subsidy_type', 'f.verification_status', 'f.distribution_date'],
+        'drops': [
+            ('farmer_key unresolved', 't.farmer_key IS NULL'),
+        ],
+    },
+    'dw.fact_weather': {
+        'staging': 'staging.stg_weather',
+        'key': 'weather_id',
+        'staging_day': 't.weather_date',
+        'dw_day': 'f.weather_date',
+        'dw_span': 'f.weather_date BETWEEN %(first)s AND %(last)s',
+        'measures': ['rainfall_mm'],
+        'staging_row': ['t.weather_id', 't.temperature_min', 't.temperature_max', 't.temperature_avg',
+                        't.rainfall_mm', 't.humidity_pct', 't.wind_speed_kmh', 't.weather_condition', 't.source'],
+        'dw_row': ['f.weather_id', 'f.temperature_min', 'f.temperature_max', 'f.temperature_avg',
+                   'f.rainfall_mm', 'f.humidity_pct', 'f.wind_speed_kmh', 'f.weather_condition', 'f.source'],
+        'drops': [
+            ('location_key unresolved', 't.location_key IS NULL'),
+        ],
+    },
+}
+
+def row_hash(columns):
+    """64-bit hash of a row's columns; summed (not XORed) so duplicated rows still change it"""
+    parts = ', '.join(f"COALESCE(({column})::text, '')" for column in columns)
+    return f"('x' || substr(md5(concat_ws('|', {parts})), 1, 16))::bit(64)::bigint"
+
+def drop_reason(spec):
+    """First load filter a staging row fails, or NULL when the load keeps it"""
+    cases = ' '.join(f"WHEN {predicate} THEN '{reason}'" for reason, predicate in spec['drops'])
+    return f"CASE {cases} END"
+
+def staging_fingerprint_sql(spec):
+    kept = f"{drop_reason(spec)} IS NULL"
+    measures = ', '.join(f"COALESCE(SUM(t.{m}) FILTER (WHERE {kept}), 0)" for m in spec['measures'])
+    drops = ', '.join(f"COUNT(*) FILTER (WHERE {drop_reason(spec)} = '{reason}')" for reason, _ in spec['drops'])
+    return f"""
+        SELECT {spec['staging_day']} as day,
+               COUNT(*) FILTER (WHERE {kept}),
+               {measures},
+               COALESCE(SUM({row_hash(spec['staging_row'])}) FILTER (WHERE {kept}), 0),
+               COUNT(*),
+               {drops}
+        FROM {spec['staging']} t {spec.get('staging_joins', '')}
+        GROUP BY 1
+    """
+
+def dw_fingerprint_sql(table, spec):
+    measures = ', '.join(f"COALESCE(SUM(f.{m}), 0)" for m in spec['measures'])
+    return f"""
+        SELECT {spec['dw_day']} as day,
+               COUNT(*),
+               {measures},
+               COALESCE(SUM({row_hash(spec['dw_row'])}), 0)
+        FROM {table} f
+        WHERE ({spec['dw_span']})
+        GROUP BY 1
+    """
+
+def drill_down_sql(table, spec):
+    """Row-level differences on the given days: staging rows the load keeps vs DW rows"""
+    in_days = "(day = ANY(%(days)s) OR (day IS NULL AND %(null_day)s))"
+    return f"""
+        WITH s AS (
+            SELECT * FROM (
+                SELECT t.{spec['key']} as id, {spec['staging_day']} as day,
+                       {row_hash(spec['staging_row'])} as row_hash
+                FROM {spec['staging']} t {spec.get('staging_joins', '')}
+                WHERE {drop_reason(spec)} IS NULL
+            ) kept
+            WHERE {in_days}
+        ),
+        d AS (
+            SELECT * FROM (
+                SELECT f.{spec['key']} as id, {spec['dw_day']} as day,
+                       {row_hash(spec['dw_row'])} as row_hash
+                FROM {table} f
+                WHERE ({spec['dw_span']})
+            ) loaded
+            WHERE {in_days}
+        )
+        SELECT COALESCE(s.id, d.id), COALESCE(s.day, d.day),
+               CASE WHEN d.id IS NULL THEN 'Missing' WHEN s.id IS NULL THEN 'Extra' ELSE 'Changed' END
+        FROM s
+        FULL JOIN d ON d.id = s.id
+        WHERE s.id IS NULL OR d.id IS NULL OR s.row_hash <> d.row_hash
+    """
+
+def dropped_rows_sql(spec):
+    return f"""
+        SELECT t.{spec['key']}, {spec['staging_day']}, {drop_reason(spec)}
+        FROM {spec['staging']} t {spec.get('staging_joins', '')}
+        WHERE {drop_reason(spec)} IS NOT NULL
+        LIMIT %(limit)s
+    """
+
+def connect(db_config):
+    return psycopg2.connect(
+        host=db_config['host'],
+        port=db_config['port'],
+        database=db_config['database'],
+        user=db_config['user'],
+        password=db_config['password']
+    )
+
+def reconcile_table(db_config, table, spec, fetch_size, max_findings):
+    """Worker: fingerprint both sides of one fact table and drill into differing days"""
+    started = time.perf_counter()
+    width = 2 + len(spec['measures'])  # rows, measures..., row hash sum
+    conn = connect(db_config)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(staging_fingerprint_sql(spec))
+        staging, drops_by_day = {}, {}
+        staging_rows = 0
+        for row in cursor.fetchall():
+            day = row[0]
+            staging[day] = tuple(row[1:1 + width])
+            staging_rows += row[1 + width]
+            drops_by_day[day] = dict(zip((reason for reason, _ in spec['drops']), row[2 + width:]))
+
+        dated = [day for day in staging if day is not None]
+        cursor.execute(dw_fingerprint_sql(table, spec),
+                       {'first': min(dated) if dated else None, 'last': max(dated) if dated else None})
+        dw = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+        empty = (0,) * width
+        mismatched = sorted((day for day in staging.keys() | dw.keys()
+                             if staging.get(day, empty) != dw.get(day, empty)),
+                            key=lambda day: (day is None, day))
+
+        differences = {'Missing': 0, 'Extra': 0, 'Changed': 0}
+        findings = []
+        if mismatched:
+            cursor.close()
+            cursor = conn.cursor(name='reconcile_drill_down')
+            cursor.itersize = fetch_size
+            cursor.execute(drill_down_sql(table, spec), {
+                'days': [day for day in mismatched if day is not None],
+                'null_day': None in mismatched,
+                'first': min(dated) if dated else None, 'last': max(dated) if dated else None,
+            })
+            for key, day, kind in cursor:
+                differences[kind] += 1
+                if len(findings) < max_findings:
+                    findings.append({'id': key, 'day': day, 'difference': kind})
+            cursor.close()
+            cursor = conn.cursor()
+
+        drops = {reason: sum(day_drops[reason] for day_drops in drops_by_day.values())
+                 for reason, _ in spec['drops']}
+        dropped = []
+        if any(drops.values()):
+            cursor.execute(dropped_rows_sql(spec), {'limit': max_findings})
+            dropped = [{'id': key, 'day': day, 'reason': reason} for key, day, reason in cursor.fetchall()]
+        cursor.close()
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {
+        'table': table, 'staging_table': spec['staging'], 'staging_rows': staging_rows,
+        'days_compared': len(staging.keys() | dw.keys()),
+        'days_mismatched': [{'day': day, 'staging': staging.get(day, empty), 'dw': dw.get(day, empty)}
+                            for day in mismatched],
+        'differences': differences, 'findings': findings,
+        'drops': drops, 'dropped': dropped,
+        'seconds': time.perf_counter() - started,
+    }
+
+def log_results(conn, results, referential_threshold_pct, error=None):
+    """One etl_execution_log entry; a fingerprint and a load-drop row per table in data_quality_log"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO audit.etl_execution_log (job_name, status, end_time, rows_read, rows_rejected, error_message)
+        VALUES ('staging_dw_reconciliation', %s, CURRENT_TIMESTAMP, %s, %s, %s)
+        RETURNING execution_id
+    """, ('Failed' if error else 'Success',
+          sum(r['staging_rows'] for r in results),
+          sum(sum(r['drops'].values()) for r in results), error))
+    execution_id = cursor.fetchone()[0]
+    for r in results:
+        differing = sum(r['differences'].values())
+        dropped = sum(r['drops'].values())
+        drop_result, drop_pct = grade(dropped, r['staging_rows'], referential_threshold_pct)
+        cursor.executemany("""
+            INSERT INTO audit.data_quality_log
+                (execution_id, table_name, check_name, check_type, check_result,
+                 records_checked, records_failed, failure_percentage, check_details)
+            VALUES (%s, %s, %s, 'Reconciliation', %s, %s, %s, %s, %s)
+        """, [
+            (execution_id, r['table'], 'staging_dw_fingerprint',
+             'Fail' if r['days_mismatched'] else 'Pass', r['staging_rows'], differing,
+             round(differing / r['staging_rows'] * 100, 2) if r['staging_rows'] else 0,
+             json.dumps({'staging_table': r['staging_table'], 'days_compared': r['days_compared'],
+                         'days_mismatched': r['days_mismatched'], 'differences': r['differences'],
+                         'findings': r['findings']}, default=str)),
+            (execution_id, r['table'], 'load_join_drops', drop_result, r['staging_rows'], dropped, drop_pct,
+             json.dumps({'staging_table': r['staging_table'], 'by_reason': r['drops'],
+                         'rows': r['dropped']}, default=str)),
+        ])
+    conn.commit()
+    cursor.close()
+    return execution_id
+
+def load_config(config_path='etl_config.yaml'):
+    with open(Path(__file__).parent / config_path, 'r') as f:
+        return yaml.safe_load(f)
+
+def run_reconciliation(tables=None, workers=None):
+    config = load_config()
+    settings = config['etl'].get('reconcile', {})
+    workers = workers or settings.get('workers', 4)
+    fetch_size = settings.get('fetch_size', 10000)
+    max_findings = settings.get('max_findings', 1000)
+    tables = tables or list(TABLES)
+
+    started = time.perf_counter()
+    results = []
+    error = None
+    try:
+        logger.info(f"Reconciling {len(tables)} fact tables with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(reconcile_table, config['database'], table, TABLES[table],
+                                       fetch_size, max_findings) for table in tables]
+            for future in futures:
+                result = future.result()
+                results.append(result)
+                logger.info(f"{result['table']}: {result['days_compared']:,} days, "
+                            f"{len(result['days_mismatched']):,} mismatched, "
+                            f"{sum(result['drops'].values()):,} dropped by the load ({result['seconds']:,.1f}s)")
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        conn = connect(config['database'])
+        try:
+            execution_id = log_results(conn, results, config.get('data_quality', {}).get(
+                'referential_threshold_pct', 0), error)
+        finally:
+            conn.close()
+
+    # Print summary
+    print("\n" + "=" * 80)
+    print("STAGING TO DW RECONCILIATION")
+    print("=" * 80)
+    for r in results:
+        status = 'MATCH' if not r['days_mismatched'] else f"{len(r['days_mismatched']):,} DAYS DIFFER"
+        print(f"{r['staging_table']} -> {r['table']}: {r['staging_rows']:,} staging rows, "
+              f"{r['days_compared']:,} days, {status}")
+        if r['days_mismatched']:
+            print(f"  Missing: {r['differences']['Missing']:,}  Extra: {r['differences']['Extra']:,}  "
+                  f"Changed: {r['differences']['Changed']:,}")
+            for finding in r['findings'][:5]:
+                print(f"    {finding['difference']:<8} {finding['id']} ({finding['day']})")
+        for reason, count in r['drops'].items():
+            if count:
+                print(f"  Dropped by load: {count:,} ({reason})")
+    print(f"Elapsed: {elapsed:,.1f}s")
+    print(f"Logged: audit.data_quality_log (execution {execution_id})")
+    print("=" * 80)
+
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Reconcile staging fact tables with the DW per day")
+    parser.add_argument('--table', choices=list(TABLES), action='append',
+                        help="DW fact table to reconcile; repeat for several (default: all)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Tables reconciled at once (default: etl.reconcile.workers)")
+    args = parser.parse_args()
+
+    run_reconciliation(tables=args.table, workers=args.workers)
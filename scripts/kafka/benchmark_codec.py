@@ -0,0 +1,93 @@
+"""
+Benchmark Event Codec
+Compares the binary schema codec against JSON on the replayed CSV events:
+bytes per event and encode/decode time per event, by event type.
+Every binary event is also decoded and checked against the original.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+
+from event_stream import REPLAY_SOURCES, data_dir, build_event, create_codec, load_config
+
+def load_events(limit):
+    """Up to limit events per CSV file"""
+    events = {}
+    for name, source in REPLAY_SOURCES.items():
+        path = os.path.join(data_dir(), name)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = itertools.islice(csv.DictReader(f), limit)
+            events[source['event_type']] = [build_event(source, row, datetime.now(timezone.utc).isoformat())[2]
+                                            for row in rows]
+    return events
+
+def time_per_event(fn, items, repeats):
+    """Median microseconds per item over repeats passes"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        samples.append((time.perf_counter() - start) / len(items) * 1e6)
+    return statistics.median(samples)
+
+def run_benchmark(limit=5000, repeats=5):
+    codec = create_codec(load_config())
+    codec.binary = True
+
+    def json_encode(event):
+        return json.dumps(event, separators=(',', ':')).encode('utf-8')
+
+    def json_decode(value):
+        return json.loads(value)
+
+    results = []
+    for event_type, events in load_events(limit).items():
+        json_values = [json_encode(e) for e in events]
+        binary_values = [codec.encode(e) for e in events]
+        mismatches = sum(codec.decode(v) != e for v, e in zip(binary_values, events))
+        results.append({
+            'event_type': event_type,
+            'events': len(events),
+            'json_bytes': sum(map(len, json_values)) / len(events),
+            'binary_bytes': sum(map(len, binary_values)) / len(events),
+            'json_encode_us': time_per_event(json_encode, events, repeats),
+            'binary_encode_us': time_per_event(codec.encode, events, repeats),
+            'json_decode_us': time_per_event(json_decode, json_values, repeats),
+            'binary_decode_us': time_per_event(codec.decode, binary_values, repeats),
+            'mismatches': mismatches,
+        })
+
+    print("\n" + "=" * 80)
+    print("EVENT CODEC BENCHMARK (per event)")
+    print("=" * 80)
+    print(f"{'Event type':<22}{'Bytes JSON':>11}{'Binary':>8}{'Enc us JSON':>13}{'Binary':>8}"
+          f"{'Dec us JSON':>13}{'Binary':>8}")
+    print("-" * 80)
+    for r in results:
+        print(f"{r['event_type']:<22}{r['json_bytes']:>11.0f}{r['binary_bytes']:>8.0f}"
+              f"{r['json_encode_us']:>13.2f}{r['binary_encode_us']:>8.2f}"
+              f"{r['json_decode_us']:>13.2f}{r['binary_decode_us']:>8.2f}")
+    print("-" * 80)
+    for r in results:
+        print(f"{r['event_type']:<22}{r['events']:>8,} events, "
+              f"{(1 - r['binary_bytes'] / r['json_bytes']) * 100:.0f}% smaller, "
+              f"{r['mismatches']} round-trip mismatches")
+    print("=" * 80)
+
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the binary event codec with JSON")
+    parser.add_argument('--limit', type=int, default=5000, help="Events per CSV file")
+    parser.add_argument('--repeats', type=int, default=5, help="Timed passes per measurement")
+    args = parser.parse_args()
+
+    run_benchmark(limit=args.limit, repeats=args.repeats)
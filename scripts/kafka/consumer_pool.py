@@ -0,0 +1,233 @@
+"""
+Kafka Consumer Pool
+Runs N staging consumer processes in the agric-analytics-group consumer
+group, so ingest scales with topic partitions and cores instead of one
+interpreter. Kafka spreads the partitions across the workers and
+rebalances them when a worker joins, leaves or dies.
+
+The supervisor restarts workers that exit, with exponential backoff, and
+gives up on a worker that keeps dying (kafka.pool.max_restarts in a row),
+so a message that crashes every consumer cannot crash-loop the pool. It
+stops workers cleanly on Ctrl+C /
+SIGTERM (each flushes its open batch before leaving the group), and
+writes per-partition lag and throughput to kafka.pool.metrics_file.
+Workers beyond the number of partitions sit idle.
+Requires: confluent-kafka, psycopg2
+"""
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import time
+from datetime import datetime
+
+from event_stream import TOPICS, load_config
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def worker_main(worker_id, topics, stop_event, reports, report_interval):
+    """Entry point of one worker process"""
+    # Ctrl+C reaches the whole process group; the supervisor turns it into stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from staging_consumer import StagingConsumer
+
+    consumer = StagingConsumer(load_config(), topics, name=f"worker-{worker_id}")
+    last = {'at': time.perf_counter(), 'consumed': {}}
+
+    def report(stats):
+        now = time.perf_counter()
+        elapsed = now - last['at']
+        for tp, tp_stats in stats.items():
+            # Counts restart when a partition moves to another worker
+            delta = tp_stats['consumed'] - last['consumed'].get(tp, 0)
+            tp_stats['msgs_per_second'] = max(delta, 0) / elapsed if elapsed else 0
+        last['at'] = now
+        last['consumed'] = {tp: tp_stats['consumed'] for tp, tp_stats in stats.items()}
+        reports.put({'worker': worker_id, 'partitions': stats, 'totals': consumer.metrics.summary()})
+
+    summary = consumer.run(stop_event=stop_event, report=report, report_interval=report_interval)
+    reports.put({'worker': worker_id, 'partitions': {}, 'totals': summary, 'final': True})
+
+class PoolSupervisor:
+    """Starts, watches and stops the worker processes and aggregates their reports"""
+
+    def __init__(self, workers, topics, report_interval, metrics_file,
+                 restart_backoff=1.0, restart_backoff_max=300.0, max_restarts=10):
+        self.workers = workers
+        self.topics = topics
+        self.report_interval = report_interval
+        self.metrics_file = metrics_file
+        self.restart_backoff = restart_backoff
+        self.restart_backoff_max = restart_backoff_max
+        self.max_restarts = max_restarts
+        self.stop_event = mp.Event()
+        self.reports = mp.Queue()
+        self.processes = {}
+        self.started_at = {}
+        self.restarts = {}
+        self.failures = {}
+        self.restart_at = {}
+        self.failed = set()
+        self.latest = {}
+
+    def start_worker(self, worker_id):
+        process = mp.Process(
+            target=worker_main,
+            args=(worker_id, self.topics, self.stop_event, self.reports, self.report_interval),
+            name=f"worker-{worker_id}",
+            daemon=False
+        )
+        process.start()
+        self.processes[worker_id] = process
+        self.started_at[worker_id] = time.monotonic()
+
+    def check_workers(self):
+        """
+        Restart workers that died after a backoff that doubles with each
+        consecutive failure; the group rebalances their partitions meanwhile.
+        A worker that ran for restart_backoff_max seconds counts as healthy
+        again; one that fails max_restarts times in a row is not restarted.
+        """
+        now = time.monotonic()
+        for worker_id, process in self.processes.items():
+            if process.is_alive() or self.stop_event.is_set() or worker_id in self.failed:
+                continue
+            if worker_id not in self.restart_at:
+                if now - self.started_at[worker_id] >= self.restart_backoff_max:
+                    self.failures[worker_id] = 0
+                self.failures[worker_id] = self.failures.get(worker_id, 0) + 1
+                self.latest.pop(worker_id, None)
+                if self.failures[worker_id] > self.max_restarts:
+                    logger.error(f"worker-{worker_id} exited with code {process.exitcode} "
+                                 f"{self.failures[worker_id]} times in a row, not restarting it")
+                    self.failed.add(worker_id)
+                    continue
+                delay = min(self.restart_backoff * 2 ** (self.failures[worker_id] - 1), self.restart_backoff_max)
+                self.restart_at[worker_id] = now + delay
+                logger.warning(f"worker-{worker_id} exited with code {process.exitcode}, "
+                               f"restarting in {delay:,.0f}s (failure {self.failures[worker_id]} in a row)")
+            if now >= self.restart_at[worker_id]:
+                del self.restart_at[worker_id]
+                self.restarts[worker_id] = self.restarts.get(worker_id, 0) + 1
+                self.start_worker(worker_id)
+
+        if len(self.failed) == len(self.processes):
+            logger.error("Every worker has failed, stopping the pool")
+            self.stop_event.set()
+
+    def drain_reports(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                report = self.reports.get(timeout=max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                break
+            self.latest[report['worker']] = report
+            if time.monotonic() >= deadline:
+                break
+
+    def snapshot(self):
+        partitions = {}
+        for worker_id, report in self.latest.items():
+            for tp, stats in report['partitions'].items():
+                partitions[tp] = dict(stats, worker=worker_id)
+        return {
+            'updated_at': datetime.now().isoformat(),
+            'workers': {
+                worker_id: {
+                    'pid': process.pid,
+                    'alive': process.is_alive(),
+                    'restarts': self.restarts.get(worker_id, 0),
+                    'failed': worker_id in self.failed,
+                    'totals': self.latest.get(worker_id, {}).get('totals'),
+                }
+                for worker_id, process in self.processes.items()
+            },
+            'partitions': dict(sorted(partitions.items())),
+            'total_lag': sum(p['lag'] for p in partitions.values() if p['lag'] is not None),
+            'msgs_per_second': sum(p['msgs_per_second'] for p in partitions.values()),
+        }
+
+    def publish(self):
+        """Write the metrics snapshot atomically and log a one-line summary"""
+        snapshot = self.snapshot()
+        tmp_path = self.metrics_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp_path, self.metrics_file)
+        logger.info(f"{len(snapshot['partitions'])} partitions, "
+                    f"lag {snapshot['total_lag']:,}, {snapshot['msgs_per_second']:,.0f} msgs/s")
+        return snapshot
+
+    def stop(self, *_):
+        self.stop_event.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        logger.info(f"Starting {self.workers} consumer workers on {', '.join(self.topics)}")
+        for worker_id in range(self.workers):
+            self.start_worker(worker_id)
+
+        try:
+            while not self.stop_event.is_set():
+                self.drain_reports(self.report_interval)
+                self.check_workers()
+                self.publish()
+        except KeyboardInterrupt:
+            self.stop_event.set()
+
+        logger.info("Stopping workers (flushing open batches)...")
+        for process in self.processes.values():
+            process.join(timeout=60)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop, terminating")
+                process.terminate()
+        self.drain_reports(0.5)
+        return self.publish()
+
+def run_pool(workers=None, topics=TOPICS):
+    config = load_config()
+    pool_config = config.get('kafka', {}).get('pool', {})
+    workers = workers or pool_config.get('workers', os.cpu_count() or 1)
+    report_interval = pool_config.get('report_interval_seconds', 10)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    metrics_file = os.path.join(script_dir, pool_config.get('metrics_file', 'consumer_pool_metrics.json'))
+
+    snapshot = PoolSupervisor(
+        workers, topics, report_interval, metrics_file,
+        restart_backoff=pool_config.get('restart_backoff_seconds', 1.0),
+        restart_backoff_max=pool_config.get('restart_backoff_max_seconds', 300.0),
+        max_restarts=pool_config.get('max_restarts', 10)
+    ).run()
+
+    # Print summary
+    totals = [w['totals'] for w in snapshot['workers'].values() if w['totals']]
+    print("\n" + "=" * 80)
+    print("KAFKA CONSUMER POOL")
+    print("=" * 80)
+    print(f"Workers: {workers} (restarts: {sum(w['restarts'] for w in snapshot['workers'].values())}, "
+          f"given up: {sum(w['failed'] for w in snapshot['workers'].values())})")
+    print(f"Messages: {sum(t['messages'] for t in totals):,} "
+          f"({sum(t['inserted'] for t in totals):,} new rows, "
+          f"{sum(t['dead_letters'] for t in totals):,} dead letters)")
+    print(f"Metrics: {metrics_file}")
+    print("=" * 80)
+
+    return snapshot
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a pool of staging consumer processes")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Consumer processes (default: kafka.pool.workers)")
+    parser.add_argument('--topics', nargs='+', choices=TOPICS, default=TOPICS)
+    args = parser.parse_args()
+
+    run_pool(workers=args.workers, topics=args.topics)
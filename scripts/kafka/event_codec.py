@@ -0,0 +1,312 @@
+"""
+Binary Event Codec
+Compact, schema-based encoding for the streaming events, with a
+file-backed schema registry stand-in.
+
+Wire format (big-endian header, little-endian body):
+    magic (1 byte, 0x00) | schema id (4 bytes)
+    timestamp (int64 us) | null bitmap (uint32) | fixed-width fields
+    | uint16 length per variable field | variable field bytes
+
+Field names are not sent; the schema id resolves them through the
+registry. Dates travel as int32 days and timestamps as int64, hex hashes
+as raw bytes. The envelope timestamp is UTC on the wire and decodes with a
++00:00 offset (naive publish times from older producers are read as UTC). Messages that start with '{' are decoded as JSON, so
+consumers read both formats while producers switch over.
+"""
+import json
+import logging
+import os
+import struct
+import threading
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0
+HEADER = struct.Struct('>BI')
+
+EPOCH_DATE = date(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH_DATE.toordinal()
+EPOCH_DATETIME = datetime(1970, 1, 1)
+
+# Current field layout per event type; registered on first use and whenever it changes
+EVENT_SCHEMAS = {
+    'TransactionRecorded': {
+        'id_field': 'transaction_id',
+        'time_field': 'transaction_date',
+        'fields': [
+            ('transaction_id', 'string'), ('farmer_id', 'string'), ('buyer_id', 'string'),
+            ('product_id', 'string'), ('market_id', 'string'), ('quantity_kg', 'float64'),
+            ('quality_grade', 'string'), ('unit_price', 'float64'), ('total_amount', 'float64'),
+            ('transaction_date', 'timestamp'), ('payment_method', 'string'),
+            ('payment_status', 'string'), ('blockchain_hash', 'hex'),
+        ],
+    },
+    'PriceObserved': {
+        'id_field': 'price_id',
+        'time_field': 'price_date',
+        'fields': [
+            ('price_id', 'string'), ('product_id', 'string'), ('market_id', 'string'),
+            ('price_date', 'date'), ('wholesale_price', 'float64'), ('retail_price', 'float64'),
+            ('price_trend', 'string'), ('source', 'string'),
+        ],
+    },
+    'WeatherObserved': {
+        'id_field': 'weather_id',
+        'time_field': 'weather_date',
+        'fields': [
+            ('weather_id', 'string'), ('district', 'string'), ('weather_date', 'date'),
+            ('temperature_min', 'float64'), ('temperature_max', 'float64'),
+            ('temperature_avg', 'float64'), ('rainfall_mm', 'float64'), ('humidity_pct', 'float64'),
+            ('wind_speed_kmh', 'float64'), ('weather_condition', 'string'), ('source', 'string'),
+        ],
+    },
+    'HarvestRecorded': {
+        'id_field': 'harvest_id',
+        'time_field': 'harvest_date',
+        'fields': [
+            ('harvest_id', 'string'), ('farmer_id', 'string'), ('product_id', 'string'),
+            ('planting_date', 'date'), ('harvest_date', 'date'), ('quantity_kg', 'float64'),
+            ('quality_assessment', 'string'), ('post_harvest_loss_pct', 'float64'),
+            ('storage_method', 'string'), ('season', 'string'),
+        ],
+    },
+}
+
+@lru_cache(maxsize=4096)
+def _to_date(value):
+    return date.fromisoformat(value).toordinal() - EPOCH_ORDINAL
+
+@lru_cache(maxsize=4096)
+def _from_date(value):
+    return date.fromordinal(value + EPOCH_ORDINAL).isoformat()
+
+def _to_timestamp(value):
+    return int((datetime.fromisoformat(value) - EPOCH_DATETIME).total_seconds())
+
+@lru_cache(maxsize=4096)
+def _format_seconds(value, sep):
+    """datetime.isoformat() of epoch seconds, reusing the cached date"""
+    days, seconds = divmod(value, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{_from_date(days)}{sep}{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+def _from_timestamp(value):
+    return _format_seconds(value, ' ')
+
+def _to_timestamp_us(value):
+    published = datetime.fromisoformat(value)
+    if published.tzinfo is not None:
+        published = published.astimezone(timezone.utc).replace(tzinfo=None)
+    return (published - EPOCH_DATETIME) // timedelta(microseconds=1)
+
+def _from_timestamp_us(value):
+    seconds, microseconds = divmod(value, 1000000)
+    text = _format_seconds(seconds, 'T')
+    return f"{text}.{microseconds:06d}+00:00" if microseconds else f"{text}+00:00"
+
+# type -> (struct code, to wire, from wire, null placeholder)
+FIXED_TYPES = {
+    'float64': ('d', float, None, 0.0),
+    'date': ('i', _to_date, _from_date, 0),
+    'timestamp': ('q', _to_timestamp, _from_timestamp, 0),
+}
+
+# type -> (to bytes, from bytes)
+VARIABLE_TYPES = {
+    'string': (lambda v: v.encode('utf-8'), bytes.decode),
+    'hex': (bytes.fromhex, bytes.hex),
+}
+
+class SchemaRegistry:
+    """
+    File-backed stand-in for a schema registry. Every schema gets a global
+    id and a per-subject version; a changed field list registers a new
+    version, and old ids stay resolvable for messages already on the topics.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.schemas = self._read()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)['schemas']
+
+    def _write(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'schemas': self.schemas}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def latest(self, subject):
+        versions = [s for s in self.schemas if s['subject'] == subject]
+        return max(versions, key=lambda s: s['version']) if versions else None
+
+    def register(self, subject, definition):
+        """Return the schema for definition, registering a new version if it differs"""
+        with self.lock:
+            # Another process may have registered since we loaded
+            self.schemas = self._read()
+            fields = [{'name': name, 'type': type_} for name, type_ in definition['fields']]
+            current = self.latest(subject)
+            if current and current['fields'] == fields and \
+                    current['id_field'] == definition['id_field'] and \
+                    current['time_field'] == definition['time_field']:
+                return current
+            schema = {
+                'id': max((s['id'] for s in self.schemas), default=0) + 1,
+                'subject': subject,
+                'version': current['version'] + 1 if current else 1,
+                'id_field': definition['id_field'],
+                'time_field': definition['time_field'],
+                'fields': fields,
+            }
+            self.schemas.append(schema)
+            self._write()
+            logger.info(f"Registered schema {subject} v{schema['version']} (id {schema['id']})")
+            return schema
+
+    def get(self, schema_id):
+        """Schema by id, re-reading the file once for ids registered elsewhere"""
+        for schema in self.schemas:
+            if schema['id'] == schema_id:
+                return schema
+        with self.lock:
+            self.schemas = self._read()
+        for schema in self.schemas:
+            if schema['id'] == schema_id:
+                return schema
+        raise KeyError(schema_id)
+
+class SchemaCodec:
+    """Precompiled encoder/decoder for one registered schema"""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.subject = schema['subject']
+        self.id_field = schema['id_field']
+        self.time_field = schema['time_field']
+        fields = [(f['name'], f['type']) for f in schema['fields']]
+        self.names = [name for name, _ in fields]
+        self.fixed = [(name, FIXED_TYPES[type_]) for name, type_ in fields if type_ in FIXED_TYPES]
+        self.variable = [(name, VARIABLE_TYPES[type_]) for name, type_ in fields if type_ in VARIABLE_TYPES]
+        self.bits = {name: 1 << i for i, name in enumerate(self.names)}
+        self.fixed_readers = [(name, self.bits[name], from_wire)
+                              for name, (_, _, from_wire, _) in self.fixed]
+        self.variable_readers = [(name, self.bits[name], from_bytes)
+                                 for name, (_, from_bytes) in self.variable]
+        self.n_fixed = len(self.fixed)
+        self.header = HEADER.pack(MAGIC, schema['id'])
+        self.body = struct.Struct(
+            '<qI' + ''.join(code for _, (code, _, _, _) in self.fixed) + 'H' * len(self.variable)
+        )
+        self.variable_start = HEADER.size + self.body.size
+
+    def encode(self, event):
+        payload = event['payload']
+        nulls = 0
+        fixed_values = []
+        for name, (_, to_wire, _, placeholder) in self.fixed:
+            value = payload.get(name)
+            if value is None:
+                nulls |= self.bits[name]
+                fixed_values.append(placeholder)
+            else:
+                fixed_values.append(to_wire(value))
+        variable_values = []
+        for name, (to_bytes, _) in self.variable:
+            value = payload.get(name)
+            if value is None:
+                nulls |= self.bits[name]
+                variable_values.append(b'')
+            else:
+                variable_values.append(to_bytes(value))
+        timestamp_us = _to_timestamp_us(event['timestamp'])
+        return b''.join([
+            self.header,
+            self.body.pack(timestamp_us, nulls, *fixed_values, *map(len, variable_values)),
+            *variable_values,
+        ])
+
+    def decode(self, value):
+        """Decode one binary message; raises ValueError for corrupt bodies"""
+        try:
+            unpacked = self.body.unpack_from(value, HEADER.size)
+            nulls = unpacked[1]
+
+            # Filled in wire order (fixed, then variable); consumers look fields up by name
+            payload = {}
+            for (name, bit, from_wire), raw in zip(self.fixed_readers, unpacked[2:]):
+                if nulls & bit:
+                    payload[name] = None
+                else:
+                    payload[name] = from_wire(raw) if from_wire else raw
+            pos = self.variable_start
+            for (name, bit, from_bytes), length in zip(self.variable_readers, unpacked[2 + self.n_fixed:]):
+                end = pos + length
+                payload[name] = None if nulls & bit else from_bytes(value[pos:end])
+                pos = end
+            if pos != len(value):
+                raise ValueError(f"{len(value) - pos} trailing bytes after {self.subject} event")
+
+            return {
+                'event_id': payload[self.id_field],
+                'timestamp': _from_timestamp_us(unpacked[0]),
+                'event_time': payload[self.time_field],
+                'type': self.subject,
+                'payload': payload,
+            }
+        # Out-of-range dates/timestamps overflow; bad lengths or bytes fail unpack/decode
+        except (OverflowError, ValueError, struct.error, KeyError) as e:
+            raise ValueError(f"corrupt {self.subject} event: {e!r}") from None
+
+class EventCodec:
+    """
+    Encodes events with the latest registered schema of their type and
+    decodes any registered version (or JSON).
+    """
+
+    def __init__(self, registry, binary=True):
+        self.registry = registry
+        self.binary = binary
+        self.writers = {}
+        self.readers = {}
+
+    def writer(self, event_type):
+        if event_type not in self.writers:
+            schema = self.registry.register(event_type, EVENT_SCHEMAS[event_type])
+            self.writers[event_type] = self.reader(schema['id'])
+        return self.writers[event_type]
+
+    def reader(self, schema_id):
+        if schema_id not in self.readers:
+            self.readers[schema_id] = SchemaCodec(self.registry.get(schema_id))
+        return self.readers[schema_id]
+
+    def encode(self, event):
+        if not self.binary or event['type'] not in EVENT_SCHEMAS:
+            return json.dumps(event, separators=(',', ':')).encode('utf-8')
+        return self.writer(event['type']).encode(event)
+
+    def decode(self, value):
+        """Decode one message value; raises ValueError for anything malformed"""
+        if value[:1] == b'{':
+            return json.loads(value.decode('utf-8'))
+        try:
+            magic, schema_id = HEADER.unpack_from(value)
+        except struct.error as e:
+            raise ValueError(f"truncated event: {e}") from None
+        if magic != MAGIC:
+            raise ValueError(f"unknown magic byte {magic}")
+        try:
+            reader = self.reader(schema_id)
+        except KeyError:
+            raise ValueError(f"unknown schema id {schema_id}") from None
+        return reader.decode(value)
@@ -0,0 +1,203 @@
+"""
+Event Stream Definitions
+Topics, event envelopes and client factories shared by the streaming
+producer and consumers.
+
+Each replayed CSV maps onto one topic and event type. Events are keyed so
+that all events for the same product/market, district or farmer land on
+the same partition and stay in order.
+"""
+import os
+import logging
+
+import yaml
+
+from event_codec import EventCodec, SchemaRegistry
+from inprocess_broker import InProcessBroker
+import inprocess_broker
+
+try:
+    from confluent_kafka import Producer, Consumer, TopicPartition
+    HAS_KAFKA = True
+except ImportError:
+    HAS_KAFKA = False
+
+logger = logging.getLogger(__name__)
+
+TOPICS = ['commodity_prices', 'weather_alerts', 'harvest_logs']
+
+# CSV file -> topic, event type, id column, key columns, event-time column, numeric columns
+REPLAY_SOURCES = {
+    'transactions.csv': {
+        'topic': 'commodity_prices',
+        'event_type': 'TransactionRecorded',
+        'id_field': 'transaction_id',
+        'key_fields': ('product_id', 'market_id'),
+        'time_field': 'transaction_date',
+        'numeric_fields': ('quantity_kg', 'unit_price', 'total_amount'),
+    },
+    'pricing.csv': {
+        'topic': 'commodity_prices',
+        'event_type': 'PriceObserved',
+        'id_field': 'price_id',
+        'key_fields': ('product_id', 'market_id'),
+        'time_field': 'price_date',
+        'numeric_fields': ('wholesale_price', 'retail_price'),
+    },
+    'weather.csv': {
+        'topic': 'weather_alerts',
+        'event_type': 'WeatherObserved',
+        'id_field': 'weather_id',
+        'key_fields': ('district',),
+        'time_field': 'weather_date',
+        'numeric_fields': ('temperature_min', 'temperature_max', 'temperature_avg',
+                           'rainfall_mm', 'humidity_pct', 'wind_speed_kmh'),
+    },
+    'harvests.csv': {
+        'topic': 'harvest_logs',
+        'event_type': 'HarvestRecorded',
+        'id_field': 'harvest_id',
+        'key_fields': ('farmer_id',),
+        'time_field': 'harvest_date',
+        'numeric_fields': ('quantity_kg', 'post_harvest_loss_pct'),
+    },
+}
+
+# Event type -> staging table and the payload columns copied into it
+STAGING_TARGETS = {
+    'TransactionRecorded': {
+        'table': 'staging.stg_transactions',
+        'columns': ('transaction_id', 'farmer_id', 'buyer_id', 'product_id', 'market_id',
+                    'quantity_kg', 'quality_grade', 'unit_price', 'total_amount',
+                    'transaction_date', 'payment_method', 'payment_status', 'blockchain_hash'),
+    },
+    'PriceObserved': {
+        'table': 'staging.stg_pricing',
+        'columns': ('price_id', 'product_id', 'market_id', 'price_date', 'wholesale_price',
+                    'retail_price', 'price_trend', 'source'),
+    },
+    'WeatherObserved': {
+        'table': 'staging.stg_weather',
+        'columns': ('weather_id', 'district', 'weather_date', 'temperature_min', 'temperature_max',
+                    'temperature_avg', 'rainfall_mm', 'humidity_pct', 'wind_speed_kmh',
+                    'weather_condition', 'source'),
+    },
+    'HarvestRecorded': {
+        'table': 'staging.stg_harvests',
+        'columns': ('harvest_id', 'farmer_id', 'product_id', 'planting_date', 'harvest_date',
+                    'quantity_kg', 'quality_assessment', 'post_harvest_loss_pct',
+                    'storage_method', 'season'),
+    },
+}
+
+# Staging bookkeeping columns that are not part of the event payload
+EXCLUDED_FIELDS = ('loaded_at',)
+
+def load_config(config_path=None):
+    """Load the shared ETL configuration (scripts/etl/etl_config.yaml)"""
+    if config_path is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        config_path = os.path.join(script_dir, '..', 'etl', 'etl_config.yaml')
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f)
+
+def data_dir():
+    """Generated CSV datasets (project_root/data)"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(os.path.dirname(script_dir)), 'data')
+
+def build_event(source, row, timestamp):
+    """Wrap one CSV row in the event envelope; returns (topic, key, event)"""
+    payload = {}
+    for field, value in row.items():
+        if field in EXCLUDED_FIELDS:
+            continue
+        if field in source['numeric_fields']:
+            value = float(value) if value != '' else None
+        payload[field] = value
+    event = {
+        'event_id': row[source['id_field']],
+        'timestamp': timestamp,
+        'event_time': row[source['time_field']],
+        'type': source['event_type'],
+        'payload': payload,
+    }
+    key = '|'.join(row[field] for field in source['key_fields'])
+    return source['topic'], key, event
+
+def create_codec(config):
+    """Event codec configured by kafka.serialization and kafka.schema_registry"""
+    kafka_config = config.get('kafka', {})
+    registry_path = kafka_config.get('schema_registry', '../../kafka/schema_registry.json')
+    if not os.path.isabs(registry_path):
+        registry_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), registry_path)
+    binary = kafka_config.get('serialization', 'binary') == 'binary'
+    return EventCodec(SchemaRegistry(registry_path), binary=binary)
+
+_codec = None
+
+def default_codec():
+    """Codec shared by the producer and consumers in this process"""
+    global _codec
+    if _codec is None:
+        _codec = create_codec(load_config())
+    return _codec
+
+def encode_event(event):
+    return default_codec().encode(event)
+
+def decode_event(value):
+    return default_codec().decode(value)
+
+def producer_conf(config):
+    """librdkafka producer settings from the kafka section of etl_config.yaml"""
+    kafka_config = config.get('kafka', {})
+    producer_config = kafka_config.get('producer', {})
+    return {
+        'bootstrap.servers': kafka_config.get('bootstrap_servers', 'localhost:29092'),
+        'linger.ms': producer_config.get('linger_ms', 20),
+        'batch.size': producer_config.get('batch_size_bytes', 262144),
+        'compression.type': producer_config.get('compression_type', 'lz4'),
+        'acks': producer_config.get('acks', 1),
+        'queue.buffering.max.messages': producer_config.get('queue_max_messages', 500000),
+    }
+
+def create_producer(conf, broker=None):
+    """
+    Producer for conf: a real confluent_kafka Producer, or the in-process
+    stand-in when a broker is passed (or confluent_kafka is missing).
+    """
+    if broker is None and HAS_KAFKA:
+        return Producer(conf)
+    if broker is None:
+        logger.warning("confluent_kafka module not found. Using the in-process broker stand-in.")
+        broker = InProcessBroker()
+    return inprocess_broker.Producer(broker, conf)
+
+def consumer_conf(config):
+    """librdkafka consumer settings; offsets are committed manually after the DB commit"""
+    kafka_config = config.get('kafka', {})
+    consumer_config = kafka_config.get('consumer', {})
+    return {
+        'bootstrap.servers': kafka_config.get('bootstrap_servers', 'localhost:29092'),
+        'group.id': kafka_config.get('group_id', 'agric-analytics-group'),
+        'auto.offset.reset': consumer_config.get('auto_offset_reset', 'earliest'),
+        'enable.auto.commit': False,
+        'partition.assignment.strategy': consumer_config.get('assignment_strategy', 'cooperative-sticky'),
+        'fetch.min.bytes': consumer_config.get('fetch_min_bytes', 65536),
+        'fetch.wait.max.ms': consumer_config.get('fetch_wait_max_ms', 100),
+    }
+
+def create_consumer(conf, broker=None):
+    """Consumer for conf: confluent_kafka, or the in-process stand-in when a broker is passed"""
+    if broker is None and HAS_KAFKA:
+        return Consumer(conf)
+    if broker is None:
+        raise RuntimeError("confluent_kafka is not installed; use the in-process broker stand-in")
+    return inprocess_broker.Consumer(broker, conf)
+
+def topic_partition(broker, topic, partition, offset):
+    """TopicPartition class matching the client in use"""
+    if broker is None and HAS_KAFKA:
+        return TopicPartition(topic, partition, offset)
+    return inprocess_broker.TopicPartition(topic, partition, offset)
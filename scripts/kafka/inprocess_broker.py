@@ -0,0 +1,220 @@
+"""
+In-Process Kafka Stand-in
+A minimal in-memory broker with Producer/Consumer classes that mirror the
+parts of the confluent_kafka API the streaming scripts use, so the replay
+producer and consumers can be exercised without a broker container.
+
+Messages are keyed onto partitions, kept in memory and never expire.
+Consumer groups track committed offsets per partition.
+"""
+import threading
+import time
+import zlib
+
+class Message:
+    """Stand-in for confluent_kafka.Message"""
+
+    def __init__(self, topic, partition, offset, key, value, headers, timestamp):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+        self._headers = headers
+        self._timestamp = timestamp
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def headers(self):
+        return self._headers
+
+    def timestamp(self):
+        # (TIMESTAMP_CREATE_TIME, ms since epoch), as confluent_kafka returns it
+        return (1, self._timestamp)
+
+    def error(self):
+        return None
+
+    def __len__(self):
+        return len(self._value or b'')
+
+class TopicPartition:
+    """Stand-in for confluent_kafka.TopicPartition"""
+
+    def __init__(self, topic, partition, offset=-1001):
+        self.topic = topic
+        self.partition = partition
+        self.offset = offset
+
+    def __repr__(self):
+        return f"TopicPartition({self.topic}, {self.partition}, {self.offset})"
+
+class InProcessBroker:
+    """Holds topic partitions and consumer group offsets in memory"""
+
+    def __init__(self, partitions=6):
+        self.default_partitions = partitions
+        self.topics = {}
+        self.committed = {}
+        self.lock = threading.Lock()
+
+    def create_topic(self, topic, partitions=None):
+        with self.lock:
+            if topic not in self.topics:
+                self.topics[topic] = [[] for _ in range(partitions or self.default_partitions)]
+            return self.topics[topic]
+
+    def partition_for(self, topic, key):
+        partitions = self.create_topic(topic)
+        if key is None:
+            return 0
+        return zlib.crc32(key) % len(partitions)
+
+    def append(self, topic, partition, key, value, headers):
+        log = self.create_topic(topic)[partition]
+        with self.lock:
+            offset = len(log)
+            log.append(Message(topic, partition, offset, key, value, headers,
+                               int(time.time() * 1000)))
+        return log[offset]
+
+    def end_offset(self, topic, partition):
+        return len(self.create_topic(topic)[partition])
+
+class Producer:
+    """Stand-in for confluent_kafka.Producer (delivery callbacks served by poll/flush)"""
+
+    def __init__(self, broker, conf=None):
+        self.broker = broker
+        self.conf = conf or {}
+        self.pending = []
+
+    def produce(self, topic, value=None, key=None, headers=None, callback=None, on_delivery=None):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        partition = self.broker.partition_for(topic, key)
+        msg = self.broker.append(topic, partition, key, value, headers)
+        callback = callback or on_delivery
+        if callback:
+            self.pending.append((callback, msg))
+
+    def poll(self, timeout=0):
+        served = len(self.pending)
+        for callback, msg in self.pending:
+            callback(None, msg)
+        self.pending = []
+        return served
+
+    def flush(self, timeout=None):
+        self.poll(0)
+        return 0
+
+    def __len__(self):
+        return len(self.pending)
+
+class Consumer:
+    """
+    Stand-in for confluent_kafka.Consumer. A single member per group is
+    assumed: subscribe() assigns every partition of the subscribed topics.
+    """
+
+    def __init__(self, broker, conf):
+        self.broker = broker
+        self.group_id = conf['group.id']
+        self.reset_earliest = conf.get('auto.offset.reset', 'latest') == 'earliest'
+        self.assignment_list = []
+        self.positions = {}
+        self.paused = set()
+        self.next_partition = 0
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None):
+        assignment = []
+        for topic in topics:
+            for partition in range(len(self.broker.create_topic(topic))):
+                assignment.append(TopicPartition(topic, partition))
+        self.assign(assignment)
+        if on_assign:
+            on_assign(self, assignment)
+
+    def assign(self, partitions):
+        self.assignment_list = list(partitions)
+        for tp in self.assignment_list:
+            tp_key = (tp.topic, tp.partition)
+            committed = self.broker.committed.get((self.group_id,) + tp_key)
+            if tp.offset >= 0:
+                self.positions[tp_key] = tp.offset
+            elif committed is not None:
+                self.positions[tp_key] = committed
+            elif self.reset_earliest:
+                self.positions[tp_key] = 0
+            else:
+                self.positions[tp_key] = self.broker.end_offset(*tp_key)
+
+    def assignment(self):
+        return list(self.assignment_list)
+
+    def consume(self, num_messages=1, timeout=-1):
+        messages = []
+        for _ in range(len(self.assignment_list)):
+            if len(messages) >= num_messages:
+                break
+            tp = self.assignment_list[self.next_partition % len(self.assignment_list)]
+            self.next_partition += 1
+            tp_key = (tp.topic, tp.partition)
+            if tp_key in self.paused:
+                continue
+            log = self.broker.topics[tp.topic][tp.partition]
+            start = self.positions[tp_key]
+            batch = log[start:start + num_messages - len(messages)]
+            self.positions[tp_key] = start + len(batch)
+            messages.extend(batch)
+        if not messages and timeout and timeout > 0:
+            time.sleep(min(timeout, 0.1))
+        return messages
+
+    def poll(self, timeout=None):
+        messages = self.consume(1, timeout or 0)
+        return messages[0] if messages else None
+
+    def pause(self, partitions):
+        self.paused.update((tp.topic, tp.partition) for tp in partitions)
+
+    def resume(self, partitions):
+        self.paused.difference_update((tp.topic, tp.partition) for tp in partitions)
+
+    def commit(self, message=None, offsets=None, asynchronous=True):
+        if message is not None:
+            offsets = [TopicPartition(message.topic(), message.partition(), message.offset() + 1)]
+        if offsets is None:
+            offsets = [TopicPartition(t, p, o) for (t, p), o in self.positions.items()]
+        for tp in offsets:
+            self.broker.committed[(self.group_id, tp.topic, tp.partition)] = tp.offset
+        return offsets
+
+    def position(self, partitions):
+        return [
+            TopicPartition(tp.topic, tp.partition, self.positions.get((tp.topic, tp.partition), -1001))
+            for tp in partitions
+        ]
+
+    def get_watermark_offsets(self, partition, timeout=None, cached=False):
+        return 0, self.broker.end_offset(partition.topic, partition.partition)
+
+    def close(self):
+        self.assignment_list = []
+        self.paused = set()
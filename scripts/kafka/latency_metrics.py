@@ -0,0 +1,95 @@
+"""
+Streaming Latency Metrics
+Fixed-bucket latency histograms per (topic, stage), written as a JSON
+metrics file with p50/p95/p99 for freshness SLOs.
+
+Latencies are measured from the event's publish timestamp (the envelope
+'timestamp' set by the producer, in UTC), so producer and consumer clocks
+are assumed to be in sync; their time zones may differ.
+"""
+import bisect
+import json
+import os
+import threading
+from datetime import datetime
+
+# Bucket upper bounds in ms: 10 per decade (~26% apart) from 1 ms to ~1 day
+BUCKET_BOUNDS_MS = [round(10 ** (i / 10), 1) for i in range(0, 80)]
+
+def publish_time(event):
+    """Epoch seconds of the event's publish timestamp"""
+    return datetime.fromisoformat(event['timestamp']).timestamp()
+
+class LatencyHistogram:
+    """Bucketed latency distribution; percentiles resolve to a bucket's upper bound"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, latency_ms):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, latency_ms)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+        if latency_ms > self.max_ms:
+            self.max_ms = latency_ms
+
+    def percentile(self, pct):
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(BUCKET_BOUNDS_MS[i], self.max_ms) if i < len(BUCKET_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max_ms,
+            'buckets': {f"le_{bound}": n for bound, n in zip(BUCKET_BOUNDS_MS, self.counts) if n},
+        }
+
+class LatencyRecorder:
+    """Histograms keyed by (topic, stage), published to a metrics file"""
+
+    def __init__(self, metrics_file=None):
+        self.metrics_file = metrics_file
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, topic, stage, latency_ms):
+        with self.lock:
+            histogram = self.histograms.get((topic, stage))
+            if histogram is None:
+                histogram = self.histograms[(topic, stage)] = LatencyHistogram()
+            histogram.record(latency_ms)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'updated_at': datetime.now().isoformat(),
+                'latency': {
+                    f"{topic}/{stage}": histogram.summary()
+                    for (topic, stage), histogram in sorted(self.histograms.items())
+                },
+            }
+
+    def publish(self):
+        """Write the snapshot atomically (no-op without a metrics file)"""
+        if not self.metrics_file:
+            return None
+        snapshot = self.snapshot()
+        tmp_path = self.metrics_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp_path, self.metrics_file)
+        return snapshot
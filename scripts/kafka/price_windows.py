@@ -0,0 +1,427 @@
+"""
+Kafka Price Windows
+Stream processor for commodity_prices: keeps tumbling and sliding windows
+per (product_id, market_id) over TransactionRecorded events and upserts
+VWAP, min/max/last price and the Up/Down/Stable trend into
+dw.fact_price_window for near-real-time price dashboards.
+
+Windows are built from fixed panes (the tumbling size); a sliding window
+is the sum of the panes it covers, so each trade is folded in once.
+A pane closes once the watermark (latest event time minus the allowed
+lateness) passes its end; later events for it are dropped and counted.
+Open windows are written as provisional rows (is_final = FALSE) and
+overwritten when they close.
+
+State and consumed offsets are checkpointed to a JSON file after every
+flush, and partitions resume from the checkpointed offsets, so a restart
+recomputes exactly the windows it had not yet checkpointed.
+Run a single instance; state is not shared between processes.
+Requires: confluent-kafka (or --in-process for the in-memory stand-in), psycopg2
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from event_stream import load_config, decode_event, consumer_conf, create_consumer
+from inprocess_broker import InProcessBroker
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TOPIC = 'commodity_prices'
+
+EPOCH = datetime(1970, 1, 1)
+
+# Pane layout: [trade_count, volume, notional, min_price, max_price, last_price, last_time]
+COUNT, VOLUME, NOTIONAL, MIN_PRICE, MAX_PRICE, LAST_PRICE, LAST_TIME = range(7)
+
+UPSERT_SQL = """
+    INSERT INTO dw.fact_price_window (
+        window_type, window_start, window_end, product_id, market_id,
+        product_key, market_key, trade_count, volume_kg, vwap,
+        min_price, max_price, last_price, price_trend, is_final, updated_at
+    )
+    SELECT
+        v.window_type, v.window_start, v.window_end, v.product_id, v.market_id,
+        dp.product_key, dm.market_key, v.trade_count, v.volume_kg, v.vwap,
+        v.min_price, v.max_price, v.last_price, v.price_trend, v.is_final, CURRENT_TIMESTAMP
+    FROM (VALUES %s) AS v (
+        window_type, window_start, window_end, product_id, market_id, trade_count,
+        volume_kg, vwap, min_price, max_price, last_price, price_trend, is_final
+    )
+    LEFT JOIN dw.dim_product dp ON dp.product_id = v.product_id AND dp.is_current = TRUE
+    LEFT JOIN dw.dim_market dm ON dm.market_id = v.market_id AND dm.is_current = TRUE
+    ON CONFLICT (window_type, product_id, market_id, window_end) DO UPDATE SET
+        product_key = EXCLUDED.product_key,
+        market_key = EXCLUDED.market_key,
+        trade_count = EXCLUDED.trade_count,
+        volume_kg = EXCLUDED.volume_kg,
+        vwap = EXCLUDED.vwap,
+        min_price = EXCLUDED.min_price,
+        max_price = EXCLUDED.max_price,
+        last_price = EXCLUDED.last_price,
+        price_trend = EXCLUDED.price_trend,
+        is_final = EXCLUDED.is_final,
+        updated_at = EXCLUDED.updated_at
+"""
+
+def determine_trend(current_price, previous_price):
+    """Same ±2% rule as determine_trend() in generate_pricing.py"""
+    if current_price > previous_price * 1.02:
+        return "Up"
+    elif current_price < previous_price * 0.98:
+        return "Down"
+    else:
+        return "Stable"
+
+def combine(panes):
+    """Merge panes into one window; None if none of them had trades"""
+    window = None
+    for pane in panes:
+        if window is None:
+            window = list(pane)
+            continue
+        window[COUNT] += pane[COUNT]
+        window[VOLUME] += pane[VOLUME]
+        window[NOTIONAL] += pane[NOTIONAL]
+        window[MIN_PRICE] = min(window[MIN_PRICE], pane[MIN_PRICE])
+        window[MAX_PRICE] = max(window[MAX_PRICE], pane[MAX_PRICE])
+        if pane[LAST_TIME] >= window[LAST_TIME]:
+            window[LAST_PRICE] = pane[LAST_PRICE]
+            window[LAST_TIME] = pane[LAST_TIME]
+    return window
+
+def vwap(window):
+    return window[NOTIONAL] / window[VOLUME] if window and window[VOLUME] else None
+
+def to_datetime(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+def to_epoch_seconds(value):
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        # Publish times are UTC-aware; event times are naive
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((moment - EPOCH).total_seconds())
+
+class PriceWindowStore:
+    """
+    In-memory window state: per key, a dict of pane start -> pane stats.
+    Only panes still needed for an open window or a trend are kept.
+    """
+
+    def __init__(self, tumbling_seconds, sliding_seconds, allowed_lateness_seconds):
+        if sliding_seconds % tumbling_seconds:
+            raise ValueError("sliding_seconds must be a multiple of tumbling_seconds")
+        self.slide = tumbling_seconds
+        self.size = sliding_seconds
+        self.lateness = allowed_lateness_seconds
+        self.panes = {}
+        self.max_event_time = None
+        self.closed_until = None
+        self.dirty = set()
+        self.open_panes = set()
+        self.late_events = 0
+
+    def add(self, key, event_time, price, quantity):
+        """Fold one trade into its pane; returns False if the pane already closed"""
+        pane_start = event_time - event_time % self.slide
+        if self.closed_until is not None and pane_start + self.slide <= self.closed_until:
+            self.late_events += 1
+            return False
+        key_panes = self.panes.setdefault(key, {})
+        pane = key_panes.get(pane_start)
+        if pane is None:
+            key_panes[pane_start] = [1, quantity, price * quantity, price, price, price, event_time]
+        else:
+            pane[COUNT] += 1
+            pane[VOLUME] += quantity
+            pane[NOTIONAL] += price * quantity
+            pane[MIN_PRICE] = min(pane[MIN_PRICE], price)
+            pane[MAX_PRICE] = max(pane[MAX_PRICE], price)
+            if event_time >= pane[LAST_TIME]:
+                pane[LAST_PRICE] = price
+                pane[LAST_TIME] = event_time
+        self.dirty.add((key, pane_start))
+        if self.max_event_time is None or event_time > self.max_event_time:
+            self.max_event_time = event_time
+        return True
+
+    def sliding_window(self, key_panes, window_end):
+        return combine(pane for start, pane in key_panes.items()
+                       if window_end - self.size <= start < window_end)
+
+    def row(self, window_type, key, window_start, window_end, window, previous, is_final):
+        product_id, market_id = key.split('|', 1)
+        current_vwap = vwap(window)
+        previous_vwap = vwap(previous)
+        trend = determine_trend(current_vwap, previous_vwap) if previous_vwap else None
+        return (
+            window_type, to_datetime(window_start), to_datetime(window_end), product_id, market_id,
+            window[COUNT], round(window[VOLUME], 2),
+            round(current_vwap, 2) if current_vwap is not None else None,
+            window[MIN_PRICE], window[MAX_PRICE], window[LAST_PRICE], trend, is_final,
+        )
+
+    def results(self):
+        """
+        Rows to upsert: changed and newly closed tumbling panes, sliding
+        windows that closed since the last call, and the open sliding window
+        of every key that changed. Advances closed_until and evicts old panes.
+        """
+        if self.max_event_time is None:
+            return []
+        watermark = self.max_event_time - self.lateness
+        closed_until = watermark - watermark % self.slide
+        rows = []
+
+        # Tumbling windows
+        newly_closed = {(key, start) for key, start in self.open_panes if start + self.slide <= closed_until}
+        for key, start in sorted(self.dirty | newly_closed):
+            key_panes = self.panes[key]
+            earlier = [s for s in key_panes if s < start]
+            previous = key_panes[max(earlier)] if earlier else None
+            is_final = start + self.slide <= closed_until
+            rows.append(self.row('tumbling', key, start, start + self.slide,
+                                 key_panes[start], previous, is_final))
+            if is_final:
+                self.open_panes.discard((key, start))
+            else:
+                self.open_panes.add((key, start))
+
+        # Sliding windows that closed since the last call: each pane falls in
+        # the windows ending at its own end up to size later
+        for key, key_panes in self.panes.items():
+            window_ends = set()
+            for start in key_panes:
+                first_end = start + self.slide
+                if self.closed_until is not None:
+                    first_end = max(first_end, self.closed_until + self.slide)
+                window_ends.update(range(first_end, min(start + self.size, closed_until) + 1, self.slide))
+            for window_end in sorted(window_ends):
+                window = self.sliding_window(key_panes, window_end)
+                previous = self.sliding_window(key_panes, window_end - self.slide)
+                rows.append(self.row('sliding', key, window_end - self.size, window_end,
+                                     window, previous, True))
+
+        # Provisional sliding window ending at the current pane, for keys that changed
+        open_end = self.max_event_time - self.max_event_time % self.slide + self.slide
+        if open_end > closed_until:
+            for key in sorted({key for key, _ in self.dirty}):
+                key_panes = self.panes[key]
+                window = self.sliding_window(key_panes, open_end)
+                if window:
+                    previous = self.sliding_window(key_panes, open_end - self.slide)
+                    rows.append(self.row('sliding', key, open_end - self.size, open_end,
+                                         window, previous, False))
+
+        self.closed_until = closed_until
+        self.dirty = set()
+        self.evict()
+        return rows
+
+    def evict(self):
+        """Drop panes no open window or trend can reach any more"""
+        oldest = self.closed_until - self.size - self.slide
+        for key in list(self.panes):
+            key_panes = self.panes[key]
+            for start in [s for s in key_panes if s < oldest]:
+                del key_panes[start]
+            if not key_panes:
+                del self.panes[key]
+
+    def to_checkpoint(self):
+        return {
+            'panes': {key: {str(start): pane for start, pane in key_panes.items()}
+                      for key, key_panes in self.panes.items()},
+            'max_event_time': self.max_event_time,
+            'closed_until': self.closed_until,
+            'open_panes': sorted(self.open_panes),
+            'late_events': self.late_events,
+        }
+
+    def load_checkpoint(self, data):
+        self.panes = {key: {int(start): pane for start, pane in key_panes.items()}
+                      for key, key_panes in data['panes'].items()}
+        self.max_event_time = data['max_event_time']
+        self.closed_until = data['closed_until']
+        self.open_panes = {tuple(p) for p in data['open_panes']}
+        self.late_events = data['late_events']
+
+class PriceWindowProcessor:
+    """Consumes commodity_prices into a PriceWindowStore and flushes it to the DW"""
+
+    def __init__(self, config, broker=None, time_basis='event'):
+        window_config = config.get('price_windows', {})
+        self.flush_interval = window_config.get('flush_interval_seconds', 10)
+        self.idle_exit_seconds = config.get('kafka', {}).get('consumer', {}).get('idle_exit_seconds', 5)
+        self.time_basis = time_basis
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.checkpoint_path = os.path.join(
+            script_dir, window_config.get('checkpoint_file', 'price_windows_checkpoint.json'))
+
+        self.store = PriceWindowStore(
+            window_config.get('tumbling_seconds', 3600),
+            window_config.get('sliding_seconds', 86400),
+            window_config.get('allowed_lateness_seconds', 3600),
+        )
+        self.offsets = {}
+        self.load_checkpoint()
+
+        conf = consumer_conf(config)
+        conf['group.id'] = window_config.get('group_id', 'agric-price-windows')
+        # Eager assignment: on_assign replaces the whole assignment with checkpointed offsets
+        conf['partition.assignment.strategy'] = 'range'
+        self.consumer = create_consumer(conf, broker)
+
+        db_config = config['database']
+        self.conn = psycopg2.connect(
+            host=db_config['host'],
+            port=db_config['port'],
+            database=db_config['database'],
+            user=db_config['user'],
+            password=db_config['password']
+        )
+        self.events = 0
+        self.rows_written = 0
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.store.load_checkpoint(data['store'])
+        self.offsets = data['offsets']
+        logger.info(f"Resumed from checkpoint: {len(self.store.panes):,} keys, "
+                    f"offsets {self.offsets}")
+
+    def write_checkpoint(self):
+        """Write state and offsets atomically"""
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'store': self.store.to_checkpoint(), 'offsets': self.offsets}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def on_assign(self, consumer, partitions):
+        for tp in partitions:
+            offset = self.offsets.get(f"{tp.topic}:{tp.partition}")
+            if offset is not None:
+                tp.offset = offset
+        consumer.assign(partitions)
+
+    def handle(self, msg):
+        if msg.error():
+            logger.error(f"Consumer error: {msg.error()}")
+            return
+        self.offsets[f"{msg.topic()}:{msg.partition()}"] = msg.offset() + 1
+        try:
+            event = decode_event(msg.value())
+        except ValueError as e:
+            logger.error(f"Undecodable message at {msg.topic()}[{msg.partition()}]@{msg.offset()}: {e}")
+            return
+        if event.get('type') != 'TransactionRecorded':
+            return
+        try:
+            payload = event['payload']
+            price = payload.get('unit_price')
+            quantity = payload.get('quantity_kg')
+            if not price or not quantity or price <= 0 or quantity <= 0:
+                return
+            event_time = to_epoch_seconds(event['event_time'] if self.time_basis == 'event' else event['timestamp'])
+            key = f"{payload['product_id']}|{payload['market_id']}"
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Malformed event at {msg.topic()}[{msg.partition()}]@{msg.offset()}: {e!r}")
+            return
+        self.store.add(key, event_time, price, quantity)
+        self.events += 1
+
+    def flush(self):
+        """Upsert window rows, then checkpoint state and offsets, then commit offsets"""
+        start = time.perf_counter()
+        rows = self.store.results()
+        cursor = self.conn.cursor()
+        try:
+            if rows:
+                execute_values(cursor, UPSERT_SQL, rows, page_size=1000)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        self.write_checkpoint()
+        self.consumer.commit(asynchronous=True)
+        self.rows_written += len(rows)
+        logger.info(f"Flushed {len(rows):,} window rows in {(time.perf_counter() - start) * 1000:,.0f} ms "
+                    f"({len(self.store.panes):,} keys in state, {self.store.late_events:,} late events dropped)")
+
+    def run(self, exit_when_idle=False):
+        self.consumer.subscribe([TOPIC], on_assign=self.on_assign)
+        logger.info(f"Aggregating {TOPIC} into dw.fact_price_window "
+                    f"(flush every {self.flush_interval}s, {self.time_basis} time)")
+
+        next_flush = time.perf_counter() + self.flush_interval
+        last_message_at = time.perf_counter()
+        try:
+            while True:
+                messages = self.consumer.consume(num_messages=1000, timeout=1.0)
+                for msg in messages:
+                    self.handle(msg)
+                now = time.perf_counter()
+                if messages:
+                    last_message_at = now
+                if now >= next_flush:
+                    self.flush()
+                    next_flush = now + self.flush_interval
+                if exit_when_idle and now - last_message_at >= self.idle_exit_seconds:
+                    logger.info("No new messages, stopping")
+                    break
+            self.flush()
+        except KeyboardInterrupt:
+            # Unflushed state is rebuilt from the checkpointed offsets on restart
+            logger.info("Interrupted")
+        finally:
+            self.consumer.close()
+            self.conn.close()
+
+        return {'events': self.events, 'rows_written': self.rows_written,
+                'late_events': self.store.late_events}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Aggregate commodity_prices into real-time price windows")
+    parser.add_argument('--time-basis', choices=['event', 'ingest'],
+                        help="Window on transaction time (event) or publish time (ingest, for unordered replays); "
+                             "defaults to ingest with --in-process, else event")
+    parser.add_argument('--in-process', action='store_true',
+                        help="Replay transactions.csv into the in-memory broker stand-in and aggregate it")
+    args = parser.parse_args()
+
+    # transactions.csv is not in event-time order, so event time would drop most replayed trades as late
+    time_basis = args.time_basis or ('ingest' if args.in_process else 'event')
+    broker = None
+    if args.in_process:
+        from replay_producer import run_replay
+        broker = InProcessBroker()
+        run_replay(['transactions.csv'], broker=broker)
+
+    processor = PriceWindowProcessor(load_config(), broker, time_basis=time_basis)
+    result = processor.run(exit_when_idle=args.in_process)
+
+    # Print summary
+    print("\n" + "=" * 80)
+    print("PRICE WINDOWS")
+    print("=" * 80)
+    print(f"Trades aggregated: {result['events']:,}")
+    print(f"Window rows written: {result['rows_written']:,}")
+    print(f"Late events dropped: {result['late_events']:,}")
+    print("=" * 80)
@@ -6,7 +6,7 @@ Requires: confluent-kafka
 import json
 import time
 import random
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
 
 # Setup logging
@@ -41,7 +41,7 @@ def main():
             # Create a mock event
             data = {
                 'event_id': f'EVT-{i}',
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
                 'type': 'HarvestRecorded',
                 'payload': {
                     'farmer_id': f'FMR{random.randint(100,200)}',
@@ -0,0 +1,174 @@
+"""
+Kafka Replay Producer
+Replays the generated CSV datasets (transactions, pricing, weather,
+harvests) onto the commodity_prices, weather_alerts and harvest_logs
+topics for load-testing the streaming path.
+
+Runs at a fixed rate (--rate msgs/s) or as fast as the producer allows
+(--rate 0). Batching, linger and compression come from the kafka.producer
+section of etl_config.yaml. Reports achieved msgs/s and bytes/s.
+Requires: confluent-kafka (or --in-process for the in-memory stand-in)
+"""
+import argparse
+import csv
+import itertools
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from event_stream import (
+    REPLAY_SOURCES, load_config, data_dir, build_event, encode_event,
+    producer_conf, create_producer
+)
+from inprocess_broker import InProcessBroker
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+REPORT_INTERVAL_SECONDS = 5
+
+class DeliveryStats:
+    """Counts delivery reports; called from producer.poll()/flush()"""
+
+    def __init__(self):
+        self.delivered = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def __call__(self, err, msg):
+        if err is not None:
+            self.failed += 1
+            if self.failed <= 10:
+                logger.error(f"Message delivery failed: {err}")
+        else:
+            self.delivered += 1
+            self.bytes += len(msg)
+
+def read_source(path, source):
+    """Yield (topic, key, event) for every row of one CSV file"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            yield build_event(source, row, datetime.now(timezone.utc).isoformat())
+
+def interleave(generators):
+    """Round-robin across the sources so every topic is loaded at once"""
+    for items in itertools.zip_longest(*generators):
+        for item in items:
+            if item is not None:
+                yield item
+
+def replay_events(files, loops):
+    """All events for the selected files, repeated loops times"""
+    for _ in range(loops):
+        generators = []
+        for name in files:
+            path = os.path.join(data_dir(), name)
+            if not os.path.exists(path):
+                logger.warning(f"File not found: {path}. Skipping.")
+                continue
+            generators.append(read_source(path, REPLAY_SOURCES[name]))
+        yield from interleave(generators)
+
+def run_replay(files, rate=0, limit=None, loops=1, broker=None):
+    """
+    Produce the replayed events and return throughput statistics.
+
+    Args:
+        files: CSV file names (keys of REPLAY_SOURCES)
+        rate: Target messages per second, 0 for as fast as possible
+        limit: Stop after this many messages
+        loops: Number of passes over the files
+        broker: InProcessBroker to produce into instead of Kafka
+    """
+    config = load_config()
+    conf = producer_conf(config)
+    producer = create_producer(conf, broker)
+    stats = DeliveryStats()
+
+    logger.info(f"Replaying {', '.join(files)} "
+                f"({'max rate' if not rate else f'{rate:,} msgs/s'}, "
+                f"linger.ms={conf['linger.ms']}, compression={conf['compression.type']})")
+
+    produced = 0
+    produced_bytes = 0
+    start = time.perf_counter()
+    next_report = start + REPORT_INTERVAL_SECONDS
+
+    try:
+        for topic, key, event in itertools.islice(replay_events(files, loops), limit):
+            value = encode_event(event)
+            while True:
+                try:
+                    producer.produce(topic, value=value, key=key, callback=stats)
+                    break
+                except BufferError:
+                    # Local queue full: serve delivery reports to make room
+                    producer.poll(0.1)
+            producer.poll(0)
+            produced += 1
+            produced_bytes += len(value)
+
+            now = time.perf_counter()
+            if rate:
+                # Sleep until this message's slot in the schedule
+                delay = start + produced / rate - now
+                if delay > 0:
+                    time.sleep(delay)
+            if now >= next_report:
+                elapsed = now - start
+                logger.info(f"  {produced:,} msgs, {produced / elapsed:,.0f} msgs/s, "
+                            f"{produced_bytes / elapsed / 1024 / 1024:,.2f} MB/s")
+                next_report = now + REPORT_INTERVAL_SECONDS
+    except KeyboardInterrupt:
+        logger.info("Interrupted, flushing...")
+    finally:
+        remaining = producer.flush(30)
+        if remaining:
+            logger.warning(f"{remaining} messages still undelivered after flush")
+
+    elapsed = time.perf_counter() - start
+    result = {
+        'produced': produced,
+        'delivered': stats.delivered,
+        'failed': stats.failed,
+        'bytes': produced_bytes,
+        'seconds': elapsed,
+        'msgs_per_second': produced / elapsed if elapsed else 0,
+        'bytes_per_second': produced_bytes / elapsed if elapsed else 0,
+    }
+
+    # Print summary
+    print("\n" + "=" * 80)
+    print("KAFKA REPLAY COMPLETE")
+    print("=" * 80)
+    print(f"Produced: {produced:,} (delivered {stats.delivered:,}, failed {stats.failed:,})")
+    print(f"Payload: {produced_bytes / 1024 / 1024:,.2f} MB in {elapsed:,.2f} s")
+    print(f"Throughput: {result['msgs_per_second']:,.0f} msgs/s, "
+          f"{result['bytes_per_second'] / 1024 / 1024:,.2f} MB/s")
+    print("=" * 80)
+
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay generated CSV data onto the Kafka topics")
+    parser.add_argument('--files', nargs='+', choices=list(REPLAY_SOURCES), default=list(REPLAY_SOURCES),
+                        help="CSV files to replay (default: all)")
+    parser.add_argument('--rate', type=int, default=0, help="Target msgs/s, 0 for as fast as possible")
+    parser.add_argument('--limit', type=int, default=None, help="Stop after this many messages")
+    parser.add_argument('--loops', type=int, default=1, help="Passes over the files")
+    parser.add_argument('--in-process', action='store_true',
+                        help="Produce into the in-memory broker stand-in instead of Kafka")
+    args = parser.parse_args()
+
+    run_replay(
+        files=args.files,
+        rate=args.rate,
+        limit=args.limit,
+        loops=args.loops,
+        broker=InProcessBroker() if args.in_process else None
+    )
@@ -0,0 +1,607 @@
+"""
+Kafka Staging Consumer
+Consumes the streaming topics in micro-batches and lands each batch in the
+matching staging.stg_* tables with one COPY per table.
+
+A batch closes when it reaches batch_max_messages or batch_max_seconds
+(kafka.consumer in etl_config.yaml). Offsets are committed only after the
+database commit, so delivery is at-least-once; rows are inserted with
+ON CONFLICT DO NOTHING on the staging primary keys, so redelivered events
+are dropped instead of duplicated. For more than one consumer process per
+group, run consumer_pool.py.
+
+Each row keeps its event's publish time in event_published_at, and
+publish->consume and publish->staging latency histograms per topic are
+written to kafka.latency.metrics_file after every batch.
+
+Undecodable events (including ones missing their type, payload or
+timestamp), events without a staging table and rows the database
+rejects (type or CHECK violations, isolated by bisecting the batch under
+savepoints) go to a dead-letter table or topic with the reason attached
+(kafka.dead_letter). Closed batches are written by a background
+thread; when max_in_flight_batches are waiting, or the smoothed write time
+is over write_latency_high_ms, the assigned partitions are paused until
+the writer catches up (kafka.backpressure). The consumer keeps
+polling while paused, so it stays in the group.
+Requires: confluent-kafka (or --in-process for the in-memory stand-in), psycopg2
+"""
+import argparse
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from event_stream import (
+    TOPICS, STAGING_TARGETS, REPLAY_SOURCES, load_config, decode_event,
+    producer_conf, create_producer, consumer_conf, create_consumer, topic_partition
+)
+from inprocess_broker import InProcessBroker
+from latency_metrics import LatencyRecorder, publish_time
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_SQL = """
+    INSERT INTO audit.streaming_dead_letter
+        (topic, partition_id, message_offset, message_key, message_value,
+         event_type, reason, error_message, consumer_name)
+    VALUES %s
+    ON CONFLICT (topic, partition_id, message_offset) DO NOTHING
+"""
+
+def dead_letter(msg, reason, error, event_type=None):
+    """Dead-letter record for msg; the raw value is kept so it can be replayed"""
+    return {
+        'topic': msg.topic(),
+        'partition': msg.partition(),
+        'offset': msg.offset(),
+        'key': msg.key(),
+        'value': msg.value(),
+        'event_type': event_type,
+        'reason': reason,
+        'error': error,
+    }
+
+def check_envelope(event):
+    """
+    Publish time of a decoded event; ValueError unless it has the type,
+    payload and timestamp that every staging row is built from.
+    """
+    if not isinstance(event, dict) or not isinstance(event.get('type'), str):
+        raise ValueError("event has no type")
+    if not isinstance(event.get('payload'), dict):
+        raise ValueError("event has no payload object")
+    if event.get('timestamp') is None:
+        raise ValueError("event has no timestamp")
+    try:
+        return publish_time(event)
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        raise ValueError(f"bad event timestamp {event.get('timestamp')!r}: {e}") from e
+
+class MicroBatch:
+    """
+    Decoded rows grouped by event type (with their source messages), dead
+    letters, and the next offset per partition.
+    """
+
+    def __init__(self):
+        self.rows = defaultdict(list)
+        self.sources = defaultdict(list)
+        self.dead_letters = []
+        self.offsets = {}
+        self.messages = 0
+        self.bytes = 0
+        self.opened_at = None
+        self.published = []
+
+    def add(self, msg, event, published_at):
+        if self.opened_at is None:
+            self.opened_at = time.perf_counter()
+        target = STAGING_TARGETS[event['type']]
+        payload = event['payload']
+        row = [payload.get(col) for col in target['columns']]
+        row.append(event['timestamp'])
+        self.rows[event['type']].append(row)
+        self.sources[event['type']].append(msg)
+        self.published.append((msg.topic(), published_at))
+        self.skip(msg)
+
+    def reject(self, msg, reason, error, event_type=None):
+        self.dead_letters.append(dead_letter(msg, reason, error, event_type))
+        self.skip(msg)
+
+    def skip(self, msg):
+        """Account for a message that produces no row (its offset still advances)"""
+        if self.opened_at is None:
+            self.opened_at = time.perf_counter()
+        self.offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
+        self.messages += 1
+        self.bytes += len(msg.value() or b'')
+
+    def age(self):
+        return time.perf_counter() - self.opened_at if self.opened_at else 0
+
+class StagingWriter:
+    """
+    Writes micro-batches to staging through per-table temp tables and COPY.
+    With store_dead_letters, dead letters go to audit.streaming_dead_letter
+    in the same transaction as the batch.
+    """
+
+    def __init__(self, db_config, store_dead_letters=True, name='consumer'):
+        self.conn = psycopg2.connect(
+            host=db_config['host'],
+            port=db_config['port'],
+            database=db_config['database'],
+            user=db_config['user'],
+            password=db_config['password']
+        )
+        self.conn.autocommit = False
+        self.temp_tables = set()
+        self.store_dead_letters = store_dead_letters
+        self.name = name
+
+    def temp_table(self, cursor, table):
+        temp = 'tmp_' + table.split('.')[-1]
+        if temp not in self.temp_tables:
+            cursor.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS {temp}
+                (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+            """)
+            self.temp_tables.add(temp)
+        return temp
+
+    def land(self, cursor, event_type, rows, sources, rejected):
+        """
+        COPY rows into staging under a savepoint. If the database rejects
+        them, retry each half; a single rejected row becomes a dead letter.
+        Returns (copied, inserted).
+        """
+        target = STAGING_TARGETS[event_type]
+        table = target['table']
+        columns = ', '.join(target['columns'] + ('event_published_at',))
+        temp = self.temp_table(cursor, table)
+
+        cursor.execute("SAVEPOINT land_rows")
+        try:
+            buf = io.StringIO()
+            csv.writer(buf).writerows(rows)
+            buf.seek(0)
+            cursor.copy_expert(f"COPY {temp} ({columns}) FROM STDIN WITH CSV", buf)
+
+            cursor.execute(f"""
+                INSERT INTO {table} ({columns})
+                SELECT {columns} FROM {temp}
+                ON CONFLICT DO NOTHING
+            """)
+            inserted = cursor.rowcount
+            # Empty the temp table for the next COPY in this transaction
+            cursor.execute(f"TRUNCATE {temp}")
+            cursor.execute("RELEASE SAVEPOINT land_rows")
+            return len(rows), inserted
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT land_rows")
+            cursor.execute("RELEASE SAVEPOINT land_rows")
+            if len(rows) == 1:
+                rejected.append(dead_letter(sources[0], 'rejected', str(e).strip().splitlines()[0],
+                                            event_type))
+                return 0, 0
+            mid = len(rows) // 2
+            first = self.land(cursor, event_type, rows[:mid], sources[:mid], rejected)
+            second = self.land(cursor, event_type, rows[mid:], sources[mid:], rejected)
+            return first[0] + second[0], first[1] + second[1]
+
+    def write(self, batch):
+        """
+        Land every table's rows and commit once. Returns ({table: (copied,
+        inserted)}, rows rejected by the database as dead letters).
+        """
+        cursor = self.conn.cursor()
+        counts = {}
+        rejected = []
+        try:
+            for event_type, rows in batch.rows.items():
+                counts[STAGING_TARGETS[event_type]['table']] = self.land(
+                    cursor, event_type, rows, batch.sources[event_type], rejected)
+            dead_letters = batch.dead_letters + rejected
+            if self.store_dead_letters and dead_letters:
+                execute_values(cursor, DEAD_LETTER_SQL, [
+                    (d['topic'], d['partition'], d['offset'],
+                     d['key'].decode('utf-8', 'replace') if d['key'] is not None else None,
+                     psycopg2.Binary(d['value']) if d['value'] is not None else None,
+                     d['event_type'], d['reason'], d['error'], self.name)
+                    for d in dead_letters
+                ], page_size=1000)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return counts, rejected
+
+    def close(self):
+        self.conn.close()
+
+class ConsumerMetrics:
+    """Per-batch and cumulative ingest metrics"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.batches = 0
+        self.messages = 0
+        self.bytes = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.dead_letters = 0
+        self.write_ms = []
+        self.pauses = 0
+        self.paused_seconds = 0.0
+
+    def record(self, batch, counts, write_ms, dead_letters):
+        copied = sum(c for c, _ in counts.values())
+        inserted = sum(i for _, i in counts.values())
+        self.batches += 1
+        self.messages += batch.messages
+        self.bytes += batch.bytes
+        self.inserted += inserted
+        self.duplicates += copied - inserted
+        self.dead_letters += dead_letters
+        self.write_ms.append(write_ms)
+
+        # Age at commit: fill time, wait for the writer, and write time
+        batch_seconds = batch.age()
+        logger.info(
+            f"Batch {self.batches}: {batch.messages:,} msgs, {inserted:,} new rows, "
+            f"{copied - inserted:,} duplicates, {dead_letters:,} dead letters, "
+            f"age {batch_seconds * 1000:,.0f} ms, write {write_ms:,.0f} ms"
+        )
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        write_ms = sorted(self.write_ms)
+        return {
+            'batches': self.batches,
+            'messages': self.messages,
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'dead_letters': self.dead_letters,
+            'pauses': self.pauses,
+            'paused_seconds': self.paused_seconds,
+            'seconds': elapsed,
+            'msgs_per_second': self.messages / elapsed if elapsed else 0,
+            'bytes_per_second': self.bytes / elapsed if elapsed else 0,
+            'write_ms_avg': sum(write_ms) / len(write_ms) if write_ms else 0,
+            'write_ms_max': write_ms[-1] if write_ms else 0,
+        }
+
+def commit_offsets(consumer, batch, broker):
+    """Commit the batch's next offsets synchronously, after the DB commit"""
+    offsets = [topic_partition(broker, topic, partition, offset)
+               for (topic, partition), offset in batch.offsets.items()]
+    consumer.commit(offsets=offsets, asynchronous=False)
+
+class StagingConsumer:
+    """
+    One group member: consumes its assigned partitions into staging.
+    Several can run in the same group (see consumer_pool.py); on a
+    rebalance the open and in-flight batches are written and committed
+    before partitions are revoked, so the next owner starts exactly after
+    them.
+    """
+
+    def __init__(self, config, topics=TOPICS, broker=None, name='consumer'):
+        consumer_config = config.get('kafka', {}).get('consumer', {})
+        self.batch_max_messages = consumer_config.get('batch_max_messages', 5000)
+        self.batch_max_seconds = consumer_config.get('batch_max_seconds', 2.0)
+        self.idle_exit_seconds = consumer_config.get('idle_exit_seconds', 5)
+        self.topics = topics
+        self.broker = broker
+        self.name = name
+
+        dead_letter_config = config.get('kafka', {}).get('dead_letter', {})
+        self.dead_letter_topic = None
+        self.dead_letter_producer = None
+        if dead_letter_config.get('target', 'table') == 'topic':
+            self.dead_letter_topic = dead_letter_config.get('topic', 'streaming_dead_letter')
+            self.dead_letter_producer = create_producer(producer_conf(config), broker)
+
+        backpressure_config = config.get('kafka', {}).get('backpressure', {})
+        self.max_in_flight = backpressure_config.get('max_in_flight_batches', 2)
+        self.write_latency_high_ms = backpressure_config.get('write_latency_high_ms', 5000)
+        self.write_latency_low_ms = backpressure_config.get('write_latency_low_ms', 2000)
+
+        self.consumer = create_consumer(consumer_conf(config), broker)
+        self.writer = StagingWriter(config['database'], store_dead_letters=self.dead_letter_topic is None,
+                                    name=name)
+        self.metrics = ConsumerMetrics()
+        self.batch = MicroBatch()
+        self.partition_messages = defaultdict(int)
+
+        # Closed batches go to the writer thread; results come back in order
+        self.pending = queue.Queue()
+        self.completed = queue.Queue()
+        self.in_flight = 0
+        self.write_thread = None
+        self.write_ms_avg = None
+        self.slow_writes = False
+        self.paused = False
+        self.paused_at = None
+
+        # One latency file per consumer, e.g. latency_metrics.worker-0.json
+        latency_file = config.get('kafka', {}).get('latency', {}).get('metrics_file', 'latency_metrics.json')
+        root, ext = os.path.splitext(latency_file)
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.latency = LatencyRecorder(os.path.join(script_dir, f"{root}.{name}{ext}"))
+
+    def on_assign(self, consumer, partitions):
+        logger.info(f"[{self.name}] Assigned: {', '.join(f'{tp.topic}[{tp.partition}]' for tp in partitions)}")
+        if self.paused:
+            consumer.pause(partitions)
+
+    def on_revoke(self, consumer, partitions):
+        logger.info(f"[{self.name}] Revoked: {', '.join(f'{tp.topic}[{tp.partition}]' for tp in partitions)}")
+        self.flush()
+        for tp in partitions:
+            self.partition_messages.pop((tp.topic, tp.partition), None)
+
+    def write_loop(self):
+        """Writer thread: write closed batches in order"""
+        while True:
+            batch = self.pending.get()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            try:
+                counts, rejected = self.writer.write(batch)
+                error = None
+            except Exception as e:
+                counts, rejected, error = None, None, e
+            self.completed.put((batch, counts, rejected, (time.perf_counter() - start) * 1000, error))
+
+    def submit(self):
+        """Hand the open batch to the writer thread"""
+        if not self.batch.messages:
+            return
+        if self.write_thread is None:
+            self.write_thread = threading.Thread(target=self.write_loop, name=f"{self.name}-writer",
+                                                 daemon=True)
+            self.write_thread.start()
+        self.pending.put(self.batch)
+        self.in_flight += 1
+        self.batch = MicroBatch()
+        self.apply_backpressure()
+
+    def collect(self, timeout=0):
+        """
+        Finish written batches: dead letters to the topic, offset commit,
+        metrics. Waits up to timeout for the first one.
+        """
+        while self.in_flight:
+            try:
+                batch, counts, rejected, write_ms, error = self.completed.get(timeout=timeout) \
+                    if timeout else self.completed.get_nowait()
+            except queue.Empty:
+                return
+            timeout = 0
+            self.in_flight -= 1
+            if error is not None:
+                # Offsets stay uncommitted; this and later batches are redelivered
+                raise error
+
+            dead_letters = batch.dead_letters + rejected
+            if self.dead_letter_producer is not None and dead_letters:
+                self.publish_dead_letters(dead_letters)
+            commit_offsets(self.consumer, batch, self.broker)
+            self.metrics.record(batch, counts, write_ms, len(dead_letters))
+            # Publish -> staging commit
+            committed_at = time.time()
+            for topic, published_at in batch.published:
+                self.latency.record(topic, 'staging', (committed_at - published_at) * 1000)
+            self.latency.publish()
+
+            # Smoothed write time, with hysteresis between the high and low marks
+            self.write_ms_avg = write_ms if self.write_ms_avg is None else \
+                0.3 * write_ms + 0.7 * self.write_ms_avg
+            if self.write_ms_avg > self.write_latency_high_ms:
+                self.slow_writes = True
+            elif self.write_ms_avg < self.write_latency_low_ms:
+                self.slow_writes = False
+            self.apply_backpressure()
+
+    def flush(self):
+        """Write the open batch and wait until every batch is committed"""
+        self.submit()
+        while self.in_flight:
+            self.collect(timeout=1.0)
+
+    def publish_dead_letters(self, dead_letters):
+        """Produce dead letters with their reason and source in headers, before the offset commit"""
+        for d in dead_letters:
+            self.dead_letter_producer.produce(
+                self.dead_letter_topic, value=d['value'], key=d['key'],
+                headers=[
+                    ('dlq.reason', d['reason'].encode('utf-8')),
+                    ('dlq.error', (d['error'] or '').encode('utf-8')),
+                    ('dlq.event_type', (d['event_type'] or '').encode('utf-8')),
+                    ('dlq.source', f"{d['topic']}[{d['partition']}]@{d['offset']}".encode('utf-8')),
+                    ('dlq.consumer', self.name.encode('utf-8')),
+                ]
+            )
+        remaining = self.dead_letter_producer.flush(30)
+        if remaining:
+            raise RuntimeError(f"{remaining} dead letters not delivered to {self.dead_letter_topic}")
+
+    def apply_backpressure(self):
+        """
+        Pause the assignment while max_in_flight batches are waiting (or any
+        batch is, while writes are slow); resume once the writer catches up.
+        """
+        should_pause = self.in_flight >= self.max_in_flight or (self.slow_writes and self.in_flight > 0)
+        if should_pause and not self.paused:
+            self.consumer.pause(self.consumer.assignment())
+            self.paused = True
+            self.paused_at = time.perf_counter()
+            self.metrics.pauses += 1
+            logger.warning(f"[{self.name}] Pausing partitions: {self.in_flight} batches in flight, "
+                           f"write avg {self.write_ms_avg or 0:,.0f} ms")
+        elif not should_pause and self.paused:
+            self.consumer.resume(self.consumer.assignment())
+            self.paused = False
+            paused_seconds = time.perf_counter() - self.paused_at
+            self.metrics.paused_seconds += paused_seconds
+            logger.info(f"[{self.name}] Resuming partitions after {paused_seconds:,.1f}s")
+
+    def handle(self, msg):
+        if msg.error():
+            logger.error(f"Consumer error: {msg.error()}")
+            return
+        self.partition_messages[(msg.topic(), msg.partition())] += 1
+        try:
+            event = decode_event(msg.value())
+            published_at = check_envelope(event)
+        except ValueError as e:
+            logger.error(f"Undecodable message at {msg.topic()}[{msg.partition()}]@{msg.offset()}: {e}")
+            self.batch.reject(msg, 'undecodable', str(e))
+            return
+        if event.get('type') not in STAGING_TARGETS:
+            logger.warning(f"No staging table for event type {event.get('type')!r}, dead-lettering")
+            self.batch.reject(msg, 'unknown_event_type', f"no staging table for {event.get('type')!r}",
+                              event.get('type'))
+            return
+        # Publish -> consume
+        self.latency.record(msg.topic(), 'consume', (time.time() - published_at) * 1000)
+        self.batch.add(msg, event, published_at)
+
+    def partition_stats(self):
+        """
+        Consumed count, committed offset, high watermark and lag for every
+        assigned partition.
+        """
+        assignment = self.consumer.assignment()
+        positions = {(tp.topic, tp.partition): tp.offset for tp in self.consumer.position(assignment)}
+        stats = {}
+        for tp in assignment:
+            tp_key = (tp.topic, tp.partition)
+            _, high = self.consumer.get_watermark_offsets(tp, timeout=1.0)
+            position = positions.get(tp_key, -1)
+            stats[f"{tp.topic}[{tp.partition}]"] = {
+                'consumed': self.partition_messages.get(tp_key, 0),
+                'position': position,
+                'high_watermark': high,
+                'lag': high - position if position >= 0 else None,
+                'paused': self.paused,
+            }
+        return stats
+
+    def run(self, exit_when_idle=False, stop_event=None, report=None, report_interval=10):
+        """
+        Consume until interrupted, stop_event is set, or (exit_when_idle) no
+        messages arrive for idle_exit_seconds. report, if given, is called
+        with partition_stats() every report_interval seconds.
+        """
+        self.consumer.subscribe(self.topics, on_assign=self.on_assign, on_revoke=self.on_revoke)
+        logger.info(f"[{self.name}] Consuming {', '.join(self.topics)} into staging "
+                    f"(batches of {self.batch_max_messages:,} msgs / {self.batch_max_seconds}s, "
+                    f"up to {self.max_in_flight} in flight)")
+
+        last_message_at = time.perf_counter()
+        next_report = time.perf_counter() + report_interval
+
+        try:
+            while stop_event is None or not stop_event.is_set():
+                # While paused, wait on the writer instead of the broker
+                self.collect(timeout=0.1 if self.paused else 0)
+
+                batch = self.batch
+                remaining = self.batch_max_messages - batch.messages
+                if self.paused:
+                    # Still poll: keeps group membership and serves rebalance callbacks
+                    timeout = 0
+                elif batch.messages:
+                    timeout = max(self.batch_max_seconds - batch.age(), 0.05)
+                else:
+                    timeout = 1.0
+                messages = self.consumer.consume(num_messages=remaining, timeout=timeout)
+
+                for msg in messages:
+                    self.handle(msg)
+
+                now = time.perf_counter()
+                if messages:
+                    last_message_at = now
+
+                if self.batch.messages and (self.batch.messages >= self.batch_max_messages or
+                                            self.batch.age() >= self.batch_max_seconds):
+                    self.submit()
+                elif exit_when_idle and not self.batch.messages and not self.in_flight and \
+                        now - last_message_at >= self.idle_exit_seconds:
+                    logger.info(f"[{self.name}] No new messages, stopping")
+                    break
+
+                if report and now >= next_report:
+                    report(self.partition_stats())
+                    next_report = now + report_interval
+
+            # Clean stop: land what is buffered before leaving the group
+            self.flush()
+        except KeyboardInterrupt:
+            # Uncommitted batches are dropped; their offsets were not committed, so they are redelivered
+            logger.info(f"[{self.name}] Interrupted")
+        finally:
+            if self.write_thread is not None:
+                self.pending.put(None)
+                self.write_thread.join(timeout=30)
+            if self.paused:
+                self.metrics.paused_seconds += time.perf_counter() - self.paused_at
+            self.consumer.close()
+            self.writer.close()
+
+        return self.metrics.summary()
+
+
+def run_consumer(topics=TOPICS, broker=None, exit_when_idle=False):
+    """Consume topics into staging with a single consumer and print a summary"""
+    config = load_config()
+    result = StagingConsumer(config, topics, broker).run(exit_when_idle=exit_when_idle)
+
+    # Print summary
+    print("\n" + "=" * 80)
+    print("KAFKA STAGING CONSUMER")
+    print("=" * 80)
+    print(f"Batches: {result['batches']:,}")
+    print(f"Messages: {result['messages']:,} ({result['inserted']:,} new rows, "
+          f"{result['duplicates']:,} duplicates, {result['dead_letters']:,} dead letters)")
+    print(f"Throughput: {result['msgs_per_second']:,.0f} msgs/s, "
+          f"{result['bytes_per_second'] / 1024 / 1024:,.2f} MB/s")
+    print(f"DB write per batch: avg {result['write_ms_avg']:,.0f} ms, max {result['write_ms_max']:,.0f} ms")
+    print(f"Backpressure: {result['pauses']:,} pauses, {result['paused_seconds']:,.1f}s paused")
+    print("=" * 80)
+
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Land streaming events in the staging tables")
+    parser.add_argument('--topics', nargs='+', choices=TOPICS, default=TOPICS)
+    parser.add_argument('--in-process', action='store_true',
+                        help="Replay the CSVs into the in-memory broker stand-in and consume them")
+    args = parser.parse_args()
+
+    broker = None
+    if args.in_process:
+        from replay_producer import run_replay
+        broker = InProcessBroker()
+        run_replay(list(REPLAY_SOURCES), broker=broker)
+
+    run_consumer(topics=args.topics, broker=broker, exit_when_idle=args.in_process)
@@ -1,10 +1,26 @@
 """
 Export Power BI Dataset
-Generates denormalized CSV file for Power BI with ≥1,000 rows
+Generates denormalized CSV files for Power BI with ≥1,000 rows
+Rows are streamed from a server-side cursor in fixed-size chunks,
+so memory use does not grow with the size of fact_transaction.
+
+Exports are incremental: only transactions above the watermark stored in
+manifest.json are written, into year/month partition files. The manifest
+lists every partition file so the report refresh can pick up new ones.
+
+The export is sharded by date_key month: a pool of worker processes each
+opens its own connection and writes one month's partition file, so
+multi-year histories are scanned in parallel. Every shard is recorded in
+the manifest with its row count and SHA-256 checksum.
 """
 
 import psycopg2
-import pandas as pd
+import argparse
+import csv
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 import yaml
 import logging
@@ -12,37 +28,15 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def load_config():
-    """Load database configuration"""
-    with open('../etl/etl_config.yaml', 'r') as f:
-        return yaml.safe_load(f)
-
-def export_powerbi_dataset():
-    """
-    Export denormalized dataset for Power BI
-    Combines fact_transaction with all dimensions
-    """
-    logger.info("Starting Power BI dataset export...")
-    
-    config = load_config()
-    
-    # Connect to database
-    conn = psycopg2.connect(
-        host=config['database']['host'],
-        port=config['database']['port'],
-        database=config['database']['database'],
-        user=config['database']['user'],
-        password=config['database']['password']
-    )
-    
-    # SQL query to create denormalized dataset
-    query = """
+# SQL query to create denormalized dataset
+EXPORT_QUERY = """
     SELECT 
         -- Transaction Details
+        ft.transaction_key,
         ft.transaction_id,
         ft.transaction_timestamp,
         ft.payment_status,
-        ft.blockchain_hash,
+        encode(ft.blockchain_hash, 'hex') as blockchain_hash,
         
         -- Date Dimensions
         dd.full_date as transaction_date,
@@ -105,7 +99,10 @@ def export_powerbi_dataset():
         ft.total_amount,
         ft.payment_fee,
         ft.net_amount,
-        ft.transaction_count
+        ft.transaction_count,
+        
+        -- Load Metadata
+        ft.created_at as dw_created_at
         
     FROM dw.fact_transaction ft
     JOIN dw.dim_date dd ON ft.date_key = dd.date_key
@@ -115,37 +112,316 @@ def export_powerbi_dataset():
     JOIN dw.dim_buyer db ON ft.buyer_key = db.buyer_key
     JOIN dw.dim_payment_method dpm ON ft.payment_key = dpm.payment_key
     JOIN dw.dim_quality dq ON ft.quality_key = dq.quality_key
-    ORDER BY ft.transaction_timestamp DESC
+    WHERE ft.transaction_key > %(last_transaction_key)s
+      AND ft.transaction_key <= %(max_transaction_key)s
+      AND ft.date_key BETWEEN %(start_date_key)s AND %(end_date_key)s
+    ORDER BY ft.transaction_key
+"""
+
+def load_config():
+    """Load database configuration"""
+    with open('../etl/etl_config.yaml', 'r') as f:
+        return yaml.safe_load(f)
+
+def new_summary():
+    """Running summary statistics, updated chunk by chunk"""
+    return {
+        'rows': 0,
+        'total_revenue': 0,
+        'min_date': None,
+        'max_date': None,
+        'farmers': set(),
+        'products': set(),
+        'markets': set(),
+    }
+
+def update_summary(summary, rows, columns):
+    """Fold one chunk of rows into the summary (bounded by dimension sizes, not fact size)"""
+    idx = {name: i for i, name in enumerate(columns)}
+    for row in rows:
+        summary['rows'] += 1
+        summary['total_revenue'] += row[idx['total_amount']]
+        txn_date = row[idx['transaction_date']]
+        if summary['min_date'] is None or txn_date < summary['min_date']:
+            summary['min_date'] = txn_date
+        if summary['max_date'] is None or txn_date > summary['max_date']:
+            summary['max_date'] = txn_date
+        summary['farmers'].add(row[idx['farmer_id']])
+        summary['products'].add(row[idx['product_id']])
+        summary['markets'].add(row[idx['market_id']])
+
+def stream_query(conn, query, chunk_size, params=None, cursor_name='powerbi_export'):
+    """
+    Run query on a named (server-side) cursor and yield (columns, rows)
+    chunk_size rows at a time.
     """
+    with conn.cursor(name=cursor_name) as cursor:
+        cursor.itersize = chunk_size
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            # Column names are only known after the first fetch on a named cursor
+            yield [col[0] for col in cursor.description], rows
+
+def month_shards(start_date_key, end_date_key):
+    """
+    Split [start_date_key, end_date_key] into calendar-month shards.
+    Each shard is one (year, month) partition and one worker task.
+    """
+    year, month = divmod(start_date_key // 100, 100)
+    end_year, end_month = divmod(end_date_key // 100, 100)
+    shards = []
+    while (year, month) <= (end_year, end_month):
+        shards.append({
+            'year': year,
+            'month': month,
+            'start_date_key': year * 10000 + month * 100 + 1,
+            'end_date_key': year * 10000 + month * 100 + 31,
+        })
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return shards
+
+def partition_path(year, month, run_id):
+    return f"year={year}/month={month:02d}/part-{run_id}.csv"
+
+def file_sha256(path, block_size=1024 * 1024):
+    """SHA-256 of a shard file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def export_shard(db_config, shard, params, output_dir, run_id, chunk_size):
+    """
+    Worker: export one date_key range on its own connection into its own
+    partition file. Returns the shard's manifest entry and summary, or None
+    if the range had no new rows.
+    """
+    path = partition_path(shard['year'], shard['month'], run_id)
+    full_path = os.path.join(output_dir, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    
+    conn = psycopg2.connect(
+        host=db_config['host'],
+        port=db_config['port'],
+        database=db_config['database'],
+        user=db_config['user'],
+        password=db_config['password']
+    )
+    
+    summary = new_summary()
+    columns = None
+    shard_params = dict(params,
+                        start_date_key=shard['start_date_key'],
+                        end_date_key=shard['end_date_key'])
+    try:
+        with open(full_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            for columns, rows in stream_query(conn, EXPORT_QUERY, chunk_size, shard_params):
+                if summary['rows'] == 0:
+                    writer.writerow(columns)
+                writer.writerows(rows)
+                update_summary(summary, rows, columns)
+    finally:
+        conn.close()
+    
+    if summary['rows'] == 0:
+        os.remove(full_path)
+        return None
+    
+    return {
+        'year': shard['year'],
+        'month': shard['month'],
+        'path': path,
+        'rows': summary['rows'],
+        'bytes': os.path.getsize(full_path),
+        'sha256': file_sha256(full_path),
+        'columns': columns,
+        'summary': summary,
+    }
+
+def merge_summary(total, part):
+    """Fold a shard summary into the run summary"""
+    total['rows'] += part['rows']
+    total['total_revenue'] += part['total_revenue']
+    for bound, pick in (('min_date', min), ('max_date', max)):
+        if part[bound] is not None:
+            total[bound] = part[bound] if total[bound] is None else pick(total[bound], part[bound])
+    for key in ('farmers', 'products', 'markets'):
+        total[key] |= part[key]
+
+def plan_export(conn, last_key):
+    """
+    Fix the upper transaction_key for this run and the date_key span of the
+    new rows, so every shard exports the same set of transactions.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT MAX(transaction_key), MAX(created_at), MIN(date_key), MAX(date_key)
+        FROM dw.fact_transaction
+        WHERE transaction_key > %s
+    """, (last_key,))
+    max_key, max_created_at, min_date_key, max_date_key = cursor.fetchone()
+    cursor.close()
+    if max_key is None:
+        return None, None, []
+    return max_key, max_created_at, month_shards(min_date_key, max_date_key)
+
+def read_manifest(manifest_path):
+    """Load the export manifest, or an empty one on first run"""
+    if not os.path.exists(manifest_path):
+        return {
+            'dataset': 'powerbi_transactions',
+            'watermark': {'transaction_key': 0, 'created_at': None},
+            'partitions': {},
+            'runs': [],
+        }
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_manifest(manifest, manifest_path):
+    """Write the manifest atomically so a refresh never sees a partial file"""
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(tmp_path, manifest_path)
+
+def export_powerbi_dataset(full_refresh=False):
+    """
+    Export denormalized dataset for Power BI
+    Combines fact_transaction with all dimensions
     
-    logger.info("Executing query...")
-    df = pd.read_sql_query(query, conn)
+    Args:
+        full_refresh: Discard the existing export and re-export all history
+    """
+    logger.info("Starting Power BI dataset export...")
     
-    # Close connection
-    conn.close()
+    config = load_config()
+    powerbi_config = config.get('powerbi', {})
+    chunk_size = powerbi_config.get('chunk_size', 10000)
+    workers = powerbi_config.get('workers', os.cpu_count() or 1)
+    output_dir = powerbi_config.get('output_dir', '../../powerbi/export')
+    manifest_path = os.path.join(output_dir, 'manifest.json')
     
-    logger.info(f"Retrieved {len(df)} rows")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = read_manifest(manifest_path)
     
-    # Save to CSV
-    output_path = '../../powerbi/powerbi_dataset.csv'
-    df.to_csv(output_path, index=False)
+    if full_refresh:
+        # Remove only the files this export created, then start from an empty manifest
+        logger.info("Full refresh: removing previously exported partition files")
+        for partition in manifest['partitions'].values():
+            for part in partition['files']:
+                part_path = os.path.join(output_dir, part['path'])
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        manifest = read_manifest(manifest_path)
     
-    logger.info(f"Saved to {output_path}")
+    last_key = manifest['watermark']['transaction_key']
+    run_id = datetime.now().strftime('%Y%m%dT%H%M%S')
+    logger.info(f"Exporting transactions with transaction_key > {last_key}")
+    
+    # Connect to database
+    conn = psycopg2.connect(
+        host=config['database']['host'],
+        port=config['database']['port'],
+        database=config['database']['database'],
+        user=config['database']['user'],
+        password=config['database']['password']
+    )
+    try:
+        max_key, max_created_at, shards = plan_export(conn, last_key)
+    finally:
+        conn.close()
+    
+    summary = new_summary()
+    watermark = dict(manifest['watermark'])
+    results = []
+    
+    if shards:
+        params = {'last_transaction_key': last_key, 'max_transaction_key': max_key}
+        logger.info(f"Exporting {len(shards)} month shards with {workers} workers...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(export_shard, config['database'], shard, params,
+                            output_dir, run_id, chunk_size): shard
+                for shard in shards
+            }
+            for future in as_completed(futures):
+                shard = futures[future]
+                result = future.result()
+                if result is None:
+                    continue
+                results.append(result)
+                merge_summary(summary, result.pop('summary'))
+                manifest['columns'] = result.pop('columns')
+                logger.info(f"  {shard['year']}-{shard['month']:02d}: "
+                            f"{result['rows']:,} rows ({summary['rows']:,} total)")
+        watermark = {'transaction_key': max_key, 'created_at': max_created_at}
+    
+    # Register new partition files, then advance the watermark
+    new_files = []
+    for result in sorted(results, key=lambda r: (r['year'], r['month'])):
+        key = f"{result['year']}-{result['month']:02d}"
+        partition = manifest['partitions'].setdefault(
+            key, {'year': result['year'], 'month': result['month'], 'rows': 0, 'files': []}
+        )
+        partition['files'].append({
+            'path': result['path'],
+            'rows': result['rows'],
+            'bytes': result['bytes'],
+            'sha256': result['sha256'],
+            'run_id': run_id,
+        })
+        partition['rows'] += result['rows']
+        new_files.append(result['path'])
+    
+    manifest['watermark'] = watermark
+    manifest['runs'].append({
+        'run_id': run_id,
+        'exported_at': datetime.now().isoformat(),
+        'from_transaction_key': last_key,
+        'to_transaction_key': watermark['transaction_key'],
+        'rows': summary['rows'],
+        'workers': workers,
+        'files': new_files,
+    })
+    write_manifest(manifest, manifest_path)
+    
+    logger.info(f"Saved to {output_dir}")
     
     # Print summary
     print("\n" + "="*80)
     print("POWER BI DATASET EXPORT COMPLETE")
     print("="*80)
-    print(f"Total Rows: {len(df):,}")
-    print(f"Total Revenue: UGX {df['total_amount'].sum():,.0f}")
-    print(f"Date Range: {df['transaction_date'].min()} to {df['transaction_date'].max()}")
-    print(f"Unique Farmers: {df['farmer_id'].nunique():,}")
-    print(f"Unique Products: {df['product_id'].nunique():,}")
-    print(f"Unique Markets: {df['market_id'].nunique():,}")
-    print(f"\nFile saved: {output_path}")
+    print(f"New Rows: {summary['rows']:,}")
+    if summary['rows']:
+        print(f"Total Revenue: UGX {summary['total_revenue']:,.0f}")
+        print(f"Date Range: {summary['min_date']} to {summary['max_date']}")
+        print(f"Unique Farmers: {len(summary['farmers']):,}")
+        print(f"Unique Products: {len(summary['products']):,}")
+        print(f"Unique Markets: {len(summary['markets']):,}")
+    print(f"Shards Written: {len(new_files)} ({workers} workers)")
+    print(f"Watermark: transaction_key {watermark['transaction_key']}")
+    print(f"\nManifest: {manifest_path}")
     print("="*80)
     
-    return df
+    return summary
 
 if __name__ == "__main__":
-    export_powerbi_dataset()
+    parser = argparse.ArgumentParser(description="Export the Power BI transaction dataset")
+    parser.add_argument('--full-refresh', action='store_true',
+                        help="Discard the existing export and re-export all history")
+    parser.add_argument('--mode', choices=['denormalized', 'star'], default='denormalized',
+                        help="denormalized: partitioned wide CSV; star: dimension and fact Parquet files")
+    args = parser.parse_args()
+    
+    if args.mode == 'star':
+        from export_star_schema import export_star_schema
+        export_star_schema()
+    else:
+        export_powerbi_dataset(full_refresh=args.full_refresh)
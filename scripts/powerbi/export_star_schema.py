@@ -0,0 +1,204 @@
+"""
+Export Power BI Star Schema
+Writes each dw dimension once and the fact tables with surrogate keys only,
+as typed, compressed Parquet files, plus a model.json describing the
+dimension -> fact relationships (dashboard_specifications.md section 1.3).
+
+Much smaller than the denormalized CSV, which repeats every dimension
+attribute on every transaction row.
+Requires: pyarrow
+"""
+
+import os
+import json
+import logging
+from datetime import datetime
+
+import psycopg2
+
+from export_powerbi_data import load_config, stream_query
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+DIMENSION_TABLES = [
+    'dim_date',
+    'dim_farmer',
+    'dim_product',
+    'dim_market',
+    'dim_buyer',
+    'dim_location',
+    'dim_payment_method',
+    'dim_quality',
+]
+
+FACT_TABLES = [
+    'fact_transaction',
+    'fact_harvest',
+    'fact_pricing',
+]
+
+COMPRESSION = 'zstd'
+
+def arrow_type(data_type, precision, scale):
+    """Map an information_schema column type to an Arrow type"""
+    if data_type == 'integer':
+        return pa.int32()
+    if data_type == 'bigint':
+        return pa.int64()
+    if data_type == 'numeric':
+        return pa.decimal128(precision or 38, scale or 0)
+    if data_type == 'boolean':
+        return pa.bool_()
+    if data_type == 'date':
+        return pa.date32()
+    if data_type.startswith('timestamp'):
+        return pa.timestamp('us')
+    # bytea (hashes, wallets) is exported in its hex form, see column_select()
+    return pa.string()
+
+def column_select(name, data_type):
+    """Select expression for a column: BYTEA hashes and wallets as hex text, as the CSV export has them"""
+    if data_type != 'bytea':
+        return name
+    if name.endswith('wallet'):
+        return f"dw.wallet_hex({name}) as {name}"
+    return f"encode({name}, 'hex') as {name}"
+
+def table_schema(conn, table):
+    """Build the Arrow schema and select list for a dw table from information_schema"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT column_name, data_type, numeric_precision, numeric_scale, is_nullable
+        FROM information_schema.columns
+        WHERE table_schema = 'dw' AND table_name = %s
+        ORDER BY ordinal_position
+    """, (table,))
+    columns = cursor.fetchall()
+    schema = pa.schema([
+        pa.field(name, arrow_type(data_type, precision, scale), nullable=(is_nullable == 'YES'))
+        for name, data_type, precision, scale, is_nullable in columns
+    ])
+    return schema, [column_select(name, data_type) for name, data_type, _, _, _ in columns]
+
+def get_relationships(conn):
+    """Dimension -> fact relationships, taken from the foreign keys in the dw schema"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT
+            dim.relname as dimension_table,
+            dim_col.attname as dimension_column,
+            fact.relname as fact_table,
+            fact_col.attname as fact_column
+        FROM pg_constraint c
+        JOIN pg_class fact ON fact.oid = c.conrelid
+        JOIN pg_class dim ON dim.oid = c.confrelid
+        JOIN pg_namespace n ON n.oid = fact.relnamespace
+        JOIN pg_attribute fact_col ON fact_col.attrelid = c.conrelid AND fact_col.attnum = c.conkey[1]
+        JOIN pg_attribute dim_col ON dim_col.attrelid = c.confrelid AND dim_col.attnum = c.confkey[1]
+        WHERE c.contype = 'f'
+          AND n.nspname = 'dw'
+          AND fact.relname = ANY(%s)
+          AND dim.relname = ANY(%s)
+        ORDER BY fact.relname, fact_col.attname
+    """, (FACT_TABLES, DIMENSION_TABLES))
+    return [
+        {
+            'from': f"{dim_table}.{dim_col}",
+            'to': f"{fact_table}.{fact_col}",
+            'cardinality': 'one-to-many',
+            'cross_filter': 'single',
+        }
+        for dim_table, dim_col, fact_table, fact_col in cursor.fetchall()
+    ]
+
+def export_table(conn, table, output_dir, chunk_size):
+    """Stream one dw table into a Parquet file, one row group per chunk"""
+    schema, selects = table_schema(conn, table)
+    path = os.path.join(output_dir, f"{table}.parquet")
+    rows_written = 0
+
+    with pq.ParquetWriter(path, schema, compression=COMPRESSION) as writer:
+        query = f"SELECT {', '.join(selects)} FROM dw.{table}"
+        for _, rows in stream_query(conn, query, chunk_size, cursor_name=f"export_{table}"):
+            columns = list(zip(*rows))
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            )
+            writer.write_batch(batch)
+            rows_written += len(rows)
+
+    size_bytes = os.path.getsize(path)
+    logger.info(f"  {table}: {rows_written:,} rows, {size_bytes / 1024:,.0f} KB")
+    return {'table': table, 'path': os.path.basename(path), 'rows': rows_written, 'bytes': size_bytes}
+
+def export_star_schema():
+    """
+    Export dimensions and facts as separate Parquet files for the Power BI model
+    """
+    if not HAS_PYARROW:
+        raise ImportError("pyarrow is required for the star-schema Parquet export (pip install pyarrow)")
+
+    logger.info("Starting Power BI star-schema export...")
+
+    config = load_config()
+    powerbi_config = config.get('powerbi', {})
+    chunk_size = powerbi_config.get('chunk_size', 10000)
+    output_dir = os.path.join(powerbi_config.get('output_dir', '../../powerbi/export'), 'star')
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Connect to database
+    conn = psycopg2.connect(
+        host=config['database']['host'],
+        port=config['database']['port'],
+        database=config['database']['database'],
+        user=config['database']['user'],
+        password=config['database']['password']
+    )
+    # One snapshot across all tables so facts never reference missing dimension rows
+    conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+
+    try:
+        tables = [export_table(conn, table, output_dir, chunk_size)
+                  for table in DIMENSION_TABLES + FACT_TABLES]
+        relationships = get_relationships(conn)
+    finally:
+        conn.close()
+
+    model = {
+        'exported_at': datetime.now().isoformat(),
+        'format': 'parquet',
+        'compression': COMPRESSION,
+        'dimensions': [t for t in tables if t['table'] in DIMENSION_TABLES],
+        'facts': [t for t in tables if t['table'] in FACT_TABLES],
+        'relationships': relationships,
+    }
+    model_path = os.path.join(output_dir, 'model.json')
+    with open(model_path, 'w', encoding='utf-8') as f:
+        json.dump(model, f, indent=2)
+
+    total_bytes = sum(t['bytes'] for t in tables)
+
+    # Print summary
+    print("\n" + "="*80)
+    print("POWER BI STAR SCHEMA EXPORT COMPLETE")
+    print("="*80)
+    for t in tables:
+        print(f"{t['table']:<24}{t['rows']:>12,} rows{t['bytes'] / 1024:>12,.0f} KB")
+    print(f"\nTotal Size: {total_bytes / 1024 / 1024:,.2f} MB")
+    print(f"Relationships: {len(relationships)}")
+    print(f"\nModel: {model_path}")
+    print("="*80)
+
+    return model
+
+if __name__ == "__main__":
+    export_star_schema()
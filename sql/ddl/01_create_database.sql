@@ -99,12 +99,102 @@ CREATE TABLE IF NOT EXISTS audit.data_quality_log (
 
 COMMENT ON TABLE audit.data_quality_log IS 'Data quality check results';
 
+-- Index maintenance log
+CREATE TABLE IF NOT EXISTS audit.index_maintenance_log (
+    maintenance_id BIGSERIAL PRIMARY KEY,
+    execution_id BIGINT REFERENCES audit.etl_execution_log(execution_id),
+    table_name VARCHAR(100) NOT NULL,
+    batch_rows BIGINT,
+    table_rows BIGINT,
+    batch_ratio DECIMAL(12,4),
+    ratio_threshold DECIMAL(6,4),
+    decision VARCHAR(20) NOT NULL CHECK (decision IN ('Maintain', 'Dropped', 'Rebuild')),
+    index_definitions TEXT[],  -- CREATE INDEX statements of the dropped indexes ('Dropped' rows)
+    indexes_kept TEXT[],       -- Lookup indexes left in place for the load's anti-joins ('Dropped' rows)
+    indexes_rebuilt INTEGER DEFAULT 0,
+    rebuild_seconds DECIMAL(10,2),
+    decided_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE audit.index_maintenance_log IS 'Index drop/rebuild decisions taken around fact loads';
+
+-- Fact load checkpoints
+CREATE TABLE IF NOT EXISTS audit.etl_load_checkpoint (
+    checkpoint_id BIGSERIAL PRIMARY KEY,
+    execution_id BIGINT REFERENCES audit.etl_execution_log(execution_id),
+    table_name VARCHAR(100) NOT NULL,
+    staging_batch VARCHAR(100) NOT NULL,
+    chunk_number INTEGER NOT NULL,
+    chunk_lower TEXT NOT NULL,
+    chunk_upper TEXT,
+    status VARCHAR(20) NOT NULL CHECK (status IN ('Completed', 'Failed')),
+    rows_inserted INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    error_message TEXT,
+    checkpointed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE audit.etl_load_checkpoint IS 'Per-chunk progress of fact loads, used to resume failed runs';
+
+-- Streaming freshness (event publish -> staging / DW), recorded per ETL run
+CREATE TABLE IF NOT EXISTS audit.streaming_latency (
+    latency_id BIGSERIAL PRIMARY KEY,
+    execution_id BIGINT REFERENCES audit.etl_execution_log(execution_id),
+    stage VARCHAR(20) NOT NULL CHECK (stage IN ('staging', 'dw')),
+    topic VARCHAR(50) NOT NULL,
+    table_name VARCHAR(100) NOT NULL,
+    sample_count INTEGER NOT NULL,
+    p50_ms DECIMAL(14,1),
+    p95_ms DECIMAL(14,1),
+    p99_ms DECIMAL(14,1),
+    max_ms DECIMAL(14,1),
+    recorded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE audit.streaming_latency IS 'Latency percentiles from Kafka publish to staging and DW fact rows';
+
+-- Streaming events the staging consumer could not land, with the raw message for replay
+CREATE TABLE IF NOT EXISTS audit.streaming_dead_letter (
+    dead_letter_id BIGSERIAL PRIMARY KEY,
+    topic VARCHAR(50) NOT NULL,
+    partition_id INTEGER NOT NULL,
+    message_offset BIGINT NOT NULL,
+    message_key TEXT,
+    message_value BYTEA,
+    event_type VARCHAR(50),
+    reason VARCHAR(30) NOT NULL CHECK (reason IN ('undecodable', 'unknown_event_type', 'rejected')),
+    error_message TEXT,
+    consumer_name VARCHAR(50),
+    failed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (topic, partition_id, message_offset)
+);
+
+COMMENT ON TABLE audit.streaming_dead_letter IS 'Undecodable or constraint-violating Kafka events routed away from staging';
+
+-- Last hash verification per transaction (dw.fact_transaction.transaction_key)
+CREATE TABLE IF NOT EXISTS audit.transaction_verification (
+    transaction_key BIGINT PRIMARY KEY,
+    transaction_id VARCHAR(30) NOT NULL,
+    verified_hash BYTEA NOT NULL,
+    result VARCHAR(20) NOT NULL CHECK (result IN ('Pass', 'Mismatch', 'Missing')),
+    method VARCHAR(20) NOT NULL CHECK (method IN ('recompute', 'ledger')),
+    execution_id BIGINT REFERENCES audit.etl_execution_log(execution_id),
+    verified_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE audit.transaction_verification IS 'Incremental verification state: last verified hash and result per transaction';
+
 -- Create indexes on audit tables
 CREATE INDEX idx_etl_log_job_name ON audit.etl_execution_log(job_name);
 CREATE INDEX idx_etl_log_start_time ON audit.etl_execution_log(start_time);
 CREATE INDEX idx_etl_log_status ON audit.etl_execution_log(status);
 CREATE INDEX idx_quality_log_execution_id ON audit.data_quality_log(execution_id);
 CREATE INDEX idx_quality_log_table_name ON audit.data_quality_log(table_name);
+CREATE INDEX idx_index_log_execution_id ON audit.index_maintenance_log(execution_id);
+CREATE INDEX idx_load_checkpoint_batch ON audit.etl_load_checkpoint(table_name, staging_batch);
+CREATE INDEX idx_streaming_latency_recorded ON audit.streaming_latency(topic, stage, recorded_at);
+CREATE INDEX idx_dead_letter_failed_at ON audit.streaming_dead_letter(failed_at);
+CREATE INDEX idx_transaction_verification_failed ON audit.transaction_verification(transaction_key) WHERE result <> 'Pass';
 
 -- ============================================================================
 -- Grant Permissions
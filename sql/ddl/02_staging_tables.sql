@@ -33,9 +33,11 @@ CREATE TABLE IF NOT EXISTS staging.stg_farmers (
     farm_size_acres DECIMAL(8,2) CHECK (farm_size_acres > 0),
     primary_crop VARCHAR(50),
     cooperative_id VARCHAR(20),
-    blockchain_wallet VARCHAR(64) UNIQUE,
+    blockchain_wallet VARCHAR(64) UNIQUE CHECK (blockchain_wallet ~* '^0x[0-9a-f]{40}$'),  -- Hex as received; BYTEA in the DW
     registration_date TIMESTAMP,
     is_active BOOLEAN DEFAULT TRUE,
+    -- Conformed attributes (resolved by ETL)
+    region VARCHAR(30),
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -74,6 +76,8 @@ CREATE TABLE IF NOT EXISTS staging.stg_markets (
     operating_days VARCHAR(50),
     capacity_kg DECIMAL(12,2),
     is_active BOOLEAN DEFAULT TRUE,
+    -- Conformed attributes (resolved by ETL)
+    region VARCHAR(30),
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -92,8 +96,10 @@ CREATE TABLE IF NOT EXISTS staging.stg_buyers (
     email VARCHAR(100),
     district VARCHAR(50),
     registration_number VARCHAR(30),
-    blockchain_wallet VARCHAR(64) UNIQUE,
+    blockchain_wallet VARCHAR(64) UNIQUE CHECK (blockchain_wallet ~* '^0x[0-9a-f]{40}$'),  -- Hex as received; BYTEA in the DW
     is_active BOOLEAN DEFAULT TRUE,
+    -- Conformed attributes (resolved by ETL)
+    region VARCHAR(30),
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -116,7 +122,17 @@ CREATE TABLE IF NOT EXISTS staging.stg_transactions (
     transaction_date TIMESTAMP NOT NULL,
     payment_method VARCHAR(20),
     payment_status VARCHAR(20),
-    blockchain_hash VARCHAR(64) UNIQUE,
+    blockchain_hash VARCHAR(64) UNIQUE CHECK (blockchain_hash ~* '^[0-9a-f]{64}$'),  -- Hex as received; BYTEA in the DW
+    -- Conformed keys (resolved by ETL)
+    date_key INTEGER,
+    farmer_key BIGINT,
+    buyer_key BIGINT,
+    product_key BIGINT,
+    market_key BIGINT,
+    payment_key BIGINT,
+    quality_key BIGINT,
+    -- Streaming lineage (publish time of the Kafka event; NULL for CSV loads)
+    event_published_at TIMESTAMPTZ,
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -137,6 +153,14 @@ CREATE TABLE IF NOT EXISTS staging.stg_harvests (
     post_harvest_loss_pct DECIMAL(5,2) CHECK (post_harvest_loss_pct >= 0 AND post_harvest_loss_pct <= 100),
     storage_method VARCHAR(50),
     season VARCHAR(20),
+    -- Conformed keys (resolved by ETL)
+    planting_date_key INTEGER,
+    harvest_date_key INTEGER,
+    farmer_key BIGINT,
+    product_key BIGINT,
+    location_key BIGINT,
+    -- Streaming lineage (publish time of the Kafka event; NULL for CSV loads)
+    event_published_at TIMESTAMPTZ,
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -155,6 +179,12 @@ CREATE TABLE IF NOT EXISTS staging.stg_pricing (
     retail_price DECIMAL(10,2) CHECK (retail_price > 0),
     price_trend VARCHAR(10),
     source VARCHAR(50),
+    -- Conformed keys (resolved by ETL)
+    date_key INTEGER,
+    product_key BIGINT,
+    market_key BIGINT,
+    -- Streaming lineage (publish time of the Kafka event; NULL for CSV loads)
+    event_published_at TIMESTAMPTZ,
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -176,6 +206,11 @@ CREATE TABLE IF NOT EXISTS staging.stg_weather (
     wind_speed_kmh DECIMAL(5,2),
     weather_condition VARCHAR(30),
     source VARCHAR(50),
+    -- Conformed keys (resolved by ETL)
+    date_key INTEGER,
+    location_key BIGINT,
+    -- Streaming lineage (publish time of the Kafka event; NULL for CSV loads)
+    event_published_at TIMESTAMPTZ,
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -194,6 +229,9 @@ CREATE TABLE IF NOT EXISTS staging.stg_subsidies (
     amount_value DECIMAL(10,2),
     distribution_date DATE,
     verification_status VARCHAR(20),
+    -- Conformed keys (resolved by ETL)
+    date_key INTEGER,
+    farmer_key BIGINT,
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -13,6 +13,23 @@
 
 SET search_path TO dw, public;
 
+-- ============================================================================
+-- Helper Functions
+-- ============================================================================
+
+-- Transaction hashes (32 bytes) and wallet addresses (20 bytes) are stored as
+-- BYTEA in the DW. Sources send hex text, with or without a 0x prefix; the ETL
+-- converts it with hex_to_bytea(), and lookups by hex should use it too so
+-- they can use the BYTEA indexes.
+CREATE OR REPLACE FUNCTION dw.hex_to_bytea(hex TEXT) RETURNS BYTEA AS $$
+    SELECT decode(CASE WHEN left(hex, 2) IN ('0x', '0X') THEN substr(hex, 3) ELSE hex END, 'hex')
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+-- Wallet address as presented to consumers ('0x' + 40 hex digits)
+CREATE OR REPLACE FUNCTION dw.wallet_hex(wallet BYTEA) RETURNS TEXT AS $$
+    SELECT '0x' || encode(wallet, 'hex')
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
 -- ============================================================================
 -- Dimension: Date (Pre-populated)
 -- ============================================================================
@@ -67,7 +84,7 @@ CREATE TABLE IF NOT EXISTS dw.dim_farmer (
     primary_crop VARCHAR(50),
     cooperative_id VARCHAR(20),
     cooperative_name VARCHAR(100),
-    blockchain_wallet VARCHAR(64),
+    blockchain_wallet BYTEA CHECK (octet_length(blockchain_wallet) = 20),  -- Hex form: dw.wallet_hex()
     registration_date DATE,
     -- SCD Type 2 attributes
     effective_date DATE NOT NULL DEFAULT CURRENT_DATE,
@@ -85,6 +102,11 @@ CREATE INDEX idx_dim_farmer_current ON dw.dim_farmer(is_current);
 CREATE INDEX idx_dim_farmer_district ON dw.dim_farmer(district);
 CREATE INDEX idx_dim_farmer_cooperative ON dw.dim_farmer(cooperative_id);
 
+-- dim_farmer with the wallet address as hex, for reporting tools
+CREATE OR REPLACE VIEW dw.v_dim_farmer AS
+SELECT f.*, dw.wallet_hex(f.blockchain_wallet) AS blockchain_wallet_hex
+FROM dw.dim_farmer f;
+
 -- ============================================================================
 -- Dimension: Product (SCD Type 2)
 -- ============================================================================
@@ -168,7 +190,7 @@ CREATE TABLE IF NOT EXISTS dw.dim_buyer (
     district VARCHAR(50),
     region VARCHAR(30),
     registration_number VARCHAR(30),
-    blockchain_wallet VARCHAR(64),
+    blockchain_wallet BYTEA CHECK (octet_length(blockchain_wallet) = 20),  -- Hex form: dw.wallet_hex()
     is_active BOOLEAN,
     -- SCD Type 2 attributes
     effective_date DATE NOT NULL DEFAULT CURRENT_DATE,
@@ -185,6 +207,11 @@ CREATE INDEX idx_dim_buyer_id ON dw.dim_buyer(buyer_id);
 CREATE INDEX idx_dim_buyer_current ON dw.dim_buyer(is_current);
 CREATE INDEX idx_dim_buyer_type ON dw.dim_buyer(buyer_type);
 
+-- dim_buyer with the wallet address as hex, for reporting tools
+CREATE OR REPLACE VIEW dw.v_dim_buyer AS
+SELECT b.*, dw.wallet_hex(b.blockchain_wallet) AS blockchain_wallet_hex
+FROM dw.dim_buyer b;
+
 -- ============================================================================
 -- Dimension: Location
 -- ============================================================================
@@ -209,6 +236,19 @@ COMMENT ON TABLE dw.dim_location IS 'Location dimension';
 CREATE INDEX idx_dim_location_district ON dw.dim_location(district);
 CREATE INDEX idx_dim_location_region ON dw.dim_location(region);
 
+-- ============================================================================
+-- Reference: District to Region
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS dw.ref_district_region (
+    district VARCHAR(50) PRIMARY KEY,
+    region VARCHAR(30) NOT NULL,
+    default_location_key BIGINT REFERENCES dw.dim_location(location_key),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE dw.ref_district_region IS 'District to region mapping used to conform region and weather location across dimensions';
+
 -- ============================================================================
 -- Dimension: Payment Method
 -- ============================================================================
@@ -262,6 +302,20 @@ VALUES
     ('C', 'Below Standard', 60, -20.0)
 ON CONFLICT (quality_grade) DO NOTHING;
 
+-- District to Region (districts not listed resolve to 'Western')
+INSERT INTO dw.ref_district_region (district, region)
+VALUES 
+    ('Kampala', 'Central'), ('Wakiso', 'Central'), ('Mukono', 'Central'),
+    ('Masaka', 'Central'), ('Luwero', 'Central'),
+    ('Jinja', 'Eastern'), ('Mbale', 'Eastern'), ('Tororo', 'Eastern'), ('Iganga', 'Eastern'),
+    ('Soroti', 'Eastern'), ('Pallisa', 'Eastern'), ('Kamuli', 'Eastern'),
+    ('Gulu', 'Northern'), ('Lira', 'Northern'), ('Kitgum', 'Northern'), ('Arua', 'Northern'),
+    ('Nebbi', 'Northern'), ('Apac', 'Northern'), ('Moroto', 'Northern'),
+    ('Mbarara', 'Western'), ('Kabale', 'Western'), ('Kasese', 'Western'), ('Fort Portal', 'Western'),
+    ('Hoima', 'Western'), ('Masindi', 'Western'), ('Bushenyi', 'Western'), ('Kabarole', 'Western'),
+    ('Kisoro', 'Western'), ('Ntungamo', 'Western'), ('Rukungiri', 'Western'), ('Bundibugyo', 'Western')
+ON CONFLICT (district) DO NOTHING;
+
 -- ============================================================================
 -- Success Message
 -- ============================================================================
@@ -271,6 +325,7 @@ BEGIN
     RAISE NOTICE '========================================';
     RAISE NOTICE 'Dimension tables created successfully!';
     RAISE NOTICE 'Tables: dim_date, dim_farmer, dim_product, dim_market, dim_buyer, dim_location, dim_payment_method, dim_quality';
+    RAISE NOTICE 'Reference: ref_district_region';
     RAISE NOTICE 'SCD Type 2 implemented for: farmer, product, market, buyer';
     RAISE NOTICE '========================================';
 END $$;
@@ -29,7 +29,7 @@ CREATE TABLE IF NOT EXISTS dw.fact_transaction (
     quality_key BIGINT NOT NULL REFERENCES dw.dim_quality(quality_key),
     -- Degenerate Dimensions
     transaction_id VARCHAR(30) NOT NULL,
-    blockchain_hash VARCHAR(64),
+    blockchain_hash BYTEA CHECK (octet_length(blockchain_hash) = 32),  -- Hex form: encode(blockchain_hash, 'hex')
     payment_status VARCHAR(20),
     -- Measures (Additive)
     quantity_kg DECIMAL(10,2) NOT NULL CHECK (quantity_kg > 0),
@@ -40,7 +40,8 @@ CREATE TABLE IF NOT EXISTS dw.fact_transaction (
     net_amount DECIMAL(12,2),
     -- Timestamps
     transaction_timestamp TIMESTAMP NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP  -- Set when an UPDATE changes the hash or its inputs (see trigger below)
 );
 
 COMMENT ON TABLE dw.fact_transaction IS 'Transaction fact table - grain: one row per transaction';
@@ -53,7 +54,29 @@ CREATE INDEX idx_fact_transaction_market ON dw.fact_transaction(market_key);
 CREATE INDEX idx_fact_transaction_date ON dw.fact_transaction(date_key);
 CREATE INDEX idx_fact_transaction_timestamp ON dw.fact_transaction(transaction_timestamp);
 CREATE INDEX idx_fact_transaction_id ON dw.fact_transaction(transaction_id);
-CREATE INDEX idx_fact_transaction_blockchain ON dw.fact_transaction(blockchain_hash);
+CREATE INDEX idx_fact_transaction_blockchain ON dw.fact_transaction(blockchain_hash);  -- Look up hex with dw.hex_to_bytea()
+CREATE INDEX idx_fact_transaction_updated ON dw.fact_transaction(updated_at) WHERE updated_at IS NOT NULL;
+
+-- Incremental hash verification re-checks rows whose hash inputs changed after they were verified
+CREATE OR REPLACE FUNCTION dw.touch_transaction_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_fact_transaction_updated
+BEFORE UPDATE OF transaction_id, transaction_timestamp, blockchain_hash ON dw.fact_transaction
+FOR EACH ROW
+WHEN (OLD.transaction_id IS DISTINCT FROM NEW.transaction_id
+      OR OLD.transaction_timestamp IS DISTINCT FROM NEW.transaction_timestamp
+      OR OLD.blockchain_hash IS DISTINCT FROM NEW.blockchain_hash)
+EXECUTE FUNCTION dw.touch_transaction_updated_at();
+
+-- fact_transaction with the hash as hex, for reporting tools and exports
+CREATE OR REPLACE VIEW dw.v_fact_transaction AS
+SELECT ft.*, encode(ft.blockchain_hash, 'hex') AS blockchain_hash_hex
+FROM dw.fact_transaction ft;
 
 -- ============================================================================
 -- Fact: Harvest
@@ -158,6 +181,38 @@ CREATE INDEX idx_fact_subsidy_date ON dw.fact_subsidy(date_key);
 CREATE INDEX idx_fact_subsidy_id ON dw.fact_subsidy(farmer_subsidy_id);
 CREATE INDEX idx_fact_subsidy_program ON dw.fact_subsidy(program_name);
 
+-- ============================================================================
+-- Fact: Weather
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS dw.fact_weather (
+    weather_key BIGSERIAL PRIMARY KEY,
+    -- Foreign Keys to Dimensions
+    location_key BIGINT NOT NULL REFERENCES dw.dim_location(location_key),
+    date_key INTEGER NOT NULL REFERENCES dw.dim_date(date_key),
+    -- Degenerate Dimensions
+    weather_id VARCHAR(30) NOT NULL,
+    weather_condition VARCHAR(30),
+    source VARCHAR(50),
+    -- Measures (Non-additive)
+    temperature_min DECIMAL(5,2),
+    temperature_max DECIMAL(5,2),
+    temperature_avg DECIMAL(5,2),
+    rainfall_mm DECIMAL(6,2),
+    humidity_pct DECIMAL(5,2),
+    wind_speed_kmh DECIMAL(5,2),
+    -- Timestamps
+    weather_date DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE dw.fact_weather IS 'Weather fact table - grain: one row per district per day';
+
+-- Indexes
+CREATE INDEX idx_fact_weather_location ON dw.fact_weather(location_key);
+CREATE INDEX idx_fact_weather_date ON dw.fact_weather(date_key);
+CREATE INDEX idx_fact_weather_id ON dw.fact_weather(weather_id);
+
 -- ============================================================================
 -- Create Aggregate/Summary Tables (Optional - for performance)
 -- ============================================================================
@@ -183,6 +238,59 @@ CREATE INDEX idx_fact_txn_summary_date ON dw.fact_transaction_daily_summary(date
 CREATE INDEX idx_fact_txn_summary_product ON dw.fact_transaction_daily_summary(product_key);
 CREATE INDEX idx_fact_txn_summary_market ON dw.fact_transaction_daily_summary(market_key);
 
+-- ============================================================================
+-- Streaming Price Windows (near-real-time, written by scripts/kafka/price_windows.py)
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS dw.fact_price_window (
+    window_type VARCHAR(10) NOT NULL CHECK (window_type IN ('tumbling', 'sliding')),
+    window_start TIMESTAMP NOT NULL,
+    window_end TIMESTAMP NOT NULL,
+    product_id VARCHAR(20) NOT NULL,
+    market_id VARCHAR(20) NOT NULL,
+    product_key BIGINT REFERENCES dw.dim_product(product_key),
+    market_key BIGINT REFERENCES dw.dim_market(market_key),
+    trade_count INTEGER NOT NULL,
+    volume_kg DECIMAL(14,2) NOT NULL,
+    vwap DECIMAL(10,2),
+    min_price DECIMAL(10,2),
+    max_price DECIMAL(10,2),
+    last_price DECIMAL(10,2),
+    price_trend VARCHAR(10),
+    is_final BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (window_type, product_id, market_id, window_end)
+);
+
+COMMENT ON TABLE dw.fact_price_window IS 'Streaming price windows - grain: one row per window type/product/market/window end';
+
+CREATE INDEX idx_fact_price_window_end ON dw.fact_price_window(window_type, window_end);
+
+-- ============================================================================
+-- Blockchain Anchoring (daily Merkle trees, written by scripts/blockchain/merkle_anchor.py)
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS dw.transaction_anchor (
+    date_key INTEGER PRIMARY KEY REFERENCES dw.dim_date(date_key),
+    leaf_count INTEGER NOT NULL,
+    merkle_root CHAR(64) NOT NULL,
+    anchor_status VARCHAR(20) NOT NULL DEFAULT 'Pending' CHECK (anchor_status IN ('Pending', 'Anchored')),
+    anchored_at TIMESTAMP,
+    built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE dw.transaction_anchor IS 'Daily Merkle root over paid transaction hashes, anchored on the ledger - grain: one row per day';
+
+-- Tree levels (level 0 = leaves in transaction_id order), 32-byte nodes concatenated
+CREATE TABLE IF NOT EXISTS dw.transaction_anchor_level (
+    date_key INTEGER NOT NULL REFERENCES dw.transaction_anchor(date_key) ON DELETE CASCADE,
+    level SMALLINT NOT NULL,
+    nodes BYTEA NOT NULL,
+    PRIMARY KEY (date_key, level)
+);
+
+COMMENT ON TABLE dw.transaction_anchor_level IS 'Stored Merkle tree levels for inclusion proofs';
+
 -- ============================================================================
 -- Success Message
 -- ============================================================================
@@ -191,7 +299,9 @@ DO $$
 BEGIN
     RAISE NOTICE '========================================';
     RAISE NOTICE 'Fact tables created successfully!';
-    RAISE NOTICE 'Tables: fact_transaction, fact_harvest, fact_pricing, fact_subsidy';
+    RAISE NOTICE 'Tables: fact_transaction, fact_harvest, fact_pricing, fact_subsidy, fact_weather';
     RAISE NOTICE 'Summary table: fact_transaction_daily_summary';
+    RAISE NOTICE 'Streaming table: fact_price_window';
+    RAISE NOTICE 'Anchoring tables: transaction_anchor, transaction_anchor_level';
     RAISE NOTICE '========================================';
 END $$;
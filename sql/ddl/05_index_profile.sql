@@ -0,0 +1,118 @@
+-- ============================================================================
+-- Index Profile Script (Dashboard Query Mix)
+-- Agricultural Supply Chain Data Warehouse
+-- ============================================================================
+-- Purpose: Replace per-column B-tree indexes on fact tables with an index set
+--          tuned to the Power BI dashboards (date-ranged group-bys)
+-- Schema: dw
+-- Benchmark: scripts/etl/benchmark_index_profile.py
+-- ============================================================================
+
+-- Connect to agri_dw database
+-- Note: \c is a psql metacommand and won't work in pgAdmin Query Tool
+-- Make sure you're connected to agri_dw database before running this script
+-- \c agri_dw
+
+SET search_path TO dw, public;
+
+-- ============================================================================
+-- Profile rules
+-- ============================================================================
+-- 1. date_key / timestamp columns of append-only facts get BRIN indexes.
+--    Facts are loaded day by day in date order, so physical order correlates
+--    with the date and a BRIN index is a few pages instead of a full B-tree.
+-- 2. Each dashboard slicer (product, farmer, market) gets one composite
+--    (dimension_key, date_key) index that INCLUDEs the measures the visuals
+--    aggregate, so the group-bys can be answered with index-only scans.
+-- 3. Single-column B-trees that are a leading prefix of a composite (or of a
+--    UNIQUE constraint) are redundant and dropped.
+-- 4. Lookup indexes on degenerate keys (transaction_id, blockchain_hash,
+--    price_id, harvest_id) are kept for the ETL anti-joins and verification.
+
+-- ============================================================================
+-- Fact: Transaction
+-- ============================================================================
+
+-- Redundant single-column indexes
+DROP INDEX IF EXISTS dw.idx_fact_transaction_farmer;
+DROP INDEX IF EXISTS dw.idx_fact_transaction_product;
+DROP INDEX IF EXISTS dw.idx_fact_transaction_market;
+DROP INDEX IF EXISTS dw.idx_fact_transaction_date;
+DROP INDEX IF EXISTS dw.idx_fact_transaction_timestamp;
+
+-- Date range filters (Revenue Trend, Monthly Revenue & Transactions)
+CREATE INDEX IF NOT EXISTS idx_fact_transaction_date_brin
+    ON dw.fact_transaction USING BRIN (date_key) WITH (pages_per_range = 32);
+CREATE INDEX IF NOT EXISTS idx_fact_transaction_timestamp_brin
+    ON dw.fact_transaction USING BRIN (transaction_timestamp) WITH (pages_per_range = 32);
+
+-- Product & Market Analysis, Top 10 Products by Revenue
+CREATE INDEX IF NOT EXISTS idx_fact_transaction_product_date
+    ON dw.fact_transaction (product_key, date_key)
+    INCLUDE (total_amount, quantity_kg, transaction_count);
+
+-- Farmer Analytics (Top 20 Farmers, Farmer Engagement Over Time)
+CREATE INDEX IF NOT EXISTS idx_fact_transaction_farmer_date
+    ON dw.fact_transaction (farmer_key, date_key)
+    INCLUDE (total_amount, quantity_kg);
+
+-- Market Type Distribution, Revenue by Region
+CREATE INDEX IF NOT EXISTS idx_fact_transaction_market_date
+    ON dw.fact_transaction (market_key, date_key)
+    INCLUDE (total_amount, quantity_kg);
+
+-- ============================================================================
+-- Fact: Harvest
+-- ============================================================================
+
+DROP INDEX IF EXISTS dw.idx_fact_harvest_product;
+
+CREATE INDEX IF NOT EXISTS idx_fact_harvest_product_date
+    ON dw.fact_harvest (product_key, harvest_date_key)
+    INCLUDE (quantity_kg, net_quantity_kg, post_harvest_loss_kg);
+
+-- ============================================================================
+-- Fact: Pricing
+-- ============================================================================
+
+-- UNIQUE(product_key, market_key, date_key) already leads with product_key
+DROP INDEX IF EXISTS dw.idx_fact_pricing_product;
+DROP INDEX IF EXISTS dw.idx_fact_pricing_market;
+DROP INDEX IF EXISTS dw.idx_fact_pricing_date;
+
+CREATE INDEX IF NOT EXISTS idx_fact_pricing_date_brin
+    ON dw.fact_pricing USING BRIN (date_key) WITH (pages_per_range = 32);
+
+-- Price Trends by market
+CREATE INDEX IF NOT EXISTS idx_fact_pricing_market_date
+    ON dw.fact_pricing (market_key, date_key)
+    INCLUDE (wholesale_price, retail_price);
+
+-- ============================================================================
+-- Summary: Daily Transactions
+-- ============================================================================
+
+-- UNIQUE(date_key, product_key, market_key) already leads with date_key
+DROP INDEX IF EXISTS dw.idx_fact_txn_summary_date;
+
+-- ============================================================================
+-- Refresh planner statistics
+-- ============================================================================
+
+ANALYZE dw.fact_transaction;
+ANALYZE dw.fact_harvest;
+ANALYZE dw.fact_pricing;
+ANALYZE dw.fact_transaction_daily_summary;
+
+-- ============================================================================
+-- Success Message
+-- ============================================================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '========================================';
+    RAISE NOTICE 'Index profile applied successfully!';
+    RAISE NOTICE 'BRIN: fact_transaction(date_key, transaction_timestamp), fact_pricing(date_key)';
+    RAISE NOTICE 'Covering: product/farmer/market x date on fact_transaction';
+    RAISE NOTICE '========================================';
+END $$;